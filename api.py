@@ -1,10 +1,27 @@
 import os
+import json
+import time
+import base64
+import asyncio
+from typing import Optional, Tuple
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from strawberry.fastapi import GraphQLRouter
 from graphql_schema import schema
+from db.connection import get_pool_stats, close_pool
+from db.async_connection import get_async_pool_stats, close_async_pool
+from db.catalog import catalog
+from pydantic import BaseModel
+from services.gemini_service import get_or_create_chat, get_session_stats, model_caller, record_turn
+from services.intent_router import intent_router
+from services.elevenlabs_service import ELEVENLABS_API_KEY, tts_cache, tts_client
+from services.speech_pipeline import stream_with_speech
+from services.audio_handles import resolve_audio_handle
+from services.history_writer import history_writer
+from tools.tool_cache import tool_cache
 
 load_dotenv(".env")
 
@@ -30,6 +47,143 @@ app.include_router(graphql_app, prefix="/graphql")
 def read_root():
     return {"status": "ok", "message": "AgentLM API is running. Go to /graphql"}
 
+@app.get("/stats")
+def read_stats():
+    return {
+        "db_pool": get_pool_stats(),
+        "db_async_pool": get_async_pool_stats(),
+        "chat_sessions": get_session_stats(),
+        "tool_cache": tool_cache.stats(),
+        "model_calls": model_caller.stats(),
+        "intent_router": intent_router.stats(),
+        "tts": {"client": tts_client.stats(), "cache": tts_cache.stats()},
+        "history_writes": history_writer.stats(),
+    }
+
+class ChatStreamRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    user_id: Optional[str] = None
+    generate_audio: bool = False
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _chat_events(req: ChatStreamRequest):
+    """
+    Eventos SSE: `session`, un `delta` por fragmento de texto y `done` con la respuesta
+    completa (o `error`). Con generate_audio, además `audio` (MP3 en base64 por partes,
+    en orden de oración; `last` cierra cada oración) intercalado con el texto.
+    """
+    try:
+        routed = await intent_router.route_async(req.message, req.user_id)
+        if routed:
+            real_session_id = await asyncio.to_thread(record_turn, req.session_id, req.user_id, req.message, routed.answer)
+            stream = iter([routed.answer])
+        else:
+            await history_writer.wait_for(req.user_id)  # Una sesión nueva se arma con el historial de la base
+            chat_obj, real_session_id = await asyncio.to_thread(get_or_create_chat, req.session_id, req.user_id)
+            # Gemini y las herramientas son bloqueantes: cada fragmento se pide fuera del event loop
+            stream = chat_obj.send_message_stream(req.message)
+        yield _sse("session", {"session_id": real_session_id})
+        if req.generate_audio and ELEVENLABS_API_KEY:
+            # Cada oración se sintetiza apenas se completa, mientras el modelo sigue escribiendo
+            stream = stream_with_speech(stream)
+
+        deltas = []
+        while True:
+            item = await asyncio.to_thread(next, stream, None)
+            if item is None:
+                break
+            if isinstance(item, str):
+                deltas.append(item)
+                yield _sse("delta", {"text": item})
+            else:
+                yield _sse("audio", {"seq": item.seq, "chunk": base64.b64encode(item.data).decode("ascii"), "last": item.last})
+        text_response = "".join(deltas) or "(Sin respuesta...)"
+        print(f"[API] 🤖 Streamed response: '{text_response[:50]}...'")
+    except Exception as e:
+        print(f"[API] ❌ Chat stream failed: {e}")
+        yield _sse("error", {"message": str(e)})
+        return
+
+    if req.user_id:
+        history_writer.save_turn(req.user_id, req.message, text_response, real_session_id)  # En segundo plano
+    yield _sse("done", {"session_id": real_session_id, "response": text_response})
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatStreamRequest):
+    """Chat por Server-Sent Events: el texto llega a medida que el modelo lo genera."""
+    print(f"\n[API] 🚀 Chat stream received. Message start: '{req.message[:50]}...' | Session: {req.session_id} | User: {req.user_id}")
+    return StreamingResponse(
+        _chat_events(req),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Rango inclusivo de un header `Range: bytes=...` (un solo rango). None: enviar todo."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # Multirrango u otra unidad: se ignora y va el archivo completo
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:  # bytes=-N: los últimos N
+            start, end = max(size - int(end_text), 0), size - 1
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@app.get("/audio/{handle}")
+async def get_audio(handle: str, request: Request):
+    """MP3 de un handle emitido por la mutación chat (binario, con Range y caché HTTP)."""
+    resolved = resolve_audio_handle(handle)
+    if resolved is None:
+        raise HTTPException(404, "Audio no encontrado")
+    key, expires = resolved
+    remaining = expires - int(time.time())
+    if remaining <= 0:
+        raise HTTPException(410, "El enlace de audio expiró")
+
+    # El contenido de una clave nunca cambia: ETag fijo y caché del navegador hasta que vence el handle
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": f"private, max-age={remaining}, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    audio = await asyncio.to_thread(tts_cache.get, key)  # Memoria o disco
+    if audio is None:
+        raise HTTPException(410, "El audio ya no está disponible")
+
+    byte_range = _byte_range(request.headers["range"], len(audio)) if "range" in request.headers else None
+    if byte_range is None:
+        return Response(audio, media_type="audio/mpeg", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+    return Response(audio[start:end + 1], status_code=206, media_type="audio/mpeg", headers=headers)
+
+@app.on_event("startup")
+async def startup():
+    # Snapshot del catálogo antes del primer request: carritos y recibos salen con sus ofertas
+    try:
+        await asyncio.to_thread(catalog.ensure_loaded)
+    except Exception as e:
+        print(f"[CATALOG] ⚠️ Could not preload catalog, it will load on first use: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await history_writer.drain()  # Antes de cerrar el pool que usan
+    await close_async_pool()
+    close_pool()
+
 _frontend_dist = os.path.join(os.path.dirname(__file__), "frontend", "dist")
 if os.path.isdir(_frontend_dist):
     app.mount("/app", StaticFiles(directory=_frontend_dist, html=True), name="frontend")
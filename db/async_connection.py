@@ -0,0 +1,99 @@
+"""
+Capa de acceso asíncrona a PostgreSQL (psycopg 3 + psycopg_pool).
+
+Espejo de db/connection.py para código asyncio (resolvers GraphQL, herramientas).
+Usa los mismos placeholders `%s`, así que las consultas SQL se comparten con
+las versiones síncronas, que se mantienen para notebooks y scripts.
+"""
+import asyncio
+from contextvars import ContextVar
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Union
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from db.connection import (
+    get_db_connection_string,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+)
+
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_lock: Optional[asyncio.Lock] = None
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool, _async_pool_lock
+    if _async_pool is not None:
+        return _async_pool
+    if _async_pool_lock is None:
+        _async_pool_lock = asyncio.Lock()
+    async with _async_pool_lock:
+        if _async_pool is None:
+            pool = AsyncConnectionPool(
+                get_db_connection_string(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                timeout=DB_POOL_TIMEOUT,
+                max_idle=DB_POOL_IDLE_TIMEOUT,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await pool.open()
+            _async_pool = pool
+            print(f"[DB] 🏊 Async connection pool ready (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+    return _async_pool
+
+async def close_async_pool() -> None:
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+def get_async_pool_stats() -> Dict[str, Any]:
+    if _async_pool is None:
+        return {"pool_size": 0, "pool_available": 0, "requests_waiting": 0}
+    return _async_pool.get_stats()
+
+_current_async_conn: ContextVar = ContextVar("db_current_async_conn", default=None)
+
+@asynccontextmanager
+async def async_transaction():
+    """Versión asyncio de `db.connection.transaction()`."""
+    conn = _current_async_conn.get()
+    if conn is not None:
+        yield conn
+        return
+    async with get_async_db_connection() as conn:
+        token = _current_async_conn.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_async_conn.reset(token)
+
+@asynccontextmanager
+async def get_async_db_connection():
+    shared = _current_async_conn.get()
+    if shared is not None:
+        yield shared
+        return
+
+    pool = await get_async_pool()
+    # El pool hace commit al salir sin error y rollback si hubo excepción
+    async with pool.connection() as conn:
+        yield conn
+
+async def execute_query_async(query: str, params: Optional[Union[tuple, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cursor:
+            await cursor.execute(query, params)
+            return list(await cursor.fetchall())
+
+async def execute_update_async(query: str, params: Optional[Union[tuple, Dict[str, Any]]] = None) -> int:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(query, params)
+            return cursor.rowcount
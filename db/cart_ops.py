@@ -1,107 +1,475 @@
-from typing import List, Dict, Any, Tuple
-from db.connection import execute_query, execute_update
+# Database module
 
-def get_or_create_active_cart(user_id: str) -> str:
-    """Obtiene el ID del carrito activo o crea uno nuevo."""
-    query = "SELECT cart_id FROM carts WHERE user_id = %s AND status = 'active' LIMIT 1"
-    results = execute_query(query, (user_id,))
-    
-    if results:
-        return str(results[0]["cart_id"])
-    
-    insert_query = "INSERT INTO carts (user_id, status) VALUES (%s, 'active') RETURNING cart_id"
-    results = execute_query(insert_query, (user_id,))
-    return str(results[0]["cart_id"])
+import asyncio
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional, Callable
+from db.connection import execute_query, execute_update, transaction
+from db.async_connection import execute_query_async, execute_update_async, async_transaction
+from db.catalog import catalog
 
-def add_item_to_cart(user_id: str, product_id: str, quantity: int = 1) -> str:
-    """Agrega un item al carrito. Si ya existe, suma la cantidad."""
-    cart_id = get_or_create_active_cart(user_id)
-    
-    prod_check = execute_query("SELECT product_name FROM product_stocks WHERE product_id = %s", (product_id,))
-    if not prod_check:
-        return f"Error: Producto '{product_id}' no encontrado."
-    product_name = prod_check[0]["product_name"]
+# --- SQL (compartido por las versiones sync y async) ---
 
-    query = """
-    INSERT INTO cart_items (cart_id, product_id, quantity)
-    VALUES (%s, %s, %s)
-    ON CONFLICT (cart_id, product_id) 
-    DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity, added_at = NOW();
-    """
-    
-    execute_update(query, (cart_id, product_id, quantity))
-    return f"Se agregaron {quantity} unidades de '{product_name}' al carrito."
+# Resuelve el carrito activo o lo crea, en la misma sentencia.
+_ACTIVE_CART_CTE = """
+    existing AS (
+        SELECT cart_id FROM carts WHERE user_id = %(user_id)s::uuid AND status = 'active'
+    ),
+    created AS (
+        INSERT INTO carts (user_id, status)
+        SELECT %(user_id)s::uuid, 'active'
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        ON CONFLICT (user_id, status) DO NOTHING
+        RETURNING cart_id
+    ),
+    cart AS (
+        SELECT cart_id FROM existing UNION ALL SELECT cart_id FROM created
+    )
+"""
+GET_OR_CREATE_CART_SQL = f"WITH {_ACTIVE_CART_CTE} SELECT cart_id FROM cart"
+SELECT_ACTIVE_CART_SQL = "SELECT cart_id FROM carts WHERE user_id = %s AND status = 'active' LIMIT 1"
 
-def remove_item_from_cart(user_id: str, product_id: str) -> str:
-    cart_id = get_or_create_active_cart(user_id)
-    query = "DELETE FROM cart_items WHERE cart_id = %s AND product_id = %s"
-    rows = execute_update(query, (cart_id, product_id))
-    if rows > 0:
-        return "Producto eliminado del carrito."
-    return "El producto no estaba en el carrito."
+_UPSERT_ITEM_CTE = """
+    product AS (
+        SELECT product_id, product_name FROM product_stocks WHERE product_id = %(product_id)s LIMIT 1
+    ),
+    upserted AS (
+        INSERT INTO cart_items (cart_id, product_id, quantity)
+        SELECT target.cart_id, product.product_id, %(quantity)s FROM target, product
+        ON CONFLICT (cart_id, product_id)
+        DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity, added_at = NOW()
+        RETURNING cart_id
+    )
+"""
+# Carrito + validación de producto + upsert en un solo round trip
+ADD_ITEM_SQL = f"""
+    WITH {_ACTIVE_CART_CTE},
+    target AS (SELECT cart_id FROM cart),
+    {_UPSERT_ITEM_CTE}
+    SELECT
+        (SELECT cart_id FROM cart) AS cart_id,
+        (SELECT product_name FROM product) AS product_name
+"""
+# Igual, pero con el cart_id ya conocido (cache)
+ADD_ITEM_TO_CART_SQL = f"""
+    WITH target AS (SELECT %(cart_id)s::uuid AS cart_id),
+    {_UPSERT_ITEM_CTE}
+    SELECT
+        (SELECT cart_id FROM target) AS cart_id,
+        (SELECT product_name FROM product) AS product_name
+"""
 
-def get_cart_details(user_id: str) -> Dict[str, Any]:
-    """Retorna items del carrito con detalles del producto."""
-    cart_id = get_or_create_active_cart(user_id)
-    
-    query = """
-    SELECT 
+DELETE_CART_ITEM_SQL = "DELETE FROM cart_items WHERE cart_id = %s AND product_id = %s"
+DELETE_USER_CART_ITEM_SQL = """
+    DELETE FROM cart_items ci
+    USING carts c
+    WHERE ci.cart_id = c.cart_id
+      AND c.user_id = %s AND c.status = 'active'
+      AND ci.product_id = %s
+"""
+
+SELECT_CART_ITEMS_SQL = """
+    SELECT
         ci.item_id, ci.quantity as cart_qty,
         p.product_id, p.product_name, p.unit_cost, p.quantity_available, p.product_sku
     FROM cart_items ci
     JOIN product_stocks p ON ci.product_id = p.product_id
     WHERE ci.cart_id = %s
     ORDER BY ci.added_at ASC
-    """
-    items = execute_query(query, (cart_id,))
-    
-    total = sum(item["cart_qty"] * item["unit_cost"] for item in items)
-    
+"""
+# Sin cart_id en cache: se parte del usuario (una fila vacía si el carrito no tiene items)
+SELECT_USER_CART_ITEMS_SQL = """
+    SELECT
+        c.cart_id,
+        ci.item_id, ci.quantity as cart_qty,
+        p.product_id, p.product_name, p.unit_cost, p.quantity_available, p.product_sku
+    FROM carts c
+    LEFT JOIN cart_items ci ON ci.cart_id = c.cart_id
+    LEFT JOIN product_stocks p ON ci.product_id = p.product_id
+    WHERE c.user_id = %s AND c.status = 'active'
+    ORDER BY ci.added_at ASC
+"""
+
+# Primera sentencia del checkout: bloquea el carrito hasta el COMMIT. Otro checkout
+# del mismo carrito espera aquí y luego lo ve ya vacío; agregar o quitar items
+# también espera (la FK de cart_items toma un lock compartido sobre la fila).
+LOCK_USER_CART_SQL = "SELECT cart_id FROM carts WHERE user_id = %s AND status = 'active' FOR UPDATE"
+
+CLEAR_CART_SQL = "DELETE FROM cart_items WHERE cart_id = %s"
+CLEAR_USER_CART_SQL = """
+    DELETE FROM cart_items ci
+    USING carts c
+    WHERE ci.cart_id = c.cart_id AND c.user_id = %s AND c.status = 'active'
+"""
+
+# Descuenta todas las líneas en un solo UPDATE; una línea sólo se actualiza si
+# todavía hay stock (la condición se re-evalúa bajo el lock de la fila).
+CHECKOUT_DECREMENT_SQL = """
+    UPDATE product_stocks ps
+    SET quantity_on_hand = ps.quantity_on_hand - i.qty,
+        quantity_available = ps.quantity_available - i.qty,
+        last_updated_at = NOW()
+    FROM unnest(%s::varchar[], %s::int[]) AS i(product_id, qty)
+    WHERE ps.product_id = i.product_id
+      AND ps.quantity_available >= i.qty
+    RETURNING ps.product_id
+"""
+
+# --- Cache user_id -> cart_id ---
+CART_CACHE_MAX_ENTRIES = 10000
+_cart_cache: "OrderedDict[str, str]" = OrderedDict()
+_cart_cache_lock = threading.Lock()
+
+def _cached_cart_id(user_id: str) -> Optional[str]:
+    with _cart_cache_lock:
+        cart_id = _cart_cache.get(user_id)
+        if cart_id is not None:
+            _cart_cache.move_to_end(user_id)
+        return cart_id
+
+def _remember_cart(user_id: str, cart_id) -> None:
+    if cart_id is None:
+        return
+    with _cart_cache_lock:
+        _cart_cache[user_id] = str(cart_id)
+        _cart_cache.move_to_end(user_id)
+        while len(_cart_cache) > CART_CACHE_MAX_ENTRIES:
+            _cart_cache.popitem(last=False)
+
+def invalidate_cart_cache(user_id: Optional[str] = None) -> None:
+    """Olvida el cart_id de un usuario (o de todos si no se indica)."""
+    with _cart_cache_lock:
+        if user_id is None:
+            _cart_cache.clear()
+        else:
+            _cart_cache.pop(user_id, None)
+
+# --- Change listeners (p. ej. caché de resultados de herramientas) ---
+CART_CHANGED = "cart"    # Cambió el carrito del usuario
+STOCK_CHANGED = "stock"  # Cambió el stock de productos (checkout)
+_change_listeners: List[Callable[[str, str], None]] = []
+
+def add_change_listener(listener: Callable[[str, str], None]) -> None:
+    """Registra `listener(event, user_id)`, llamado después de cada operación que modifica carrito o stock."""
+    _change_listeners.append(listener)
+
+def _notify(events: Tuple[str, ...], user_id: str) -> None:
+    for event in events:
+        for listener in _change_listeners:
+            try:
+                listener(event, user_id)
+            except Exception as e:
+                print(f"[CART] ⚠️ Change listener failed: {e}")
+
+def _notifies(*events: str):
+    """Avisa a los listeners al terminar la operación, también si falló a mitad de camino."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(user_id: str, *args, **kwargs):
+                try:
+                    return await fn(user_id, *args, **kwargs)
+                finally:
+                    _notify(events, user_id)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(user_id: str, *args, **kwargs):
+            try:
+                return fn(user_id, *args, **kwargs)
+            finally:
+                _notify(events, user_id)
+        return wrapper
+    return decorator
+
+def _is_stale_cart_error(e: Exception) -> bool:
+    return "foreign key" in str(e).lower()
+
+# --- Helpers ---
+
+class _StockConflict(Exception):
+    """El stock cambió entre la lectura del carrito y el descuento."""
+
+def _stock_errors(items: List[Dict[str, Any]]) -> List[str]:
+    errors = []
+    for item in items:
+        wanted = item["cart_qty"]
+        available = item["quantity_available"]
+        if wanted > available:
+            errors.append(
+                f"- {item['product_name']}: Quieres {wanted}, pero solo quedan {available}."
+            )
+    return errors
+
+def _stock_error_message(errors: List[str]) -> str:
+    return "No se puede procesar la compra por falta de stock:\n" + "\n".join(errors) + "\n\n¿Quieres que actualice tu carrito con el stock disponible?"
+
+def _checkout_arrays(items: List[Dict[str, Any]]) -> Tuple[List[str], List[int]]:
+    return [item["product_id"] for item in items], [item["cart_qty"] for item in items]
+
+def _build_receipt(cart_data: Dict[str, Any]) -> str:
+    receipt = "**Compra Exitosa**\n\n"
+    for item in cart_data["items"]:
+        receipt += f"- {item['cart_qty']}x {item['product_name']} (${item['final_price']:.2f})\n"
+    receipt += f"\n**Total Pagado**: ${cart_data['total']:.2f}"
+    return receipt
+
+def _conflict_message(items: List[Dict[str, Any]]) -> str:
+    errors = _stock_errors(items)
+    if not errors:
+        errors = ["- El stock cambió mientras procesábamos tu compra. Intenta de nuevo."]
+    return _stock_error_message(errors)
+
+def _add_item_message(row: Optional[Dict[str, Any]], product_id: str, quantity: int) -> str:
+    if not row or not row["product_name"]:
+        return f"Error: Producto '{product_id}' no encontrado."
+    return f"Se agregaron {quantity} unidades de '{row['product_name']}' al carrito."
+
+def _remove_item_message(rows: int) -> str:
+    if rows > 0:
+        return "Producto eliminado del carrito."
+    return "El producto no estaba en el carrito."
+
+def _cart_from_rows(cart_id, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    items = []
+    for row in rows:
+        if row.get("product_id") is None:
+            continue
+        row.pop("cart_id", None)
+        items.append(row)
+
+    # Precio efectivo (con ofertas vigentes) desde la tabla de precios del catálogo.
+    # Sin recargar el snapshot: esto corre dentro del checkout (transacción abierta) y
+    # desde el event loop. Los llamadores cargan el snapshot antes (_ensure_catalog*);
+    # los refrescos quedan para las lecturas del catálogo.
+    catalog.attach_prices(items, refresh=False)
+    total = sum(item["cart_qty"] * item["final_price"] for item in items)
+
     return {
-        "cart_id": cart_id,
+        "cart_id": str(cart_id) if cart_id is not None else None,
         "items": items,
         "total": total
     }
 
+def _ensure_catalog() -> None:
+    catalog.ensure_loaded()
+
+async def _ensure_catalog_async() -> None:
+    if not catalog.loaded:
+        await asyncio.to_thread(catalog.ensure_loaded)
+
+# --- Sync API ---
+
+def get_or_create_active_cart(user_id: str) -> str:
+    """Obtiene el ID del carrito activo o crea uno nuevo."""
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        return cart_id
+
+    results = execute_query(GET_OR_CREATE_CART_SQL, {"user_id": user_id})
+    if not results:
+        # Otro request creó el carrito en paralelo (ON CONFLICT DO NOTHING)
+        results = execute_query(SELECT_ACTIVE_CART_SQL, (user_id,))
+
+    cart_id = str(results[0]["cart_id"])
+    _remember_cart(user_id, cart_id)
+    return cart_id
+
+@_notifies(CART_CHANGED)
+def add_item_to_cart(user_id: str, product_id: str, quantity: int = 1) -> str:
+    """Agrega un item al carrito. Si ya existe, suma la cantidad."""
+    params = {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+    cart_id = _cached_cart_id(user_id)
+
+    if cart_id:
+        try:
+            rows = execute_query(ADD_ITEM_TO_CART_SQL, {**params, "cart_id": cart_id})
+            return _add_item_message(rows[0] if rows else None, product_id, quantity)
+        except Exception as e:
+            if not _is_stale_cart_error(e):
+                raise
+            invalidate_cart_cache(user_id)
+
+    rows = execute_query(ADD_ITEM_SQL, params)
+    row = rows[0] if rows else None
+    if row and row["cart_id"] is None and row["product_name"]:
+        # Carrera al crear el carrito: ahora ya existe
+        rows = execute_query(ADD_ITEM_SQL, params)
+        row = rows[0] if rows else None
+    if row:
+        _remember_cart(user_id, row["cart_id"])
+    return _add_item_message(row, product_id, quantity)
+
+@_notifies(CART_CHANGED)
+def remove_item_from_cart(user_id: str, product_id: str) -> str:
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        rows = execute_update(DELETE_CART_ITEM_SQL, (cart_id, product_id))
+    else:
+        rows = execute_update(DELETE_USER_CART_ITEM_SQL, (user_id, product_id))
+    return _remove_item_message(rows)
+
+def get_cart_details(user_id: str) -> Dict[str, Any]:
+    """Retorna items del carrito con detalles del producto."""
+    _ensure_catalog()
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        return _cart_from_rows(cart_id, execute_query(SELECT_CART_ITEMS_SQL, (cart_id,)))
+
+    rows = execute_query(SELECT_USER_CART_ITEMS_SQL, (user_id,))
+    cart_id = rows[0]["cart_id"] if rows else None
+    _remember_cart(user_id, cart_id)
+    return _cart_from_rows(cart_id, rows)
+
+@_notifies(CART_CHANGED)
 def clear_cart(user_id: str) -> None:
-    cart_id = get_or_create_active_cart(user_id)
-    execute_update("DELETE FROM cart_items WHERE cart_id = %s", (cart_id,))
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        execute_update(CLEAR_CART_SQL, (cart_id,))
+    else:
+        execute_update(CLEAR_USER_CART_SQL, (user_id,))
 
+@_notifies(CART_CHANGED, STOCK_CHANGED)
 def validate_and_checkout(user_id: str) -> str:
     """
     Valida stock de todos los items y procesa la compra atómicamente.
     Si falta stock de algo, aborta y reporta el problema específico.
     """
-    cart_data = get_cart_details(user_id)
-    items = cart_data["items"]
-    
-    if not items:
-        return "El carrito está vacío."
+    try:
+        _ensure_catalog()  # Antes de abrir la transacción: el recibo usa los precios con oferta
+        with transaction():
+            locked = execute_query(LOCK_USER_CART_SQL, (user_id,))
+            if not locked:
+                return "El carrito está vacío."
+            cart_id = locked[0]["cart_id"]
+            _remember_cart(user_id, cart_id)
+            cart_data = _cart_from_rows(cart_id, execute_query(SELECT_CART_ITEMS_SQL, (cart_id,)))
+            items = cart_data["items"]
 
-    errors = []
-    for item in items:
-        wanted = item["cart_qty"]
-        available = item["quantity_available"]
-        if wanted > available:
-            errors.append(
-                f"- {item['product_name']}: Quieres {wanted}, pero solo quedan {available}."
-            )
-    
-    if errors:
-        return "No se puede procesar la compra por falta de stock:\n" + "\n".join(errors) + "\n\n¿Quieres que actualice tu carrito con el stock disponible?"
+            if not items:
+                return "El carrito está vacío."
+
+            errors = _stock_errors(items)
+            if errors:
+                return _stock_error_message(errors)
+
+            updated = execute_query(CHECKOUT_DECREMENT_SQL, _checkout_arrays(items))
+            if len(updated) != len(items):
+                # Otra compra se llevó el stock: revertir todo
+                raise _StockConflict()
+
+            execute_update(CLEAR_CART_SQL, (cart_data["cart_id"],))
+
+        catalog.mark_stale()
+        return _build_receipt(cart_data)
+
+    except _StockConflict:
+        return _conflict_message(get_cart_details(user_id)["items"])
+    except Exception as e:
+        return f"Error crítico procesando la compra: {str(e)}"
+    finally:
+        invalidate_cart_cache(user_id)
+
+# --- Async API ---
+
+async def get_or_create_active_cart_async(user_id: str) -> str:
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        return cart_id
+
+    results = await execute_query_async(GET_OR_CREATE_CART_SQL, {"user_id": user_id})
+    if not results:
+        results = await execute_query_async(SELECT_ACTIVE_CART_SQL, (user_id,))
+
+    cart_id = str(results[0]["cart_id"])
+    _remember_cart(user_id, cart_id)
+    return cart_id
 
+@_notifies(CART_CHANGED)
+async def add_item_to_cart_async(user_id: str, product_id: str, quantity: int = 1) -> str:
+    params = {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+    cart_id = _cached_cart_id(user_id)
+
+    if cart_id:
+        try:
+            rows = await execute_query_async(ADD_ITEM_TO_CART_SQL, {**params, "cart_id": cart_id})
+            return _add_item_message(rows[0] if rows else None, product_id, quantity)
+        except Exception as e:
+            if not _is_stale_cart_error(e):
+                raise
+            invalidate_cart_cache(user_id)
+
+    rows = await execute_query_async(ADD_ITEM_SQL, params)
+    row = rows[0] if rows else None
+    if row and row["cart_id"] is None and row["product_name"]:
+        rows = await execute_query_async(ADD_ITEM_SQL, params)
+        row = rows[0] if rows else None
+    if row:
+        _remember_cart(user_id, row["cart_id"])
+    return _add_item_message(row, product_id, quantity)
+
+@_notifies(CART_CHANGED)
+async def remove_item_from_cart_async(user_id: str, product_id: str) -> str:
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        rows = await execute_update_async(DELETE_CART_ITEM_SQL, (cart_id, product_id))
+    else:
+        rows = await execute_update_async(DELETE_USER_CART_ITEM_SQL, (user_id, product_id))
+    return _remove_item_message(rows)
+
+async def get_cart_details_async(user_id: str) -> Dict[str, Any]:
+    await _ensure_catalog_async()
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        return _cart_from_rows(cart_id, await execute_query_async(SELECT_CART_ITEMS_SQL, (cart_id,)))
+
+    rows = await execute_query_async(SELECT_USER_CART_ITEMS_SQL, (user_id,))
+    cart_id = rows[0]["cart_id"] if rows else None
+    _remember_cart(user_id, cart_id)
+    return _cart_from_rows(cart_id, rows)
+
+@_notifies(CART_CHANGED)
+async def clear_cart_async(user_id: str) -> None:
+    cart_id = _cached_cart_id(user_id)
+    if cart_id:
+        await execute_update_async(CLEAR_CART_SQL, (cart_id,))
+    else:
+        await execute_update_async(CLEAR_USER_CART_SQL, (user_id,))
+
+@_notifies(CART_CHANGED, STOCK_CHANGED)
+async def validate_and_checkout_async(user_id: str) -> str:
     try:
-        receipt = "**Compra Exitosa**\n\n"
-        for item in items:
-            update_q = "UPDATE product_stocks SET quantity_on_hand = quantity_on_hand - %s, quantity_available = quantity_available - %s WHERE product_id = %s"
-            execute_update(update_q, (item["cart_qty"], item["cart_qty"], item["product_id"]))
-            receipt += f"- {item['cart_qty']}x {item['product_name']} (${item['unit_cost']:.2f})\n"
-        
-        receipt += f"\n**Total Pagado**: ${cart_data['total']:.2f}"
-        
-        clear_cart(user_id)
-        
-        return receipt
-        
+        await _ensure_catalog_async()
+        async with async_transaction():
+            locked = await execute_query_async(LOCK_USER_CART_SQL, (user_id,))
+            if not locked:
+                return "El carrito está vacío."
+            cart_id = locked[0]["cart_id"]
+            _remember_cart(user_id, cart_id)
+            cart_data = _cart_from_rows(cart_id, await execute_query_async(SELECT_CART_ITEMS_SQL, (cart_id,)))
+            items = cart_data["items"]
+
+            if not items:
+                return "El carrito está vacío."
+
+            errors = _stock_errors(items)
+            if errors:
+                return _stock_error_message(errors)
+
+            updated = await execute_query_async(CHECKOUT_DECREMENT_SQL, _checkout_arrays(items))
+            if len(updated) != len(items):
+                raise _StockConflict()
+
+            await execute_update_async(CLEAR_CART_SQL, (cart_data["cart_id"],))
+
+        catalog.mark_stale()
+        return _build_receipt(cart_data)
+
+    except _StockConflict:
+        return _conflict_message((await get_cart_details_async(user_id))["items"])
     except Exception as e:
         return f"Error crítico procesando la compra: {str(e)}"
+    finally:
+        invalidate_cart_cache(user_id)
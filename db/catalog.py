@@ -0,0 +1,354 @@
+"""
+Snapshot en memoria del catálogo (product_stocks + ofertas) y sus precios efectivos.
+
+Responde búsquedas por nombre, SKU e ID sin ir a PostgreSQL:
+- Índice invertido token -> product_ids para búsquedas por nombre, y de
+  n-gramas (1 a 3 letras) -> tokens del vocabulario para las coincidencias parciales.
+- Hash por product_id y por SKU.
+- Tabla de precios efectivos (db/pricing.py), que sólo se recalcula al
+  cambiar un costo o al empezar/terminar una oferta.
+Se refresca de forma incremental usando `last_updated_at`, con una recarga
+completa periódica para detectar productos borrados. `last_updated_at` sale de
+NOW() al inicio de cada transacción, así que una que confirma tarde queda con
+una marca anterior al watermark: cada refresco vuelve a pedir una ventana de
+CATALOG_CHANGE_OVERLAP_SECONDS hacia atrás y descarta las filas que ya tiene
+(mismo product_id y last_updated_at).
+
+El stock que se muestra aquí es informativo: el checkout siempre lo valida
+contra la base de datos.
+"""
+import os
+import re
+import time
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Any, Tuple
+
+from db.connection import execute_query
+from db.pricing import EffectivePrice, PriceTable
+
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "30"))
+CATALOG_FULL_RELOAD_SECONDS = float(os.getenv("CATALOG_FULL_RELOAD_SECONDS", "600"))
+# Debe superar la transacción más larga que toca product_stocks
+CATALOG_CHANGE_OVERLAP_SECONDS = float(os.getenv("CATALOG_CHANGE_OVERLAP_SECONDS", "60"))
+
+_PRODUCT_COLUMNS = """
+    product_id, product_name, product_sku, supplier_name,
+    quantity_on_hand, quantity_reserved, quantity_available,
+    minimum_stock_level, reorder_point, optimal_stock_level,
+    unit_cost, total_value, warehouse_location, stock_status, notes,
+    is_active, last_updated_at
+"""
+SELECT_ALL_PRODUCTS_SQL = f"SELECT {_PRODUCT_COLUMNS} FROM product_stocks"
+SELECT_CHANGED_PRODUCTS_SQL = f"SELECT {_PRODUCT_COLUMNS} FROM product_stocks WHERE last_updated_at > %s"
+# Vigentes y futuras: la tabla de precios conoce de antemano cada borde
+SELECT_OFFERS_SQL = """
+    SELECT product_id, discount_percentage, description, start_date, end_date
+    FROM product_offers
+    WHERE is_active = true AND end_date > NOW()
+"""
+
+class ProductRecord(NamedTuple):
+    product_id: str
+    product_name: str
+    product_sku: str
+    supplier_name: str
+    quantity_on_hand: int
+    quantity_reserved: int
+    quantity_available: int
+    minimum_stock_level: Any
+    reorder_point: Any
+    optimal_stock_level: Any
+    unit_cost: Any
+    total_value: Any
+    warehouse_location: str
+    stock_status: int
+    notes: Optional[str]
+    is_active: bool
+    last_updated_at: Optional[datetime]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_GRAM_SIZE = 3
+
+def _grams(token: str) -> Set[str]:
+    """Subcadenas de 1 a _GRAM_SIZE letras del token."""
+    return {token[i:i + n] for n in range(1, _GRAM_SIZE + 1) for i in range(len(token) - n + 1)}
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin tildes ("Audífonos" -> "audifonos")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text))
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class ProductCatalog:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._by_id: Dict[str, ProductRecord] = {}
+        self._id_by_sku: Dict[str, str] = {}
+        self._norm_names: Dict[str, str] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocab_by_gram: Dict[str, Set[str]] = {}
+        self._prices = PriceTable()
+        self._watermark: Optional[datetime] = None
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._last_full_reload = 0.0
+        self._stale_marks = 0
+        self.version = 0
+        # Log de cambios para índices derivados (ver `changes_since`)
+        self._changed_at: Dict[str, int] = {}
+        self._full_version = 0
+
+    # --- Index maintenance (con self._lock tomado) ---
+
+    def _unindex(self, product_id: str) -> None:
+        old = self._by_id.pop(product_id, None)
+        if old is None:
+            return
+        self._norm_names.pop(product_id, None)
+        self._prices.remove(product_id)
+        if old.product_sku and self._id_by_sku.get(old.product_sku.lower()) == product_id:
+            del self._id_by_sku[old.product_sku.lower()]
+        for token in set(tokenize(old.product_name or "")):
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[token]
+                    self._unindex_vocab(token)
+
+    def _index(self, record: ProductRecord, now: datetime) -> None:
+        self._unindex(record.product_id)
+        self._by_id[record.product_id] = record
+        self._prices.set_base(record.product_id, record.unit_cost, now)
+        self._norm_names[record.product_id] = normalize_text(record.product_name or "")
+        if record.product_sku:
+            self._id_by_sku[record.product_sku.lower()] = record.product_id
+        for token in set(tokenize(record.product_name or "")):
+            if token not in self._postings:
+                self._postings[token] = set()
+                self._index_vocab(token)
+            self._postings[token].add(record.product_id)
+        if record.last_updated_at and (self._watermark is None or record.last_updated_at > self._watermark):
+            self._watermark = record.last_updated_at
+
+    def _index_vocab(self, token: str) -> None:
+        for gram in _grams(token):
+            self._vocab_by_gram.setdefault(gram, set()).add(token)
+
+    def _unindex_vocab(self, token: str) -> None:
+        for gram in _grams(token):
+            tokens = self._vocab_by_gram.get(gram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._vocab_by_gram[gram]
+
+    # --- Refresh ---
+
+    def _load(self, full: bool) -> None:
+        marks_before = self._stale_marks
+        if full or self._watermark is None:
+            rows = execute_query(SELECT_ALL_PRODUCTS_SQL)
+        else:
+            since = self._watermark - timedelta(seconds=CATALOG_CHANGE_OVERLAP_SECONDS)
+            rows = execute_query(SELECT_CHANGED_PRODUCTS_SQL, (since,))
+        offers = execute_query(SELECT_OFFERS_SQL)
+
+        records = [ProductRecord(**row) for row in rows]
+        now = _utcnow()
+        with self._lock:
+            self.version += 1
+            if full or self._watermark is None:
+                self._by_id, self._id_by_sku, self._norm_names, self._postings = {}, {}, {}, {}
+                self._vocab_by_gram = {}
+                self._prices.clear()
+                self._watermark = None
+                self._changed_at = {}
+                self._full_version = self.version
+            for record in records:
+                old = self._by_id.get(record.product_id)
+                if old is not None and old.last_updated_at == record.last_updated_at:
+                    continue  # Ya indexada (ventana de solapamiento)
+                self._index(record, now)
+                self._changed_at[record.product_id] = self.version
+            self._prices.set_offers(offers, now)
+
+        now = time.monotonic()
+        if self._stale_marks == marks_before:
+            # Si alguien marcó el snapshot como viejo durante la carga, no pisarlo
+            self._last_refresh = now
+        if full or not self._loaded:
+            self._last_full_reload = now
+            print(f"[CATALOG] 📦 Loaded {len(records)} products, {len(offers)} current/upcoming offers")
+        self._loaded = True
+
+    def _advance_prices(self) -> None:
+        # Borde de oferta cruzado: recalcular precios en memoria, sin ir a la BD
+        if self._loaded:
+            with self._lock:
+                if self._prices.advance(_utcnow()):
+                    self.version += 1
+
+    def refresh(self, force: bool = False) -> None:
+        self._advance_prices()
+
+        now = time.monotonic()
+        stale = force or not self._loaded or now - self._last_refresh >= CATALOG_REFRESH_SECONDS
+        if not stale:
+            return
+        # Si ya hay snapshot, sólo un hilo refresca y el resto sigue leyendo el actual
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            full = not self._loaded or now - self._last_full_reload >= CATALOG_FULL_RELOAD_SECONDS
+            self._load(full)
+        except Exception as e:
+            if not self._loaded:
+                raise
+            print(f"[CATALOG] ⚠️ Refresh failed, serving previous snapshot: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> None:
+        """Carga el snapshot si todavía no hay uno (bloquea sólo la primera vez)."""
+        if not self._loaded:
+            self.refresh()
+
+    def mark_stale(self) -> None:
+        """Fuerza un refresco incremental en el próximo acceso (p. ej. tras un checkout)."""
+        self._stale_marks += 1
+        self._last_refresh = 0.0
+
+    # --- Lookups ---
+
+    def _price_fields(self, product_id: str, unit_cost: Any) -> Dict[str, Any]:
+        price = self._prices.get(product_id)
+        if price is None:
+            # Producto que aún no está en el snapshot: sin oferta
+            price = EffectivePrice(unit_cost, unit_cost, None, None)
+        return {
+            "final_price": price.final_price,
+            "discount_percentage": price.discount_percentage,
+            "offer_desc": price.offer_desc,
+        }
+
+    def _as_dict(self, record: ProductRecord) -> Dict[str, Any]:
+        row = record._asdict()
+        row.update(self._price_fields(record.product_id, record.unit_cost))
+        return row
+
+    def effective_price(self, product_id: str) -> Optional[EffectivePrice]:
+        self.refresh()
+        with self._lock:
+            return self._prices.get(product_id)
+
+    def attach_prices(self, rows: List[Dict[str, Any]], refresh: bool = True) -> List[Dict[str, Any]]:
+        """
+        Agrega final_price/discount_percentage/offer_desc a filas leídas de la BD.
+        Con refresh=False usa el snapshot actual sin recargarlo (nunca hace I/O):
+        para llamadas dentro de una transacción o desde el event loop. El llamador
+        debe haber cargado el snapshot antes (`ensure_loaded`): sin él no hay ofertas.
+        """
+        if refresh:
+            self.refresh()
+        else:
+            self._advance_prices()
+        with self._lock:
+            for row in rows:
+                if row.get("product_id") is not None:
+                    row.update(self._price_fields(row["product_id"], row["unit_cost"]))
+        return rows
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            record = self._by_id.get(product_id)
+            return self._as_dict(record) if record else None
+
+    def get_by_sku(self, product_sku: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            product_id = self._id_by_sku.get(product_sku.lower())
+            return self._as_dict(self._by_id[product_id]) if product_id else None
+
+    def _vocab_containing(self, token: str) -> Set[str]:
+        """Tokens del vocabulario que contienen `token` (igual que LIKE '%x%')."""
+        if len(token) <= _GRAM_SIZE:
+            return self._vocab_by_gram.get(token, set())
+        # Intersección de los trigramas, de la lista más corta a la más larga; luego se verifica
+        buckets = sorted(
+            (self._vocab_by_gram.get(token[i:i + _GRAM_SIZE], set()) for i in range(len(token) - _GRAM_SIZE + 1)),
+            key=len,
+        )
+        vocab = set(buckets[0])
+        for bucket in buckets[1:]:
+            if not vocab:
+                break
+            vocab &= bucket
+        return {vocab_token for vocab_token in vocab if token in vocab_token}
+
+    def _candidates(self, query_tokens: List[str]) -> Optional[Set[str]]:
+        """
+        Intersección de posting lists. Cada token de la consulta puede ser parte
+        de un token del nombre, así que se expande con el índice de n-gramas a los
+        tokens del vocabulario que lo contienen (incluido él mismo).
+        """
+        candidates: Optional[Set[str]] = None
+        for token in query_tokens:
+            matched: Set[str] = set()
+            for vocab_token in self._vocab_containing(token):
+                matched |= self._postings[vocab_token]
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        return candidates
+
+    def search(self, product_name: str) -> List[Dict[str, Any]]:
+        """Productos cuyo nombre contiene el texto (sin distinguir tildes ni mayúsculas)."""
+        self.refresh()
+        query = normalize_text(product_name).strip()
+        with self._lock:
+            query_tokens = _TOKEN_RE.findall(query)
+            ids = self._candidates(query_tokens) if query_tokens else set(self._by_id)
+            hits = [pid for pid in ids if query in self._norm_names[pid]]
+            return [self._as_dict(self._by_id[pid]) for pid in sorted(hits)]
+
+    def changes_since(self, version: int) -> Tuple[int, Optional[Set[str]]]:
+        """
+        (versión actual, product_ids modificados desde `version`).
+        Retorna None en lugar del set si hubo una recarga completa y hay que reconstruir todo.
+        Los precios pueden cambiar sin que cambie el producto (bordes de ofertas).
+        """
+        self.refresh()
+        with self._lock:
+            if version < self._full_version:
+                return self.version, None
+            return self.version, {pid for pid, v in self._changed_at.items() if v > version}
+
+    def get_many(self, product_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        with self._lock:
+            return [self._as_dict(self._by_id[pid]) if pid in self._by_id else None for pid in product_ids]
+
+    def all_products(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            return [self._as_dict(self._by_id[pid]) for pid in sorted(self._by_id)]
+
+    def all_active(self) -> List[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            return [self._as_dict(self._by_id[pid]) for pid in sorted(self._by_id) if self._by_id[pid].is_active]
+
+catalog = ProductCatalog()
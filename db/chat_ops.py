@@ -1,26 +1,111 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from db.connection import execute_query, execute_update
+from db.async_connection import execute_update_async
+
+INSERT_CHAT_MESSAGE_SQL = """
+    INSERT INTO chat_history (user_id, role, content, session_id)
+    VALUES (%s, %s, %s, %s)
+"""
+# Un turno (pregunta + respuesta) en una sola ida a la base: se guardan los dos o ninguno
+INSERT_CHAT_TURN_SQL = """
+    INSERT INTO chat_history (user_id, role, content, session_id)
+    VALUES (%s, 'user', %s, %s), (%s, 'model', %s, %s)
+"""
+SELECT_RECENT_HISTORY_SQL = """
+    SELECT role, content 
+    FROM chat_history 
+    WHERE user_id = %s 
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s
+"""
+DELETE_CHAT_HISTORY_SQL = "DELETE FROM chat_history WHERE user_id = %s"
+# Mensajes posteriores al último que cubre el resumen (los más recientes primero)
+SELECT_HISTORY_AFTER_SQL = """
+    SELECT id, role, content
+    FROM chat_history
+    WHERE user_id = %s AND id > %s
+    ORDER BY id DESC
+    LIMIT %s
+"""
+SELECT_SESSION_HISTORY_AFTER_SQL = """
+    SELECT id, role, content
+    FROM chat_history
+    WHERE user_id = %s AND session_id = %s AND id > %s
+    ORDER BY id DESC
+    LIMIT %s
+"""
+# ID del n-ésimo mensaje de la sesión posterior a `after_id` (OFFSET n - 1)
+SELECT_SESSION_HISTORY_ID_SQL = """
+    SELECT id FROM chat_history
+    WHERE session_id = %s AND id > %s
+    ORDER BY id
+    OFFSET %s LIMIT 1
+"""
+SELECT_CHAT_SUMMARY_SQL = """
+    SELECT session_id, summary, last_history_id FROM chat_summaries
+    WHERE user_id = %s AND session_id = %s
+"""
+SELECT_LATEST_CHAT_SUMMARY_SQL = """
+    SELECT session_id, summary, last_history_id FROM chat_summaries
+    WHERE user_id = %s
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+UPSERT_CHAT_SUMMARY_SQL = """
+    INSERT INTO chat_summaries (session_id, user_id, summary, last_history_id, updated_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON CONFLICT (session_id) DO UPDATE
+    SET user_id = EXCLUDED.user_id,
+        summary = EXCLUDED.summary,
+        last_history_id = GREATEST(EXCLUDED.last_history_id, chat_summaries.last_history_id),
+        updated_at = NOW()
+"""
+DELETE_CHAT_SUMMARY_SQL = "DELETE FROM chat_summaries WHERE user_id = %s"
 
 def save_chat_message(user_id: str, role: str, content: str, session_id: str = None):
     """    Guarda un mensaje en el historial.    """
-    query = """
-        INSERT INTO chat_history (user_id, role, content, session_id)
-        VALUES (%s, %s, %s, %s)
-    """
-    execute_update(query, (user_id, role, content, session_id))
+    execute_update(INSERT_CHAT_MESSAGE_SQL, (user_id, role, content, session_id))
+
+def save_chat_turn(user_id: str, message: str, reply: str, session_id: str = None):
+    execute_update(INSERT_CHAT_TURN_SQL, (user_id, message, session_id, user_id, reply, session_id))
 
 def get_recent_chat_history(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-    query = """
-        SELECT role, content 
-        FROM chat_history 
-        WHERE user_id = %s 
-        ORDER BY created_at DESC 
-        LIMIT %s
-    """
-    rows = execute_query(query, (user_id, limit))
+    rows = execute_query(SELECT_RECENT_HISTORY_SQL, (user_id, limit))
     
     return rows[::-1]
 
 def clear_chat_history(user_id: str):
-    query = "DELETE FROM chat_history WHERE user_id = %s"
-    execute_update(query, (user_id,))
+    execute_update(DELETE_CHAT_HISTORY_SQL, (user_id,))
+    execute_update(DELETE_CHAT_SUMMARY_SQL, (user_id,))
+
+def get_chat_history_after(user_id: str, after_id: int, limit: int = 20, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """    Mensajes con id > after_id (los `limit` más recientes), en orden cronológico.    """
+    if session_id:
+        rows = execute_query(SELECT_SESSION_HISTORY_AFTER_SQL, (user_id, session_id, after_id, limit))
+    else:
+        rows = execute_query(SELECT_HISTORY_AFTER_SQL, (user_id, after_id, limit))
+    return rows[::-1]
+
+def get_session_history_id(session_id: str, after_id: int, n: int) -> Optional[int]:
+    """    ID del n-ésimo mensaje de la sesión guardado después de `after_id` (None si todavía no está).    """
+    rows = execute_query(SELECT_SESSION_HISTORY_ID_SQL, (session_id, after_id, n - 1))
+    return rows[0]["id"] if rows else None
+
+def get_chat_summary(user_id: str, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Resumen de los turnos antiguos que ya no se envían completos al modelo:
+    el de la sesión indicada o, sin session_id, el más reciente del usuario.
+    """
+    if session_id:
+        rows = execute_query(SELECT_CHAT_SUMMARY_SQL, (user_id, session_id))
+    else:
+        rows = execute_query(SELECT_LATEST_CHAT_SUMMARY_SQL, (user_id,))
+    return rows[0] if rows else None
+
+def save_chat_summary(session_id: str, user_id: str, summary: str, last_history_id: Optional[int]):
+    execute_update(UPSERT_CHAT_SUMMARY_SQL, (session_id, user_id, summary, last_history_id))
+
+# --- Async API ---
+
+async def save_chat_turn_async(user_id: str, message: str, reply: str, session_id: str = None):
+    await execute_update_async(INSERT_CHAT_TURN_SQL, (user_id, message, session_id, user_id, reply, session_id))
@@ -1,54 +1,355 @@
 """
 Módulo para manejar la conexión a PostgreSQL.
+
+Las conexiones salen de un pool compartido por todo el proceso, así que
+`execute_query` / `execute_update` ya no abren un socket nuevo por llamada.
 """
 import os
+import time
+import threading
 import psycopg2
+from contextvars import ContextVar
 from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv(".env")
 
+# --- Pool Configuration ---
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))             # Espera máxima por una conexión (s)
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # Cierra conexiones ociosas (s)
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")) # Recicla conexiones viejas (s)
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))     # Ping si estuvo ociosa más de esto (s)
+
 def get_db_connection_string() -> str:
     host = os.getenv("DB_HOST", "localhost")
     port = os.getenv("DB_PORT", "5432")
     dbname = os.getenv("DB_NAME")
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
-    
+
     if not all([dbname, user, password]):
         raise ValueError(
             "Faltan variables de entorno para la BD: DB_NAME, DB_USER, DB_PASSWORD"
         )
-    
+
     return f"host={host} port={port} dbname={dbname} user={user} password={password}"
 
+class PoolTimeoutError(Exception):
+    """No se obtuvo una conexión del pool dentro de DB_POOL_TIMEOUT."""
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used_at")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+class ConnectionPool:
+    """
+    Pool de conexiones psycopg2 thread-safe.
+    Valida cada conexión al prestarla, recicla las ociosas/viejas/rotas
+    y lleva estadísticas de uso y espera.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        timeout: float = DB_POOL_TIMEOUT,
+        idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+        max_lifetime: float = DB_POOL_MAX_LIFETIME,
+        check_after: float = DB_POOL_CHECK_AFTER,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Tamaño de pool inválido: min={min_size}, max={max_size}")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opening = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connections_broken": 0,
+            "checkouts": 0,
+            "wait_count": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append(self._open())
+
+    # --- Internals ---
+
+    def _open(self) -> _PooledConnection:
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return _PooledConnection(conn)
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        try:
+            if not pooled.conn.closed:
+                pooled.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_expired(self, pooled: _PooledConnection, now: float) -> bool:
+        if pooled.conn.closed:
+            return True
+        if self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            return True
+        return bool(self.idle_timeout) and now - pooled.last_used_at > self.idle_timeout
+
+    def _is_healthy(self, pooled: _PooledConnection, now: float) -> bool:
+        """Ping barato sólo si la conexión estuvo ociosa un rato."""
+        if pooled.conn.closed:
+            return False
+        if now - pooled.last_used_at < self.check_after:
+            return True
+        try:
+            with pooled.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # --- Public API ---
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            candidate = None
+            must_open = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError("El pool de conexiones está cerrado.")
+                while True:
+                    if self._idle:
+                        # LIFO: reutilizar la conexión más caliente
+                        candidate = self._idle.pop()
+                        break
+                    if self._total() < self.max_size:
+                        self._opening += 1
+                        must_open = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timeout esperando conexión ({self.timeout}s, en uso: {len(self._in_use)})"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["wait_count"] += 1
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            now = time.monotonic()
+            if must_open:
+                try:
+                    candidate = self._open()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+            elif self._is_expired(candidate, now) or not self._is_healthy(candidate, now):
+                with self._cond:
+                    self._stats["connections_broken"] += 1
+                self._discard(candidate)
+                with self._cond:
+                    self._cond.notify()
+                continue
+
+            waited_for = time.monotonic() - start
+            with self._cond:
+                if must_open:
+                    # Se descuenta aquí para que _total() no baje antes de registrarla
+                    self._opening -= 1
+                self._in_use[id(candidate.conn)] = candidate
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["wait_time_total"] += waited_for
+                    self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited_for)
+            return candidate.conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        with self._cond:
+            pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            return
+
+        if not discard and not conn.closed:
+            try:
+                # Nunca devolver una conexión con una transacción a medias
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        if discard or conn.closed or self._closed or self._is_expired(pooled, now):
+            if conn.closed or discard:
+                with self._cond:
+                    self._stats["connections_broken"] += 1
+            self._discard(pooled)
+        else:
+            pooled.last_used_at = now
+            with self._cond:
+                self._idle.append(pooled)
+        with self._cond:
+            self._cond.notify()
+
+    def prune(self) -> int:
+        """Cierra conexiones ociosas/vencidas por encima de min_size. Retorna cuántas cerró."""
+        now = time.monotonic()
+        with self._cond:
+            keep, drop = [], []
+            for pooled in self._idle:
+                if self._is_expired(pooled, now) and len(self._in_use) + len(keep) + self._opening >= self.min_size:
+                    drop.append(pooled)
+                else:
+                    keep.append(pooled)
+            self._idle = keep
+        for pooled in drop:
+            self._discard(pooled)
+        return len(drop)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._total(),
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+            })
+        wait_count = stats["wait_count"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / wait_count if wait_count else 0.0
+        return stats
+
+# --- Process-wide pool ---
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_connection_string())
+                print(f"[DB] 🏊 Connection pool ready (min={_pool.min_size}, max={_pool.max_size})")
+    return _pool
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0, "waiting": 0}
+    _pool.prune()
+    return _pool.stats()
+
+# Conexión de la transacción en curso (ver `transaction()`)
+_current_conn: ContextVar = ContextVar("db_current_conn", default=None)
+
+@contextmanager
+def transaction():
+    """
+    Unidad de trabajo: todas las llamadas a execute_query/execute_update
+    (y por tanto a las funciones de db/*_ops.py) dentro del bloque comparten
+    una sola conexión y se confirman juntas al salir. Una excepción revierte todo.
+    Las transacciones anidadas se unen a la exterior.
+    """
+    conn = _current_conn.get()
+    if conn is not None:
+        yield conn
+        return
+    with get_db_connection() as conn:
+        token = _current_conn.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_conn.reset(token)
+
 @contextmanager
 def get_db_connection():
-    conn = None
+    shared = _current_conn.get()
+    if shared is not None:
+        # Dentro de `transaction()`: el commit/rollback lo hace quien la abrió
+        yield shared
+        return
+
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
     try:
-        conn_string = get_db_connection_string()
-        conn = psycopg2.connect(conn_string)
         yield conn
         conn.commit()
     except Exception as e:
-        if conn:
+        try:
             conn.rollback()
+        except Exception:
+            broken = True
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            broken = True
         raise e
     finally:
-        if conn:
-            conn.close()
+        pool.putconn(conn, discard=broken)
 
-def execute_query(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+def execute_query(query: str, params: Optional[Union[tuple, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
             cursor.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
 
-def execute_update(query: str, params: Optional[tuple] = None) -> int:
+def execute_update(query: str, params: Optional[Union[tuple, Dict[str, Any]]] = None) -> int:
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(query, params)
             return cursor.rowcount
-
@@ -9,3 +9,17 @@ CREATE TABLE IF NOT EXISTS chat_history (
 
 CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id);
 CREATE INDEX IF NOT EXISTS idx_chat_history_created_at ON chat_history(created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_history_session_id ON chat_history(session_id, id);
+
+-- Resumen acumulado (por sesión) de los turnos que ya no entran en la ventana de contexto del modelo.
+-- last_history_id: último mensaje de chat_history que el resumen ya cubre; al reconstruir
+-- la sesión sólo se cargan los mensajes posteriores.
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    session_id VARCHAR(50) PRIMARY KEY,
+    user_id UUID REFERENCES users(user_id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    last_history_id INTEGER,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_summaries_user_id ON chat_summaries(user_id, updated_at);
@@ -0,0 +1,21 @@
+-- Búsqueda de productos sin tildes y tolerante a errores de tipeo.
+-- Ejecutar después de poblar product_stocks.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() es STABLE; para poder indexarla se envuelve en una función IMMUTABLE
+-- con el diccionario fijo.
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+-- Trigramas sobre el nombre normalizado: similitud / errores de tipeo y LIKE '%x%'
+CREATE INDEX IF NOT EXISTS idx_product_stocks_name_trgm
+    ON product_stocks USING gin (f_unaccent(lower(product_name)) gin_trgm_ops);
+
+-- Full-text en español (stemming: "audifono" encuentra "Audífonos")
+CREATE INDEX IF NOT EXISTS idx_product_stocks_name_fts
+    ON product_stocks USING gin (to_tsvector('spanish', f_unaccent(product_name)));
+
+ANALYZE product_stocks;
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS chat_session_state (
+    session_id VARCHAR(50) PRIMARY KEY,
+    user_id UUID REFERENCES users(user_id) ON DELETE CASCADE,
+    turn_count INTEGER NOT NULL DEFAULT 0,
+    payload BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_session_state_updated_at ON chat_session_state(updated_at);
@@ -0,0 +1,103 @@
+"""
+Tabla de precios efectivos (precio final con la mejor oferta vigente).
+
+Los precios se calculan una vez por producto y sólo se recalculan cuando cambia
+el costo base o cuando se cruza el inicio/fin de alguna oferta, no por fila en
+cada consulta. La tabla no hace I/O: db/catalog.py le pasa los costos y las
+ofertas que lee de PostgreSQL.
+"""
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+_CENT = Decimal("0.01")
+
+class EffectivePrice(NamedTuple):
+    unit_cost: Decimal
+    final_price: Decimal
+    discount_percentage: Optional[Decimal]
+    offer_desc: Optional[str]
+
+class OfferWindow(NamedTuple):
+    product_id: str
+    discount_percentage: Decimal
+    description: Optional[str]
+    start_date: datetime
+    end_date: datetime
+
+    def is_active(self, now: datetime) -> bool:
+        # Intervalo semiabierto [inicio, fin): cada borde es un único instante de cambio
+        return self.start_date <= now < self.end_date
+
+class PriceTable:
+    def __init__(self):
+        self._base: Dict[str, Decimal] = {}
+        self._offers: Dict[str, List[OfferWindow]] = {}
+        self._prices: Dict[str, EffectivePrice] = {}
+        self._next_boundary: Optional[datetime] = None
+
+    def _compute(self, product_id: str, now: datetime) -> EffectivePrice:
+        unit_cost = Decimal(self._base[product_id])
+        active = [o for o in self._offers.get(product_id, ()) if o.is_active(now)]
+        if not active:
+            return EffectivePrice(unit_cost, unit_cost, None, None)
+        best = max(active, key=lambda o: o.discount_percentage)
+        discount = Decimal(best.discount_percentage)
+        final = (unit_cost * (100 - discount) / 100).quantize(_CENT, rounding=ROUND_HALF_UP)
+        return EffectivePrice(unit_cost, final, discount, best.description)
+
+    def _schedule(self, now: datetime) -> None:
+        upcoming = [
+            edge
+            for windows in self._offers.values()
+            for o in windows
+            for edge in (o.start_date, o.end_date)
+            if edge > now
+        ]
+        self._next_boundary = min(upcoming) if upcoming else None
+
+    def set_offers(self, offers: Iterable[Dict[str, Any]], now: datetime) -> None:
+        """Reemplaza las ofertas vigentes y futuras y recalcula los productos afectados."""
+        grouped: Dict[str, List[OfferWindow]] = {}
+        for row in offers:
+            window = OfferWindow(
+                row["product_id"], row["discount_percentage"], row["description"],
+                row["start_date"], row["end_date"],
+            )
+            grouped.setdefault(window.product_id, []).append(window)
+
+        affected = set(self._offers) | set(grouped)
+        self._offers = grouped
+        for product_id in affected:
+            if product_id in self._base:
+                self._prices[product_id] = self._compute(product_id, now)
+        self._schedule(now)
+
+    def set_base(self, product_id: str, unit_cost: Any, now: datetime) -> None:
+        self._base[product_id] = unit_cost
+        self._prices[product_id] = self._compute(product_id, now)
+
+    def remove(self, product_id: str) -> None:
+        self._base.pop(product_id, None)
+        self._prices.pop(product_id, None)
+
+    def clear(self) -> None:
+        self._base.clear()
+        self._prices.clear()
+
+    def advance(self, now: datetime) -> bool:
+        """Recalcula si se cruzó el borde de alguna oferta. Retorna True si hubo cambios."""
+        if self._next_boundary is None or now < self._next_boundary:
+            return False
+        for product_id in self._offers:
+            if product_id in self._base:
+                self._prices[product_id] = self._compute(product_id, now)
+        self._schedule(now)
+        return True
+
+    def get(self, product_id: str) -> Optional[EffectivePrice]:
+        return self._prices.get(product_id)
+
+    @property
+    def next_boundary(self) -> Optional[datetime]:
+        return self._next_boundary
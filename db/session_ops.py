@@ -0,0 +1,42 @@
+from typing import Dict, Any, Optional
+from db.connection import execute_query, execute_update
+
+# La carga sólo trae el payload si otro worker avanzó la sesión (turn_count mayor)
+SELECT_SESSION_STATE_SQL = """
+    SELECT user_id, turn_count, payload
+    FROM chat_session_state
+    WHERE session_id = %s AND turn_count > %s
+"""
+# Escritura condicional: una versión vieja no pisa la que guardó otro worker
+UPSERT_SESSION_STATE_SQL = """
+    INSERT INTO chat_session_state (session_id, user_id, turn_count, payload, updated_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON CONFLICT (session_id) DO UPDATE
+    SET user_id = EXCLUDED.user_id,
+        turn_count = EXCLUDED.turn_count,
+        payload = EXCLUDED.payload,
+        updated_at = NOW()
+    WHERE chat_session_state.turn_count < EXCLUDED.turn_count
+"""
+DELETE_EXPIRED_SESSION_STATE_SQL = """
+    DELETE FROM chat_session_state
+    WHERE updated_at < NOW() - make_interval(secs => %s)
+"""
+
+def load_session_state(session_id: str, newer_than: int = -1) -> Optional[Dict[str, Any]]:
+    rows = execute_query(SELECT_SESSION_STATE_SQL, (session_id, newer_than))
+    if not rows:
+        return None
+    row = rows[0]
+    return {
+        "user_id": str(row["user_id"]) if row["user_id"] else None,
+        "turn_count": row["turn_count"],
+        "payload": bytes(row["payload"]),
+    }
+
+def save_session_state(session_id: str, user_id: Optional[str], turn_count: int, payload: bytes) -> bool:
+    """True si se guardó; False si ya había una versión igual o más nueva."""
+    return execute_update(UPSERT_SESSION_STATE_SQL, (session_id, user_id, turn_count, payload)) > 0
+
+def delete_expired_session_states(max_age_seconds: float) -> int:
+    return execute_update(DELETE_EXPIRED_SESSION_STATE_SQL, (max_age_seconds,))
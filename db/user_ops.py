@@ -1,6 +1,7 @@
 """Módulo para operaciones de usuarios (creación, autenticación y búsqueda)"""
 from typing import Optional, Dict, Any
 from db.connection import execute_query, execute_update
+from db.async_connection import execute_query_async
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -13,8 +14,7 @@ def get_password_hash(password: str) -> str:
         raise ValueError("La contraseña es demasiado larga (máximo 72 caracteres).")
     return pwd_context.hash(password)
 
-def create_user(user_data: Dict[str, Any]) -> str:
-    query = """
+INSERT_USER_SQL = """
     INSERT INTO users (
         first_name, last_name, gender, age, 
         email, phone, password_hash
@@ -22,8 +22,15 @@ def create_user(user_data: Dict[str, Any]) -> str:
         %s, %s, %s, %s, 
         %s, %s, %s
     ) RETURNING user_id;
-    """
-    
+"""
+SELECT_ACTIVE_USER_BY_EMAIL_SQL = """
+    SELECT user_id, first_name, last_name, email, password_hash, age, gender 
+    FROM users 
+    WHERE email = %s AND is_active = true
+"""
+SELECT_USER_BY_ID_SQL = "SELECT user_id, first_name, last_name, email, age, gender FROM users WHERE user_id = %s"
+
+def _user_params(user_data: Dict[str, Any]) -> tuple:
     hashed_pwd = get_password_hash(user_data["password"])
     
     params = (
@@ -35,29 +42,17 @@ def create_user(user_data: Dict[str, Any]) -> str:
         user_data["phone"],
         hashed_pwd
     )
-    
-    try:
-        results = execute_query(query, params)
-        if results:
-            return str(results[0]["user_id"])
-        raise Exception("No se pudo obtener el ID del usuario creado.")
-    except Exception as e:
-        if "unique constraint" in str(e).lower():
-            if "email" in str(e).lower():
-                raise ValueError("El correo electrónico ya está registrado.")
-            if "phone" in str(e).lower():
-                raise ValueError("El número de celular ya está registrado.")
-        raise e
+    return params
 
-def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
-    query = """
-    SELECT user_id, first_name, last_name, email, password_hash, age, gender 
-    FROM users 
-    WHERE email = %s AND is_active = true
-    """
-    
-    results = execute_query(query, (email,))
-    
+def _raise_friendly_user_error(e: Exception):
+    if "unique constraint" in str(e).lower():
+        if "email" in str(e).lower():
+            raise ValueError("El correo electrónico ya está registrado.")
+        if "phone" in str(e).lower():
+            raise ValueError("El número de celular ya está registrado.")
+    raise e
+
+def _check_credentials(results, password: str) -> Optional[Dict[str, Any]]:
     if not results:
         return None
         
@@ -69,7 +64,37 @@ def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
         
     return None
 
+def create_user(user_data: Dict[str, Any]) -> str:
+    params = _user_params(user_data)
+    
+    try:
+        results = execute_query(INSERT_USER_SQL, params)
+        if results:
+            return str(results[0]["user_id"])
+        raise Exception("No se pudo obtener el ID del usuario creado.")
+    except Exception as e:
+        _raise_friendly_user_error(e)
+
+def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+    results = execute_query(SELECT_ACTIVE_USER_BY_EMAIL_SQL, (email,))
+    return _check_credentials(results, password)
+
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
-    query = "SELECT user_id, first_name, last_name, email, age, gender FROM users WHERE user_id = %s"
-    results = execute_query(query, (user_id,))
+    results = execute_query(SELECT_USER_BY_ID_SQL, (user_id,))
     return results[0] if results else None
+
+# --- Async API ---
+
+async def create_user_async(user_data: Dict[str, Any]) -> str:
+    params = _user_params(user_data)
+    try:
+        results = await execute_query_async(INSERT_USER_SQL, params)
+        if results:
+            return str(results[0]["user_id"])
+        raise Exception("No se pudo obtener el ID del usuario creado.")
+    except Exception as e:
+        _raise_friendly_user_error(e)
+
+async def authenticate_user_async(email: str, password: str) -> Optional[Dict[str, Any]]:
+    results = await execute_query_async(SELECT_ACTIVE_USER_BY_EMAIL_SQL, (email,))
+    return _check_credentials(results, password)
@@ -1,7 +1,9 @@
 
 // Base API URL
 // Detecta automáticamente la IP si estás en LAN (ej: 192.168.x.x)
-const API_URL = `http://${window.location.hostname}:8000/graphql`;
+export const API_BASE = `http://${window.location.hostname}:8000`;
+const API_URL = `${API_BASE}/graphql`;
+const CHAT_STREAM_URL = `${API_BASE}/chat/stream`;
 
 // --- Types ---
 
@@ -34,7 +36,15 @@ export interface ChatRequest {
 export interface ChatResponse {
   response: string;
   session_id: string;
-  audio?: string; // Nuevo: Audio en Base64
+  audio_url?: string; // URL absoluta del MP3 (expira a los pocos minutos)
+}
+
+// Eventos de /chat/stream (SSE)
+export interface ChatStreamHandlers {
+  onSession?: (sessionId: string) => void;
+  onDelta?: (text: string) => void;
+  // MP3 de una oración, por partes y en orden; last=true cierra la oración
+  onAudio?: (seq: number, chunk: Uint8Array, last: boolean) => void;
 }
 
 // --- Helper Functions ---
@@ -144,7 +154,7 @@ export async function sendChatMessage(payload: ChatRequest): Promise<ChatRespons
       ) {
         response
         sessionId
-        audio
+        audioUrl
       }
     }
   `;
@@ -153,8 +163,61 @@ export async function sendChatMessage(payload: ChatRequest): Promise<ChatRespons
   return {
     response: data.chat.response,
     session_id: data.chat.sessionId, // Strawberry camelCase
-    audio: data.chat.audio
+    // El backend devuelve la ruta (/audio/{handle}); el navegador la pide directo como binario
+    audio_url: data.chat.audioUrl ? API_BASE + data.chat.audioUrl : undefined
   };
 }
 
+// Respuesta en streaming: texto a medida que se genera y, con generate_audio,
+// el audio oración por oración mientras el resto todavía se está escribiendo.
+export async function streamChatMessage(payload: ChatRequest, handlers: ChatStreamHandlers): Promise<ChatResponse> {
+  const res = await fetch(CHAT_STREAM_URL, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`Error en /chat/stream (${res.status})`);
+  }
 
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null as ChatResponse | null; // Se asigna dentro de handleEvent
+
+  const handleEvent = (raw: string) => {
+    let event = "message";
+    let data = "";
+    for (const line of raw.split("\n")) {
+      if (line.startsWith("event: ")) event = line.slice(7);
+      else if (line.startsWith("data: ")) data += line.slice(6);
+    }
+    if (!data) return;
+    const body = JSON.parse(data);
+
+    if (event === "session") handlers.onSession?.(body.session_id);
+    else if (event === "delta") handlers.onDelta?.(body.text);
+    else if (event === "audio") {
+      const chunk = Uint8Array.from(atob(body.chunk), c => c.charCodeAt(0));
+      handlers.onAudio?.(body.seq, chunk, body.last);
+    }
+    else if (event === "done") result = { response: body.response, session_id: body.session_id };
+    else if (event === "error") throw new Error(body.message || "Error en el chat");
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      handleEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+    }
+  }
+
+  if (!result) {
+    throw new Error("El stream terminó sin respuesta");
+  }
+  return result;
+}
@@ -1,6 +1,6 @@
 
 import { useEffect, useState, useRef } from "react";
-import { ChatResponse, sendChatMessage } from "../../lib/api";
+import { sendChatMessage, streamChatMessage } from "../../lib/api";
 
 type VoiceChatProps = {
     sessionId: string | null;
@@ -84,8 +84,82 @@ export function VoiceChat({ sessionId, user, onClose, onUpdateSession }: VoiceCh
     }, []);
 
     const handleUserMessage = async (text: string) => {
-        console.log("[VOICE] 🚀 Sending message to API:", text);
+        console.log("[VOICE] 🚀 Streaming message to API:", text);
         setState("thinking");
+
+        // Cola de oraciones ya completas: la primera suena mientras llegan las siguientes
+        const queue: string[] = [];
+        let parts: Uint8Array[] = [];
+        let playing = false;
+        let finished = false;
+        let receivedText = false;
+        let receivedAudio = false;
+
+        const playNext = () => {
+            const url = queue.shift();
+            if (!url) {
+                playing = false;
+                if (finished) setState("waiting");
+                return;
+            }
+            playing = true;
+            const audio = new Audio(url);
+            audio.onplay = () => setState("speaking");
+            audio.onended = audio.onerror = () => {
+                URL.revokeObjectURL(url);
+                playNext();
+            };
+            audio.play().catch((e) => {
+                console.error("[VOICE] ❌ Audio playback error:", e);
+                URL.revokeObjectURL(url);
+                playNext();
+            });
+        };
+
+        try {
+            const res = await streamChatMessage({
+                message: text,
+                session_id: sessionId,
+                user_id: user?.user_id,
+                generate_audio: true // Audio ElevenLabs por oración
+            }, {
+                onSession: onUpdateSession,
+                onDelta: () => { receivedText = true; },
+                onAudio: (_seq, chunk, last) => {
+                    if (chunk.length) {
+                        receivedAudio = true;
+                        parts.push(chunk);
+                    }
+                    if (!last) return;
+                    if (parts.length) queue.push(URL.createObjectURL(new Blob(parts, { type: "audio/mpeg" })));
+                    parts = [];
+                    if (!playing) playNext();
+                },
+            });
+
+            console.log("[VOICE] ✅ Stream finished:", res);
+            finished = true;
+            onUpdateSession(res.session_id);
+            setResponse(res.response);
+
+            if (!receivedAudio) {
+                console.warn("[VOICE] ⚠️ No audio received, falling back to browser TTS");
+                speakResponse(res.response); // Fallback
+            } else if (!playing) {
+                setState("waiting");
+            }
+
+        } catch (e: any) {
+            console.error("[VOICE] ❌ Stream Error:", e);
+            if (!receivedText) {
+                await sendWithoutStreaming(text); // Servidor sin /chat/stream
+            } else {
+                speakResponse("Lo siento, hubo un error. Intenta de nuevo.");
+            }
+        }
+    };
+
+    const sendWithoutStreaming = async (text: string) => {
         try {
             const res = await sendChatMessage({
                 message: text,
@@ -98,9 +172,9 @@ export function VoiceChat({ sessionId, user, onClose, onUpdateSession }: VoiceCh
             onUpdateSession(res.session_id);
             setResponse(res.response);
 
-            if (res.audio) {
+            if (res.audio_url) {
                 console.log("[VOICE] 🔊 Playing ElevenLabs Audio...");
-                const audio = new Audio("data:audio/mpeg;base64," + res.audio);
+                const audio = new Audio(res.audio_url);
 
                 audio.onplay = () => {
                     console.log("[VOICE] ▶️ Audio playing");
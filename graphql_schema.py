@@ -1,16 +1,18 @@
+import asyncio
 import strawberry
 from typing import Optional
-from services.gemini_service import get_or_create_chat
-from db.chat_ops import save_chat_message
-from db.user_ops import create_user, authenticate_user
+from services.gemini_service import get_or_create_chat, record_turn
+from services.intent_router import intent_router
+from services.history_writer import history_writer
+from db.user_ops import create_user_async, authenticate_user_async
 
-from services.elevenlabs_service import generate_voice_audio
+from services.elevenlabs_service import generate_voice_handle
 
 @strawberry.type
 class ChatResponseType:
     response: str
     session_id: str
-    audio: Optional[str] = None
+    audio_url: Optional[str] = None  # GET /audio/{handle}: MP3 binario, expira a los AUDIO_HANDLE_TTL segundos
 
 @strawberry.type
 class UserType:
@@ -29,7 +31,7 @@ class Query:
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def chat(
+    async def chat(
         self, 
         message: str, 
         session_id: Optional[str] = None, 
@@ -38,46 +40,56 @@ class Mutation:
     ) -> ChatResponseType:
         print(f"\n[GRAPHQL] 🚀 Chat mutation received. Message start: '{message[:50]}...' | Session: {session_id} | User: {user_id}")
         try:
-            # 1. Obtener respuesta de texto (Gemini)
-            chat_obj, real_session_id = get_or_create_chat(session_id, user_id)
-            
-            print(f"[GRAPHQL] 🧠 Sending message to Gemini Service...")
-            gemini_resp = chat_obj.send_message(message)
-            text_response = gemini_resp.text if gemini_resp.text else "(Sin respuesta...)"
-            print(f"[GRAPHQL] 🤖 Gemini response received: '{text_response[:50]}...'")
+            # 1. Obtener respuesta de texto: router de intenciones local (el carrito se lee con
+            #    el driver async) o Gemini
+            routed = await intent_router.route_async(message, user_id)
+            if routed:
+                text_response = routed.answer
+                real_session_id = await asyncio.to_thread(record_turn, session_id, user_id, message, text_response)
+            else:
+                # Gemini y las herramientas son bloqueantes: correrlos fuera del event loop
+                await history_writer.wait_for(user_id)  # Una sesión nueva se arma con el historial de la base
+                chat_obj, real_session_id = await asyncio.to_thread(get_or_create_chat, session_id, user_id)
+
+                print(f"[GRAPHQL] 🧠 Sending message to Gemini Service...")
+                gemini_resp = await asyncio.to_thread(chat_obj.send_message, message)
+                text_response = gemini_resp.text if gemini_resp.text else "(Sin respuesta...)"
+                print(f"[GRAPHQL] 🤖 Gemini response received: '{text_response[:50]}...'")
             
-            # 2. Generar Audio (ElevenLabs) si se solicita
-            audio_base64 = None
+            # 2. Persistir historial en segundo plano: corre mientras se genera el audio
+            #    y la respuesta no lo espera (sus errores se reintentan y registran aparte)
+            if user_id:
+                print(f"[GRAPHQL] 💾 Queueing chat history save...")
+                history_writer.save_turn(user_id, message, text_response, real_session_id)
+
+            # 3. Generar Audio (ElevenLabs) si se solicita; si falla, se responde sólo con texto
+            audio_url = None
             if generate_audio:
                 print(f"[GRAPHQL] 🔊 Audio generation requested. Calling ElevenLabs...")
                 # Usar solo la primera oración o dos para no gastar tanto crédito y ser rápido
                 # O enviar todo si es corto.
-                audio_base64 = generate_voice_audio(text_response)
-                status = "✅ Generated" if audio_base64 else "❌ Failed/Empty"
-                print(f"[GRAPHQL] {status} Audio. Length: {len(audio_base64) if audio_base64 else 0} chars")
-
-            # 3. Persistir historial
-            if user_id:
-                print(f"[GRAPHQL] 💾 Saving chat history to DB...")
                 try:
-                    save_chat_message(user_id, "user", message, real_session_id)
-                    save_chat_message(user_id, "model", text_response, real_session_id)
+                    audio_handle = await asyncio.to_thread(generate_voice_handle, text_response)
                 except Exception as e:
-                    print(f"[GRAPHQL] ⚠️ Error saving history: {e}")
-            
+                    print(f"[GRAPHQL] ⚠️ Error generating audio: {e}")
+                    audio_handle = None
+                audio_url = f"/audio/{audio_handle}" if audio_handle else None
+                status = "✅ Generated" if audio_url else "❌ Failed/Empty"
+                print(f"[GRAPHQL] {status} Audio. URL: {audio_url}")
+
             print(f"[GRAPHQL] 🏁 Chat mutation finished. Returning response.\n")
             return ChatResponseType(
                 response=text_response, 
                 session_id=real_session_id,
-                audio=audio_base64
+                audio_url=audio_url
             )
         except Exception as e:
             print(f"[GRAPHQL] ❌ CRITICAL ERROR: {str(e)}")
             raise Exception(str(e))
 
     @strawberry.mutation
-    def login(self, email: str, password: str) -> UserType:
-        user = authenticate_user(email, password)
+    async def login(self, email: str, password: str) -> UserType:
+        user = await authenticate_user_async(email, password)
         if not user:
             raise Exception("Credenciales inválidas")
         
@@ -90,7 +102,7 @@ class Mutation:
         )
 
     @strawberry.mutation
-    def register(
+    async def register(
         self, 
         first_name: str, 
         last_name: str, 
@@ -110,7 +122,7 @@ class Mutation:
             "phone": phone
         }
         try:
-            user_id = create_user(user_data)
+            user_id = await create_user_async(user_data)
             return UserType(
                 user_id=user_id,
                 first_name=first_name,
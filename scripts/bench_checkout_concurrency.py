@@ -0,0 +1,139 @@
+"""
+Benchmark de concurrencia del checkout.
+
+Crea N usuarios de prueba, cada uno con el mismo SKU en su carrito, y lanza
+todos los `validate_and_checkout` en paralelo. Verifica que nunca se venda
+más stock del que hay y reporta latencias y estadísticas del pool.
+Después repite el checkout de un mismo carrito varias veces en paralelo (doble
+envío): sólo una compra debe pasar y el stock se descuenta una vez.
+
+Uso (desde la raíz del repo, con el .env configurado):
+    python -m scripts.bench_checkout_concurrency --users 50 --stock 20 --qty 1 --workers 16
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db.connection import execute_query, execute_update, get_pool_stats
+from db.cart_ops import add_item_to_cart, clear_cart, validate_and_checkout
+
+BENCH_PRODUCT_ID = "BENCH-CHECKOUT-SKU"
+BENCH_EMAIL_DOMAIN = "bench.novashop.local"
+
+def setup(users: int, stock: int, qty: int) -> list:
+    execute_update("DELETE FROM product_stocks WHERE product_id = %s", (BENCH_PRODUCT_ID,))
+    execute_update(
+        """
+        INSERT INTO product_stocks (
+            id, product_id, product_name, product_sku,
+            supplier_id, supplier_name,
+            quantity_on_hand, quantity_available, quantity_reserved,
+            unit_cost, total_value,
+            warehouse_location, stock_status, is_active,
+            created_at, last_updated_at
+        ) VALUES (
+            gen_random_uuid(), %s, 'Producto Benchmark', %s,
+            'SUP-BENCH', 'Bench', %s, %s, 0, 10.00, %s,
+            'Bodega Benchmark', 1, true, NOW(), NOW()
+        )
+        """,
+        (BENCH_PRODUCT_ID, BENCH_PRODUCT_ID, stock, stock, stock * 10),
+    )
+
+    user_ids = []
+    for i in range(users):
+        rows = execute_query(
+            """
+            INSERT INTO users (first_name, last_name, email, phone, password_hash)
+            VALUES ('Bench', %s, %s, NULL, 'x')
+            ON CONFLICT (email) DO UPDATE SET is_active = true
+            RETURNING user_id
+            """,
+            (str(i), f"user{i}@{BENCH_EMAIL_DOMAIN}"),
+        )
+        user_id = str(rows[0]["user_id"])
+        clear_cart(user_id)
+        add_item_to_cart(user_id, BENCH_PRODUCT_ID, qty)
+        user_ids.append(user_id)
+    return user_ids
+
+def teardown() -> None:
+    execute_update("DELETE FROM users WHERE email LIKE %s", (f"%@{BENCH_EMAIL_DOMAIN}",))
+    execute_update("DELETE FROM product_stocks WHERE product_id = %s", (BENCH_PRODUCT_ID,))
+
+def timed_checkout(user_id: str):
+    start = time.perf_counter()
+    result = validate_and_checkout(user_id)
+    return time.perf_counter() - start, result
+
+def double_submit(user_id: str, qty: int, attempts: int) -> None:
+    execute_update(
+        "UPDATE product_stocks SET quantity_available = 1000, quantity_on_hand = 1000 WHERE product_id = %s",
+        (BENCH_PRODUCT_ID,),
+    )
+    clear_cart(user_id)
+    add_item_to_cart(user_id, BENCH_PRODUCT_ID, qty)
+    with ThreadPoolExecutor(max_workers=attempts) as executor:
+        results = list(executor.map(validate_and_checkout, [user_id] * attempts))
+    successes = sum(1 for text in results if text.startswith("**Compra Exitosa**"))
+    available = execute_query(
+        "SELECT quantity_available FROM product_stocks WHERE product_id = %s", (BENCH_PRODUCT_ID,)
+    )[0]["quantity_available"]
+    print(f"[BENCH] Doble envío: {attempts} checkouts del mismo carrito | OK: {successes} | Stock final: {available} (esperado {1000 - qty})")
+    assert successes == 1, "El mismo carrito se compró más de una vez"
+    assert available == 1000 - qty, "El stock se descontó más de una vez"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--stock", type=int, default=20)
+    parser.add_argument("--qty", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--double-submit", type=int, default=4, help="Checkouts simultáneos del mismo carrito")
+    parser.add_argument("--keep", action="store_true", help="No borrar los datos de prueba al terminar")
+    args = parser.parse_args()
+
+    print(f"[BENCH] Preparando {args.users} carritos con {args.qty}x {BENCH_PRODUCT_ID} (stock={args.stock})...")
+    user_ids = setup(args.users, args.stock, args.qty)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(timed_checkout, user_ids))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(r[0] for r in results)
+        successes = sum(1 for _, text in results if text.startswith("**Compra Exitosa**"))
+        rejected = sum(1 for _, text in results if "falta de stock" in text)
+        errors = len(results) - successes - rejected
+
+        final = execute_query(
+            "SELECT quantity_available, quantity_on_hand FROM product_stocks WHERE product_id = %s",
+            (BENCH_PRODUCT_ID,),
+        )[0]
+        expected = args.stock - successes * args.qty
+
+        print(f"[BENCH] Checkouts: {len(results)} | OK: {successes} | Sin stock: {rejected} | Errores: {errors}")
+        print(f"[BENCH] Tiempo total: {elapsed:.3f}s | Throughput: {len(results) / elapsed:.1f} checkouts/s")
+        print(
+            f"[BENCH] Latencia p50: {statistics.median(latencies) * 1000:.1f}ms | "
+            f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms | "
+            f"max: {latencies[-1] * 1000:.1f}ms"
+        )
+        print(f"[BENCH] Stock final: {final['quantity_available']} (esperado {expected})")
+        print(f"[BENCH] Pool: {get_pool_stats()}")
+
+        assert final["quantity_available"] >= 0, "Stock negativo: se vendió de más"
+        assert final["quantity_available"] == expected, "El stock no cuadra con las compras exitosas"
+        assert successes == min(args.users, args.stock // args.qty), "Se rechazaron compras con stock disponible"
+        print("[BENCH] ✅ Sin sobreventa.")
+
+        double_submit(user_ids[0], args.qty, args.double_submit)
+        print("[BENCH] ✅ Un carrito se compra una sola vez.")
+    finally:
+        if not args.keep:
+            teardown()
+
+if __name__ == "__main__":
+    main()
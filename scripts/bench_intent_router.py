@@ -0,0 +1,107 @@
+"""
+Benchmark del router de intenciones (services/intent_router.py).
+
+- Precisión: sobre frases distintas de los ejemplos de entrenamiento, cuántas se
+  responden localmente (deben ser de horario/ubicación/carrito) y cuántas pasan a
+  Gemini (todo lo demás). Un falso positivo es peor que un falso negativo.
+- Latencia del router (clasificar + llamar la herramienta + plantilla).
+- Con --live (requiere GEMINI_API_KEY) mide las mismas preguntas por Gemini con
+  tool calling, para comparar. Las preguntas de carrito van sin user_id, así que
+  nada requiere la base de datos.
+
+Uso (desde la raíz del repo):
+    python -m scripts.bench_intent_router --repeat 200
+    python -m scripts.bench_intent_router --live
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from services.intent_router import intent_router
+
+# (mensaje, ¿debe responderse localmente?)
+EVAL_SET = [
+    ("¿A qué hora abren el domingo?", True),
+    ("¿Abren los sábados?", True),
+    ("¿Hasta qué hora están abiertos hoy?", True),
+    ("horario de atención", True),
+    ("¿a qué hora cierran el viernes?", True),
+    ("¿Atienden el fin de semana?", True),
+    ("¿Dónde están los audífonos?", True),
+    ("¿Dónde encuentro un cargador?", True),
+    ("¿En qué pasillo está la tinta?", True),
+    ("¿Dónde queda el Nintendo Switch?", True),
+    ("donde estan los teclados", True),
+    ("¿Dónde consigo los AirPods?", True),
+    ("Ver mi carrito", True),
+    ("¿Qué tengo en el carrito?", True),
+    ("muéstrame mi carrito", True),
+    ("¿Cuánto cuesta el iPhone 15?", False),
+    ("Agrega los audífonos a mi carrito", False),
+    ("¿Dónde están los audífonos y cuánto cuestan?", False),
+    ("Recomiéndame una laptop para la universidad", False),
+    ("Quiero pagar el carrito", False),
+    ("¿Tienen PS5 en stock?", False),
+    ("¿Dónde queda la tienda?", False),
+    ("¿Dónde están las bicicletas?", False),
+    ("Compara el iPhone 14 con el Galaxy S24", False),
+    ("hola, buenas tardes", False),
+    ("¿Qué servicios ofrecen?", False),
+    ("Quita el mouse del carrito", False),
+    ("¿Hay descuentos en laptops?", False),
+    ("Busco un celular con buena cámara y batería que dure todo el día para viajar", False),
+    ("gracias", False),
+]
+
+def _report(label: str, latencies_ms: list) -> None:
+    latencies_ms.sort()
+    p95 = latencies_ms[max(0, int(len(latencies_ms) * 0.95) - 1)]
+    print(f"{label:<34} mean={statistics.mean(latencies_ms):.3f}ms  p50={statistics.median(latencies_ms):.3f}ms  p95={p95:.3f}ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="Comparar contra Gemini (requiere GEMINI_API_KEY)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Los logs por mensaje distorsionan la medición
+        outcomes = [(message, expected, intent_router.route(message, None)) for message, expected in EVAL_SET]
+        router_ms, routed_messages = [], [m for m, _, reply in outcomes if reply]
+        for _ in range(args.repeat):
+            for message, _ in EVAL_SET:
+                start = time.perf_counter()
+                intent_router.route(message, None)
+                router_ms.append((time.perf_counter() - start) * 1000)
+
+    tp = sum(1 for _, expected, reply in outcomes if expected and reply)
+    fp = [(m, reply.answer) for m, expected, reply in outcomes if not expected and reply]
+    fn = [m for m, expected, reply in outcomes if expected and not reply]
+    positives = sum(1 for _, expected in EVAL_SET if expected)
+    print(f"Routed locally: {tp + len(fp)}/{len(EVAL_SET)}  recall={tp / positives:.2f}  false positives={len(fp)}")
+    for message, answer in fp:
+        print(f"  ❌ routed but should reach Gemini: {message!r} -> {answer!r}")
+    for message in fn:
+        print(f"  ⚠️ sent to Gemini: {message!r}")
+    for message, _, reply in outcomes[:3]:
+        print(f"  {message!r} -> {reply.answer if reply else '(Gemini)'!r}")
+    print()
+    _report(f"router ({len(router_ms)} messages)", router_ms)
+
+    if not args.live:
+        print("Gemini path: run with --live and GEMINI_API_KEY to compare")
+        return
+
+    from services import gemini_service
+    gemini_ms = []
+    for message in routed_messages:
+        chat, session_id = gemini_service.get_or_create_chat(None, None)
+        start = time.perf_counter()
+        chat.send_message(message)
+        gemini_ms.append((time.perf_counter() - start) * 1000)
+        gemini_service.chat_sessions.discard(session_id)
+    _report(f"Gemini + tools ({len(gemini_ms)} messages)", gemini_ms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark de búsqueda de productos sobre un catálogo sintético.
+
+Compara el LIKE '%x%' original contra la búsqueda por relevancia
+(pg_trgm + unaccent + full-text) de db/create_search_indexes.sql.
+Todo ocurre en una tabla temporal dentro de una transacción: no toca product_stocks.
+
+Uso (requiere haber ejecutado db/create_search_indexes.sql):
+    python -m scripts.bench_search --rows 100000 --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from db.connection import execute_query, execute_update, transaction
+
+QUERIES = [
+    "audifonos sony",   # sin tilde
+    "Cámara Canon",     # con tilde
+    "lapto dell",       # typo
+    "inalambrico",      # palabra suelta
+    "samsung ultra",
+]
+
+CREATE_SQL = """
+    CREATE TEMP TABLE bench_products (
+        product_id VARCHAR(255) PRIMARY KEY,
+        product_name VARCHAR(255) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE
+    ) ON COMMIT DROP
+"""
+POPULATE_SQL = """
+    INSERT INTO bench_products (product_id, product_name)
+    SELECT
+        'BENCH-' || g,
+        (ARRAY['Laptop','Audífonos','Cámara','Celular','Tablet','Impresora','Teclado','Mouse','Monitor','Parlante'])[1 + g %% 10]
+        || ' ' || (ARRAY['HP','Dell','Sony','Samsung','Apple','Lenovo','Xiaomi','Logitech','Canon','Epson','Asus'])[1 + (g / 10) %% 11]
+        || ' ' || (ARRAY['Pro','Max','Ultra','Lite','Plus','Gamer','Inalámbrico','Básico'])[1 + (g / 110) %% 8]
+        || ' ' || (g %% 997)
+    FROM generate_series(1, %s) AS g
+"""
+INDEX_SQL = [
+    "CREATE INDEX ON bench_products USING gin (f_unaccent(lower(product_name)) gin_trgm_ops)",
+    "CREATE INDEX ON bench_products USING gin (to_tsvector('spanish', f_unaccent(product_name)))",
+    "ANALYZE bench_products",
+]
+
+# Consulta original de search_products
+LIKE_SQL = """
+    SELECT product_id FROM bench_products
+    WHERE LOWER(product_name) LIKE LOWER(%(pattern)s)
+    ORDER BY product_id
+"""
+# Mismo predicado y orden que RANKED_SEARCH_SQL en tools/product_tools.py
+RANKED_SQL = """
+    WITH q AS (
+        SELECT f_unaccent(lower(%(query)s)) AS text,
+               plainto_tsquery('spanish', f_unaccent(%(query)s)) AS ts
+    )
+    SELECT bp.product_id,
+           ts_rank_cd(to_tsvector('spanish', f_unaccent(bp.product_name)), q.ts)
+             + word_similarity(q.text, f_unaccent(lower(bp.product_name))) AS relevance
+    FROM q, bench_products bp
+    WHERE bp.is_active = true
+      AND (
+        to_tsvector('spanish', f_unaccent(bp.product_name)) @@ q.ts
+        OR f_unaccent(lower(bp.product_name)) %%> q.text
+      )
+    ORDER BY relevance DESC, bp.product_id
+    LIMIT %(limit)s
+"""
+
+def measure(sql: str, params: dict, repeat: int):
+    timings, rows = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = execute_query(sql, params)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[max(0, int(len(timings) * 0.95) - 1)], len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    with transaction():
+        print(f"[BENCH] Generando catálogo sintético de {args.rows} filas...")
+        execute_update(CREATE_SQL)
+        execute_update(POPULATE_SQL, (args.rows,))
+        for sql in INDEX_SQL:
+            execute_update(sql)
+
+        print(f"{'consulta':<18} | {'LIKE avg/p95 ms':>18} {'hits':>6} | {'RANKED avg/p95 ms':>18} {'hits':>6}")
+        for query in QUERIES:
+            like = measure(LIKE_SQL, {"pattern": f"%{query}%"}, args.repeat)
+            ranked = measure(RANKED_SQL, {"query": query, "limit": args.limit}, args.repeat)
+            print(
+                f"{query:<18} | {like[0]:>8.2f}/{like[1]:<8.2f} {like[2]:>6} | "
+                f"{ranked[0]:>8.2f}/{ranked[1]:<8.2f} {ranked[2]:>6}"
+            )
+
+        plan = execute_query("EXPLAIN " + RANKED_SQL, {"query": QUERIES[0], "limit": args.limit})
+        print("\n[BENCH] Plan de la búsqueda por relevancia:")
+        for row in plan:
+            print("   ", row["QUERY PLAN"])
+
+if __name__ == "__main__":
+    main()
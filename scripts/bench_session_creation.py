@@ -0,0 +1,94 @@
+"""
+Benchmark de creación de sesiones de chat.
+
+Mide, para sesiones nuevas (anónimas, sin I/O de BD):
+- `get_or_create_chat`.
+- Sesión nueva + primer mensaje hasta el momento en que el SDK sale a la red
+  (el request HTTP se corta ahí): incluye la conversión de herramientas y
+  configuración que el SDK hace por request.
+- El costo de convertir las funciones-herramienta en FunctionDeclarations.
+No se llama a la API de Gemini, así que basta una clave falsa.
+
+Uso (desde la raíz del repo):
+    python -m scripts.bench_session_creation --sessions 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "bench-dummy-key")
+
+from google.genai import types
+
+from services import gemini_service
+from tools.basic_tools import get_supermarket_hour, get_product_location, get_product_locations, get_supermarket_details
+from tools.product_tools import search_products, compare_products
+from tools.semantic_search import semantic_search_products
+from tools.cart_tools import add_product_to_cart_tool, view_cart_tool, checkout_cart_tool
+
+TOOLS = [
+    get_supermarket_hour, get_product_location, get_product_locations, get_supermarket_details,
+    search_products, semantic_search_products, compare_products,
+    add_product_to_cart_tool, view_cart_tool, checkout_cart_tool,
+]
+
+def _report(label: str, latencies_ms: list) -> None:
+    latencies_ms.sort()
+    p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+    print(f"{label:<38} mean={statistics.mean(latencies_ms):.3f}ms  p50={statistics.median(latencies_ms):.3f}ms  p95={p95:.3f}ms")
+
+class _RequestReached(Exception):
+    pass
+
+def _cut_at_network() -> list:
+    """Reemplaza el envío HTTP del cliente: registra el instante y aborta."""
+    reached = []
+
+    def request(*args, **kwargs):
+        reached.append(time.perf_counter())
+        raise _RequestReached()
+
+    gemini_service.client._api_client.request = request
+    return reached
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Los logs por sesión distorsionan la medición
+        creation = []
+        for _ in range(args.sessions):
+            start = time.perf_counter()
+            _, session_id = gemini_service.get_or_create_chat(None, None)
+            creation.append((time.perf_counter() - start) * 1000)
+            gemini_service.chat_sessions.discard(session_id)
+
+        reached = _cut_at_network()
+        first_request = []
+        for _ in range(args.sessions):
+            sent = len(reached)
+            start = time.perf_counter()
+            chat, session_id = gemini_service.get_or_create_chat(None, None)
+            try:
+                chat.send_message("hola")
+            except Exception:
+                pass
+            first_request.append((reached[sent] - start) * 1000)
+            gemini_service.chat_sessions.discard(session_id)
+
+        declarations = []
+        for _ in range(args.sessions):
+            start = time.perf_counter()
+            [types.FunctionDeclaration.from_callable_with_api_option(callable=f) for f in TOOLS]
+            declarations.append((time.perf_counter() - start) * 1000)
+
+    _report("get_or_create_chat (new session)", creation)
+    _report("new session -> first HTTP request", first_request)
+    _report(f"declarations from {len(TOOLS)} callables", declarations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark de la caché de audio TTS (services/tts_cache.py).
+
+Sintetiza frases repetidas del asistente contra el servidor TTS falso de
+scripts/check_tts_client.py (voz "slow": 200 ms por llamada) y mide:
+- miss: ElevenLabs (falso) + escritura en caché,
+- hit en memoria,
+- hit en disco (caché nueva sobre el mismo directorio, como tras un reinicio),
+y verifica que el tope de bytes del disco se respeta y no quedan temporales.
+
+Uso (desde la raíz del repo):
+    python -m scripts.bench_tts_cache --repeat 1000
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from scripts.check_tts_client import _FakeTTSHandler, _State
+
+PHRASES = [
+    "Tu carrito está vacío.",
+    "Los domingos abrimos de 11:00 a 20:00.",
+    "Encuentras los audífonos en Góndola 2, Audio.",
+    "Lo siento, no hay stock suficiente de ese producto.",
+]
+
+def _report(label: str, latencies_us: list) -> None:
+    latencies_us.sort()
+    p95 = latencies_us[max(0, int(len(latencies_us) * 0.95) - 1)]
+    print(f"{label:<22} mean={statistics.mean(latencies_us):>10.1f}µs  p50={statistics.median(latencies_us):>10.1f}µs  p95={p95:>10.1f}µs")
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTTSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp()
+    os.environ["ELEVENLABS_API_KEY"] = "fake-key"
+    os.environ["ELEVENLABS_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["TTS_CACHE_DIR"] = cache_dir
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # Los logs por llamada distorsionan la medición
+            from services import elevenlabs_service
+            from services.tts_cache import TTSCache, tts_cache_key
+            synthesize = elevenlabs_service.synthesize_speech
+
+            misses = [_timed(synthesize, phrase, "slow") for phrase in PHRASES]
+            upstream_calls = _State.requests
+            memory_hits = [_timed(synthesize, PHRASES[i % len(PHRASES)], "slow") for i in range(args.repeat)]
+            memory_stats = elevenlabs_service.tts_cache.stats()
+
+            keys = [
+                tts_cache_key(phrase, "slow", elevenlabs_service.PRIMARY_MODEL, elevenlabs_service.PRIMARY_VOICE_SETTINGS)
+                for phrase in PHRASES
+            ]
+            disk_hits = []
+            for i in range(min(args.repeat, 200)):
+                fresh = TTSCache(cache_dir)  # "Reinicio": memoria vacía, mismo disco
+                disk_hits.append(_timed(fresh.get, keys[i % len(keys)]))
+            elevenlabs_service.tts_cache = TTSCache(cache_dir)
+            for phrase in PHRASES:
+                synthesize(phrase, "slow")
+
+            small = TTSCache(tempfile.mkdtemp(), disk_bytes=3 * 1100)
+            for i in range(10):
+                small.put(f"{i:064x}", os.urandom(1024))
+            on_disk = sum(len(files) for _, _, files in os.walk(small.directory))
+            leftovers = [f for _, _, files in os.walk(cache_dir) for f in files if f.endswith(".tmp")]
+    finally:
+        server.shutdown()
+
+    _report("miss (upstream)", misses)
+    _report("memory hit", memory_hits)
+    _report("disk hit", disk_hits)
+    print(f"\nUpstream calls for {len(PHRASES) + args.repeat} requests: {upstream_calls} (after restart: {_State.requests - upstream_calls})")
+    print(f"Stats: {memory_stats}")
+    print(f"Disk cap 3.3 KB with 10 x 1 KB writes -> {on_disk} files, {small.stats()['disk_evictions']} evictions; tmp leftovers: {len(leftovers)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Prueba de GET /audio/{handle} (api.py + services/audio_handles.py) sin llamar a ElevenLabs:
+guarda un MP3 falso en la caché TTS, emite un handle y verifica
+- respuesta binaria audio/mpeg con ETag y Cache-Control,
+- Range (rango, abierto, sufijo, fuera de rango -> 416) y If-None-Match -> 304,
+- handle alterado -> 404, vencido -> 410,
+- lectura desde disco tras "reiniciar" la caché en memoria,
+y compara el tamaño en la red contra el base64 dentro del JSON de GraphQL.
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_audio_endpoint
+"""
+import json
+import base64
+import os
+import tempfile
+
+def main() -> None:
+    os.environ["TTS_CACHE_DIR"] = tempfile.mkdtemp()
+    from fastapi.testclient import TestClient
+
+    import api
+    from services import elevenlabs_service
+    from services.audio_handles import issue_audio_handle
+    from services.tts_cache import TTSCache, tts_cache_key
+
+    failures = []
+
+    def check(label: str, ok: bool) -> None:
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    audio = b"ID3" + os.urandom(40_000)
+    key = tts_cache_key("Tu carrito está vacío.", "voz", "modelo", {})
+    elevenlabs_service.tts_cache.put(key, audio)
+    url = f"/audio/{issue_audio_handle(key)}"
+    client = TestClient(api.app)
+
+    # 1. Respuesta completa
+    res = client.get(url)
+    print(f"1. GET {url[:40]}... -> {res.status_code}, {len(res.content)} bytes, {res.headers.get('content-type')}")
+    check("binary body with audio/mpeg", res.status_code == 200 and res.content == audio and res.headers["content-type"] == "audio/mpeg")
+    check("ETag and Cache-Control present", res.headers.get("etag") == f'"{key}"' and "max-age=" in res.headers.get("cache-control", ""))
+
+    # 2. Range
+    cases = [("bytes=0-99", 0, 99), ("bytes=1000-", 1000, len(audio) - 1), ("bytes=-500", len(audio) - 500, len(audio) - 1)]
+    for header, start, end in cases:
+        res = client.get(url, headers={"Range": header})
+        print(f"2. Range {header} -> {res.status_code} {res.headers.get('content-range')}")
+        check(f"{header} returns 206 with the right slice", res.status_code == 206
+              and res.content == audio[start:end + 1]
+              and res.headers.get("content-range") == f"bytes {start}-{end}/{len(audio)}")
+    res = client.get(url, headers={"Range": f"bytes={len(audio)}-"})
+    check("range past the end returns 416", res.status_code == 416 and res.headers.get("content-range") == f"bytes */{len(audio)}")
+
+    # 3. Revalidación
+    res = client.get(url, headers={"If-None-Match": f'"{key}"'})
+    check("If-None-Match returns 304 without body", res.status_code == 304 and not res.content)
+
+    # 4. Handles inválidos
+    forged = url[:-1] + ("0" if url[-1] != "0" else "1")
+    check("tampered handle returns 404", client.get(forged).status_code == 404)
+    check("expired handle returns 410", client.get(f"/audio/{issue_audio_handle(key, ttl=-1)}").status_code == 410)
+
+    # 5. Desde disco (memoria vacía, como otro worker o tras un reinicio)
+    api.tts_cache = TTSCache(os.environ["TTS_CACHE_DIR"])
+    res = client.get(url)
+    check("served from the disk tier", res.status_code == 200 and res.content == audio)
+
+    as_json = json.dumps({"data": {"chat": {"audio": base64.b64encode(audio).decode("ascii")}}})
+    print(f"\nWire size: base64 in GraphQL JSON {len(as_json)} bytes vs binary {len(audio)} bytes "
+          f"({len(as_json) / len(audio) - 1:+.0%})")
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ Audio endpoint behaves as expected")
+
+if __name__ == "__main__":
+    main()
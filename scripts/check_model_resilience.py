@@ -0,0 +1,166 @@
+"""
+Prueba de la capa de resiliencia de llamadas al modelo contra un cliente Gemini falso.
+
+El cliente falso responde con el nombre del modelo, con latencias y fallos
+configurables por modelo, y respeta el timeout HTTP del config como el SDK real.
+Escenarios (sobre `gemini_service._generate`, con plazos cortos para que corra rápido):
+1. Cola lenta: el 3% de las llamadas al primario tarda mucho; el hedge al
+   respaldo debe bajar el p99 frente a llamar sólo al primario. Antes se hace un
+   calentamiento de MODEL_HEDGE_MIN_SAMPLES llamadas: hasta entonces el hedge usa
+   el retardo fijo MODEL_HEDGE_DEFAULT_DELAY. Qué llamadas son lentas sale de una
+   secuencia fija (semilla 7), no del orden en que corren los hilos.
+2. Primario colgado: el breaker se abre y el tráfico va directo al respaldo.
+3. Recuperación: pasado BREAKER_RESET_SECONDS, una prueba cierra el breaker.
+4. Ambos colgados: la llamada falla en el plazo, no antes ni mucho después.
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_model_resilience --calls 200
+"""
+import argparse
+import itertools
+import os
+import random
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "check-dummy-key")
+os.environ.setdefault("MODEL_CALL_DEADLINE", "1.0")
+os.environ.setdefault("MODEL_HEDGE_DEFAULT_DELAY", "0.3")
+os.environ.setdefault("MODEL_HEDGE_MIN_SAMPLES", "20")
+os.environ.setdefault("BREAKER_FAILURE_THRESHOLD", "3")
+os.environ.setdefault("BREAKER_RESET_SECONDS", "1.0")
+
+from services import gemini_service
+from services.model_resilience import ModelDeadlineExceeded
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.function_calls = None
+        self.candidates = None
+
+class _FakeModels:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.behaviour = {}  # model -> fn() que retorna la latencia en segundos (None = error)
+        self.calls = {}
+
+    def generate_content(self, model, contents, config=None) -> _FakeResponse:
+        with self.lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+        latency = self.behaviour[model]()
+        timeout = config.http_options.timeout / 1000 if config and config.http_options else None
+        if latency is None:
+            raise RuntimeError(f"{model} unavailable")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"{model} timed out")
+        time.sleep(latency)
+        return _FakeResponse(model)
+
+class _FakeClient:
+    models = _FakeModels()
+
+def _p(latencies, q):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+def _schedule(calls: int, slow_ratio: float, slow: float, seed: int = 7):
+    """Latencias del primario por llamada: exactamente `slow_ratio` lentas, en orden fijo."""
+    rng = random.Random(seed)
+    latencies = [slow if i < round(calls * slow_ratio) else rng.uniform(0.01, 0.03) for i in range(calls)]
+    rng.shuffle(latencies)
+    return latencies
+
+def _sequence(values):
+    """fn() que entrega `values` en orden, aunque la llamen hilos distintos."""
+    lock, iterator = threading.Lock(), iter(values)
+
+    def next_value():
+        with lock:
+            return next(iterator)
+    return next_value
+
+def _run(calls: int):
+    contents = [gemini_service._text_content("user", "hola")]
+    config = gemini_service._session_config("test")
+    latencies, served = [], {}
+    for _ in range(calls):
+        start = time.perf_counter()
+        text = gemini_service._generate(contents, config).text
+        latencies.append(time.perf_counter() - start)
+        served[text] = served.get(text, 0) + 1
+    return latencies, served
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    fake = _FakeClient()
+    gemini_service.client = fake
+    caller = gemini_service.model_caller
+    primary, fallback = gemini_service.MODEL_ID, gemini_service.MODEL_FALLBACK
+    failures = []
+
+    def check(label: str, ok: bool) -> None:
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    # 1. Cola lenta del primario, tras el calentamiento del percentil
+    warmup = int(os.environ["MODEL_HEDGE_MIN_SAMPLES"])
+    baseline = _schedule(args.calls, slow_ratio=0.03, slow=0.6)  # Lo que tardaría llamar sólo al primario
+    fallback_latencies = random.Random(8)
+    fake.models.behaviour = {
+        primary: _sequence(itertools.chain(_schedule(warmup, 0, 0.6), baseline)),
+        fallback: _sequence(fallback_latencies.uniform(0.03, 0.05) for _ in itertools.count()),
+    }
+    _run(warmup)
+    hedged_before = caller.stats()["hedged"]
+    latencies, served = _run(args.calls)
+    print(f"1. Slow tail ({args.calls} calls after {warmup} warm-up): served={served} "
+          f"hedged={caller.stats()['hedged'] - hedged_before} hedge delay={caller.hedge_delay() * 1000:.0f}ms")
+    print(f"   primary only: p50={_p(baseline, 0.5):.0f}ms p99={_p(baseline, 0.99):.0f}ms")
+    print(f"   resilient:    p50={_p(latencies, 0.5):.0f}ms p99={_p(latencies, 0.99):.0f}ms")
+    check("hedging cuts p99", _p(latencies, 0.99) < _p(baseline, 0.99) / 2)
+    check("breaker stays closed", caller.breaker.state == "closed")
+
+    # 2. Primario colgado
+    time.sleep(0.7)  # Que terminen los primarios que quedaron corriendo
+    fake.models.behaviour[primary] = lambda: 5.0
+    fake.models.calls.clear()
+    latencies, served = _run(20)
+    stats = caller.stats()
+    print(f"2. Primary hanging: served={served} breaker={stats['breaker']} short_circuited={stats['short_circuited']}")
+    print(f"   primary attempts={fake.models.calls.get(primary, 0)} max latency={max(latencies) * 1000:.0f}ms")
+    check("every call answered by the fallback", served == {fallback: 20})
+    check("breaker opened", stats["breaker"] == "open" and stats["short_circuited"] > 0)
+    check("no call waited past the deadline", max(latencies) < caller.deadline + 0.1)
+
+    # 3. Recuperación
+    fake.models.behaviour[primary] = lambda: 0.02
+    time.sleep(caller.breaker.reset_seconds + 0.1)
+    _, served = _run(10)
+    print(f"3. Recovery after {caller.breaker.reset_seconds:g}s: served={served} breaker={caller.breaker.state}")
+    check("probe closed the breaker", caller.breaker.state == "closed" and served.get(primary) == 10)
+
+    # 4. Ambos colgados
+    fake.models.behaviour = {primary: lambda: 5.0, fallback: lambda: 5.0}
+    start = time.perf_counter()
+    try:
+        _run(1)
+        raised = False
+    except ModelDeadlineExceeded:
+        raised = True
+    elapsed = time.perf_counter() - start
+    print(f"4. Both hanging: raised={raised} after {elapsed * 1000:.0f}ms (deadline {caller.deadline * 1000:.0f}ms)")
+    check("fails at the deadline", raised and caller.deadline - 0.05 < elapsed < caller.deadline + 0.2)
+
+    print(f"\nStats: {caller.stats()}")
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ Resilience layer behaves as expected")
+
+if __name__ == "__main__":
+    main()
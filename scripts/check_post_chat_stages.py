@@ -0,0 +1,138 @@
+"""
+Prueba de las etapas posteriores a la respuesta en `Mutation.chat` (graphql_schema.py),
+con TTS, base de datos y router reemplazados por falsos con latencia configurable:
+1. Latencia: la mutación espera sólo al TTS; el historial (dos filas) se guarda en paralelo.
+2. Error transitorio de la base: se reintenta y el turno se guarda.
+3. Base caída: la respuesta (texto y audio) llega igual; la falla queda contada.
+4. TTS con excepción: se responde sólo con texto y el historial se guarda igual.
+5. Orden: mensajes seguidos del mismo usuario quedan en orden aunque la base varíe su latencia.
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_post_chat_stages --tts-ms 300 --db-ms 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("HISTORY_RETRY_DELAY", "0.05")
+
+import graphql_schema
+from services import history_writer as history_module
+from services.history_writer import history_writer
+
+MUTATION = """
+    mutation($message: String!) {
+      chat(message: $message, sessionId: "s1", userId: "u1", generateAudio: true) { response sessionId audioUrl }
+    }
+"""
+
+class _Routed:
+    def __init__(self, answer: str):
+        self.answer = answer
+
+class _FakeDB:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.jitter = 0.0
+        self.failures_left = 0
+        self.rows = []
+
+    async def save_chat_turn_async(self, user_id, message, reply, session_id=None):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.failures_left:
+            self.failures_left -= 1
+            raise ConnectionError("server closed the connection unexpectedly")
+        self.rows += [(user_id, "user", message), (user_id, "model", reply)]
+
+async def _run(args) -> list:
+    failures = []
+
+    def check(label: str, ok: bool) -> None:
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    tts_seconds, db_seconds = args.tts_ms / 1000, args.db_ms / 1000
+    db = _FakeDB(db_seconds)
+    tts = {"fail": False}
+
+    def fake_tts(text):
+        time.sleep(tts_seconds)
+        if tts["fail"]:
+            raise RuntimeError("ElevenLabs unavailable")
+        return "handle"
+
+    history_module.save_chat_turn_async = db.save_chat_turn_async
+    async def fake_route(message, user_id):
+        return _Routed(f"Respuesta a: {message}")
+
+    graphql_schema.intent_router.route_async = fake_route
+    graphql_schema.record_turn = lambda session_id, user_id, message, reply: session_id
+    graphql_schema.generate_voice_handle = fake_tts
+
+    async def chat(message: str):
+        start = time.perf_counter()
+        result = await graphql_schema.schema.execute(MUTATION, variable_values={"message": message})
+        if result.errors:
+            raise result.errors[0]
+        return result.data["chat"], time.perf_counter() - start
+
+    # 1. Latencia
+    data, elapsed = await chat("hola")
+    await history_writer.drain()
+    sequential = tts_seconds + 2 * db_seconds  # TTS + dos INSERT uno tras otro (antes)
+    print(f"1. Mutation {elapsed * 1000:.0f} ms (sequential stages would take ~{sequential * 1000:.0f} ms)")
+    check("response does not wait for history", elapsed < tts_seconds + db_seconds / 2)
+    check("turn saved in background", db.rows == [("u1", "user", "hola"), ("u1", "model", "Respuesta a: hola")])
+
+    # 2. Error transitorio
+    db.rows, db.failures_left = [], 1
+    await chat("reintento")
+    await history_writer.drain()
+    print(f"2. Transient DB error -> rows {len(db.rows)}, stats {history_writer.stats()}")
+    check("transient failure retried", len(db.rows) == 2 and history_writer.stats()["retries"] == 1)
+
+    # 3. Base caída
+    db.rows, db.failures_left = [], 100
+    data, _ = await chat("base caída")
+    await history_writer.drain()
+    db.failures_left = 0
+    print(f"3. DB down -> response '{data['response']}', audio {data['audioUrl']}")
+    check("reply and audio survive a DB outage", data["audioUrl"] == "/audio/handle" and history_writer.stats()["failed"] == 1)
+
+    # 4. TTS con excepción
+    db.rows, tts["fail"] = [], True
+    data, _ = await chat("sin audio")
+    await history_writer.drain()
+    tts["fail"] = False
+    print(f"4. TTS error -> audio {data['audioUrl']}, rows {len(db.rows)}")
+    check("TTS failure keeps text and history", data["audioUrl"] is None and len(db.rows) == 2)
+
+    # 5. Orden por usuario
+    db.rows, db.jitter = [], db_seconds * 3
+    messages = [f"mensaje {i}" for i in range(5)]
+    for message in messages:
+        await chat(message)
+    await history_writer.drain()
+    saved = [content for _, role, content in db.rows if role == "user"]
+    print(f"5. Saved order: {saved}")
+    check("per-user order preserved", saved == messages)
+
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tts-ms", type=float, default=300)
+    parser.add_argument("--db-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    failures = asyncio.run(_run(args))
+    print(f"\nHistory writer stats: {history_writer.stats()}")
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ Post-response stages behave as expected")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Prueba multi-proceso del backend compartido de sesiones.
+
+Levanta W procesos worker (como `uvicorn --workers W`), cada uno con su propio
+gemini_service y un cliente Gemini falso que responde cuántos mensajes previos
+ve en la conversación. Los turnos de una misma sesión se reparten round-robin
+entre los workers: si la sesión continúa correctamente, en el turno k el modelo
+siempre ve 2*k mensajes previos, sin importar qué worker atendió el anterior.
+Al final, dos workers atienden a la vez un turno de la misma sesión: la escritura
+condicional no debe perder ninguno (el siguiente turno ve los dos).
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_shared_sessions --backend sqlite --workers 3 --turns 9
+    python -m scripts.check_shared_sessions --backend postgres   # requiere db/create_session_state.sql
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+MODEL_DELAY = 0.3  # Ventana para que los turnos concurrentes lean la misma versión
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.function_calls = None
+        self.candidates = None
+
+class _FakeModels:
+    def generate_content(self, model, contents, config=None) -> _FakeResponse:
+        # Responde cuántos mensajes anteriores al actual recibió
+        time.sleep(MODEL_DELAY)
+        return _FakeResponse(str(len(contents) - 1))
+
+class _FakeClient:
+    models = _FakeModels()
+
+def worker(inbox, outbox) -> None:
+    from services import gemini_service
+    gemini_service.client = _FakeClient()
+    while True:
+        job = inbox.get()
+        if job is None:
+            return
+        session_id, message = job
+        chat, real_session_id = gemini_service.get_or_create_chat(session_id, None)
+        reply = chat.send_message(message).text
+        outbox.put((real_session_id, reply, os.getpid()))
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=9)
+    args = parser.parse_args()
+
+    os.environ["SESSION_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SESSION_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "sessions.db")
+
+    ctx = mp.get_context("spawn")  # Procesos limpios, sin memoria compartida con el padre
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue() for _ in range(args.workers)]
+    procs = [ctx.Process(target=worker, args=(inbox, outbox), daemon=True) for inbox in inboxes]
+    for p in procs:
+        p.start()
+
+    session_id = None
+    failures = 0
+    pids = set()
+    try:
+        for turn in range(args.turns):
+            inboxes[turn % args.workers].put((session_id, f"mensaje {turn}"))
+            real_session_id, reply, pid = outbox.get(timeout=60)
+            pids.add(pid)
+            expected = 2 * turn
+            ok = reply == str(expected) and (session_id is None or real_session_id == session_id)
+            failures += not ok
+            print(f"turn {turn}: worker pid={pid} saw {reply} previous messages (expected {expected}) {'✅' if ok else '❌'}")
+            session_id = real_session_id
+
+        # Dos turnos a la vez en workers distintos, luego uno más que debe ver ambos
+        inboxes[0].put((session_id, "concurrente A"))
+        inboxes[1 % args.workers].put((session_id, "concurrente B"))
+        outbox.get(timeout=60), outbox.get(timeout=60)
+        inboxes[2 % args.workers].put((session_id, "después"))
+        _, reply, pid = outbox.get(timeout=60)
+        expected = 2 * args.turns + 4
+        ok = reply == str(expected)
+        failures += not ok
+        print(f"after 2 concurrent turns: worker pid={pid} saw {reply} previous messages (expected {expected}) {'✅' if ok else '❌'}")
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for p in procs:
+            p.join(timeout=10)
+
+    print(f"\nSession {session_id} served by {len(pids)} worker processes via {args.backend}")
+    if failures:
+        raise SystemExit(f"❌ {failures} turns lost conversation state")
+    print("✅ Session continued across workers")
+
+if __name__ == "__main__":
+    main()
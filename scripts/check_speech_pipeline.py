@@ -0,0 +1,121 @@
+"""
+Prueba de la voz por oraciones (services/speech_pipeline.py) contra el servidor TTS falso
+de scripts/check_tts_client.py (voz "live": tarda según el largo y entrega el audio por partes).
+
+Simula un modelo que escribe la respuesta palabra por palabra y compara:
+- secuencial: esperar todo el texto y sintetizarlo de una vez (lo que hace Mutation.chat),
+- pipeline:   stream_with_speech, cada oración se sintetiza mientras se generan las siguientes.
+Verifica que el audio llega en orden de oración, que el primer audio llega antes de que
+termine el texto y que el tope de caracteres se respeta.
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_speech_pipeline --word-delay 0.04
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from scripts.check_tts_client import _FakeTTSHandler
+
+REPLY = (
+    "¡Claro! Tenemos tres modelos de audífonos disponibles en la tienda. "
+    "Los Sony WH-1000XM5 cuestan $399.99 y tienen cancelación de ruido. "
+    "Los JBL Tune 510BT son más económicos, a $49.99. "
+    "¿Quieres que agregue alguno a tu carrito?"
+)
+
+def _fake_model(text: str, word_delay: float):
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        time.sleep(word_delay)
+        yield word if i == len(words) - 1 else word + " "
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--word-delay", type=float, default=0.04)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTTSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["ELEVENLABS_API_KEY"] = "fake-key"
+    os.environ["ELEVENLABS_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["TTS_CACHE_DIR"] = tempfile.mkdtemp()
+
+    from services.elevenlabs_service import synthesize_speech
+    from services.speech_pipeline import AudioChunk, SentenceSplitter, SpeechPipeline, stream_with_speech
+
+    failures = []
+
+    def check(label: str, ok: bool) -> None:
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    # 1. Cortes de oración
+    splitter = SentenceSplitter(min_chars=10)
+    pieces = []
+    for delta in ["Cuesta $899.99 en total. ", "Lo atiende la Sra. ", "Pérez en caja 2. ¿Algo", " más?"]:
+        pieces += splitter.feed(delta)
+    pieces.append(splitter.flush())
+    print(f"1. Splitter -> {pieces}")
+    check("no cut on decimals or abbreviations", pieces == [
+        "Cuesta $899.99 en total.", "Lo atiende la Sra. Pérez en caja 2.", "¿Algo más?"])
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # Los logs por oración ensucian la salida
+            # 2. Secuencial: texto completo, luego TTS
+            start = time.perf_counter()
+            text = "".join(_fake_model(REPLY, args.word_delay))
+            text_done = time.perf_counter() - start
+            synthesize_speech(text, "live")
+            sequential_first_audio = time.perf_counter() - start
+
+            # 3. Pipeline
+            start = time.perf_counter()
+            first_audio = text_done_pipeline = None
+            received, sentences, seqs = [], {}, []
+            for item in stream_with_speech(_fake_model(REPLY, args.word_delay), "live"):
+                now = time.perf_counter() - start
+                if isinstance(item, AudioChunk):
+                    if item.data and first_audio is None:
+                        first_audio = now
+                    seqs.append(item.seq)
+                    sentences[item.seq] = item.sentence
+                    received.append(item.data)
+                else:
+                    text_done_pipeline = now
+            pipeline_done = time.perf_counter() - start
+
+            # 4. Tope de caracteres
+            tiny = SpeechPipeline("live", max_chars=40, synthesize=lambda s, v: iter([s.encode("utf-8")]))
+            for delta in _fake_model(REPLY, 0):
+                tiny.feed(delta)
+            tiny.close()
+            spoken = b"".join(chunk.data for chunk in tiny.chunks()).decode("utf-8")
+    finally:
+        server.shutdown()
+
+    audio_text = b"".join(received).decode("utf-8")
+    ordered = [sentences[seq] for seq in sorted(sentences)]
+    print(f"2. Sequential: text done {text_done * 1000:.0f} ms, first audio {sequential_first_audio * 1000:.0f} ms")
+    print(f"3. Pipeline:   text done {text_done_pipeline * 1000:.0f} ms, first audio {first_audio * 1000:.0f} ms, "
+          f"all audio {pipeline_done * 1000:.0f} ms, {len(ordered)} sentences")
+    check("audio arrives in sentence order", seqs == sorted(seqs) and audio_text == "".join(ordered))
+    check("every sentence is spoken", " ".join(ordered) == REPLY)
+    check("first audio before the text is finished", first_audio < text_done_pipeline)
+    check("first audio sooner than sequential", first_audio < sequential_first_audio)
+    print(f"4. Budget 40 chars -> spoke {len(spoken)} chars")
+    check("character budget holds", len(spoken) <= 40)
+
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ Speech pipeline behaves as expected")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Prueba del cliente HTTP de ElevenLabs (services/tts_client.py) contra un servidor TTS falso local.
+
+El servidor imita POST /v1/text-to-speech/{voice_id}; el voice_id elige el comportamiento:
+- ok:       responde MP3 falso al instante.
+- flaky:    503 dos veces por texto, luego 200 (los reintentos deben cubrirlo).
+- stall:    no responde a tiempo (el read timeout debe cortar, con reintentos acotados).
+- slow:     tarda 0.2 s (para medir el límite de concurrencia).
+- noturbo:  400 para eleven_turbo_v2_5 (synthesize_speech debe pasar a Multilingual v2).
+- live:     tarda según el largo del texto; por /stream entrega el MP3 en partes mientras "genera"
+            (lo usa scripts/check_speech_pipeline.py).
+También cuenta conexiones TCP: con keep-alive, muchas llamadas reusan pocas.
+
+Uso (desde la raíz del repo):
+    python -m scripts.check_tts_client
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_MP3 = b"ID3" + b"\x00" * 1024
+STALL_SECONDS = 3.0
+LIVE_FIRST_BYTE = 0.15      # Voz "live": primer byte
+LIVE_SECONDS_PER_CHAR = 0.003
+LIVE_PARTS = 4
+
+class _State:
+    lock = threading.Lock()
+    connections = 0
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+    flaky_attempts = {}
+    models = []
+
+class _FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def setup(self):
+        super().setup()
+        with _State.lock:
+            _State.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str = "audio/mpeg") -> None:
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente ya cortó por timeout
+
+    def _reply_live(self, text: str, stream: bool) -> None:
+        total = LIVE_FIRST_BYTE + LIVE_SECONDS_PER_CHAR * len(text)
+        audio = text.encode("utf-8")  # El "audio" es el texto: permite verificar el orden
+        if not stream:
+            time.sleep(total)
+            return self._reply(200, audio)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(LIVE_FIRST_BYTE)
+        step = -(-len(audio) // LIVE_PARTS)
+        for i in range(0, len(audio), step):
+            part = audio[i:i + step]
+            self.wfile.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+            self.wfile.flush()
+            time.sleep((total - LIVE_FIRST_BYTE) / LIVE_PARTS)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        voice = self.path.split("/text-to-speech/", 1)[1].split("/")[0]
+        with _State.lock:
+            _State.requests += 1
+            _State.in_flight += 1
+            _State.max_in_flight = max(_State.max_in_flight, _State.in_flight)
+            _State.models.append(payload["model_id"])
+        try:
+            if voice == "flaky":
+                with _State.lock:
+                    attempts = _State.flaky_attempts[payload["text"]] = _State.flaky_attempts.get(payload["text"], 0) + 1
+                if attempts <= 2:
+                    return self._reply(503, b'{"detail": "busy"}', "application/json")
+            elif voice == "stall":
+                time.sleep(STALL_SECONDS)
+            elif voice == "slow":
+                time.sleep(0.2)
+            elif voice == "noturbo" and payload["model_id"] == "eleven_turbo_v2_5":
+                return self._reply(400, b'{"detail": "model not supported"}', "application/json")
+            elif voice == "live":
+                return self._reply_live(payload["text"], self.path.endswith("/stream"))
+            self._reply(200, FAKE_MP3)
+        finally:
+            with _State.lock:
+                _State.in_flight -= 1
+
+def _reset() -> None:
+    with _State.lock:
+        _State.connections = _State.requests = _State.in_flight = _State.max_in_flight = 0
+        _State.models = []
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTTSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.environ["ELEVENLABS_API_KEY"] = "fake-key"
+    os.environ["ELEVENLABS_BASE_URL"] = base_url
+    os.environ["TTS_CACHE_DIR"] = tempfile.mkdtemp()  # Sin audio de corridas anteriores
+    from services import elevenlabs_service
+    from services.tts_client import TTSClient, TTSError
+
+    failures = []
+
+    def check(label: str, ok: bool) -> None:
+        print(f"  {'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    payload = {"text": "hola", "model_id": "eleven_turbo_v2_5"}
+    client = TTSClient("fake-key", base_url=base_url, pool_size=4, max_concurrency=4,
+                       connect_timeout=1, read_timeout=0.5, max_retries=2, backoff_base=0.05)
+
+    # 1. Keep-alive
+    _reset()
+    for _ in range(30):
+        client.text_to_speech("ok", payload)
+    print(f"1. 30 sequential calls -> {_State.connections} TCP connection(s)")
+    check("connections are reused", _State.connections == 1)
+
+    # 2. Reintentos ante 503
+    _reset()
+    audio = client.text_to_speech("flaky", dict(payload, text="reintento"))
+    print(f"2. Flaky upstream: {_State.requests} attempts, audio={len(audio)} bytes")
+    check("retried transient errors until success", audio == FAKE_MP3 and _State.requests == 3)
+
+    # 3. Upstream colgado
+    _reset()
+    start = time.perf_counter()
+    try:
+        client.text_to_speech("stall", payload)
+        error = None
+    except TTSError as e:
+        error = e
+    elapsed = time.perf_counter() - start
+    print(f"3. Stalled upstream: {type(error).__name__ if error else 'no error'} after {elapsed:.2f}s, {_State.requests} attempts")
+    check("read timeout bounds the call", error is not None and _State.requests == 3 and elapsed < STALL_SECONDS)
+
+    # 4. Límite de concurrencia
+    _reset()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda i: client.text_to_speech("slow", dict(payload, text=str(i))), range(16)))
+    print(f"4. 16 concurrent callers, cap 4 -> max in flight upstream = {_State.max_in_flight}")
+    check("concurrency cap holds", _State.max_in_flight <= 4)
+
+    # 5. synthesize_speech: fallback de modelo ante 400
+    _reset()
+    audio = elevenlabs_service.synthesize_speech("Tu carrito está vacío.", voice_id="noturbo")
+    print(f"5. synthesize_speech with turbo rejected -> models tried {_State.models}")
+    check("falls back to Multilingual v2", audio is not None and _State.models == ["eleven_turbo_v2_5", "eleven_multilingual_v2"])
+
+    print(f"\nClient stats: {client.stats()}")
+    server.shutdown()
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ TTS client behaves as expected")
+
+if __name__ == "__main__":
+    main()
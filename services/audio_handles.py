@@ -0,0 +1,38 @@
+"""
+Handles de audio de vida corta para servir el MP3 por GET /audio/{handle}.
+
+El handle es la clave del audio en la caché TTS, su vencimiento y una firma HMAC:
+no hay estado que guardar ni limpiar, vence solo y cualquier worker lo valida
+(el audio se lee de la caché compartida en disco). Con varios workers todos
+deben usar el mismo AUDIO_HANDLE_SECRET.
+"""
+import os
+import hmac
+import time
+import hashlib
+import secrets
+from typing import Optional, Tuple
+
+AUDIO_HANDLE_TTL = int(os.getenv("AUDIO_HANDLE_TTL", "300"))
+# Sin secreto configurado se genera uno por proceso (válido con un solo worker)
+AUDIO_HANDLE_SECRET = os.getenv("AUDIO_HANDLE_SECRET") or secrets.token_hex(32)
+
+def _sign(key: str, expires: int) -> str:
+    message = f"{key}.{expires}".encode("ascii")
+    return hmac.new(AUDIO_HANDLE_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+def issue_audio_handle(key: str, ttl: int = AUDIO_HANDLE_TTL) -> str:
+    expires = int(time.time()) + ttl
+    return f"{key}.{expires}.{_sign(key, expires)}"
+
+def resolve_audio_handle(handle: str) -> Optional[Tuple[str, int]]:
+    """(clave de caché, vencimiento en epoch) si la firma es válida; None si no. No revisa el vencimiento."""
+    try:
+        key, expires_text, signature = handle.split(".")
+        expires = int(expires_text)
+        expected = _sign(key, expires)
+    except ValueError:  # Formato inválido (incluye caracteres no ASCII)
+        return None
+    if not hmac.compare_digest(signature.encode("utf-8"), expected.encode("ascii")):
+        return None
+    return key, expires
@@ -0,0 +1,111 @@
+"""
+Ventana de contexto con presupuesto de tokens para las conversaciones.
+
+Los turnos más antiguos se pliegan en un resumen acumulado (ver
+ChatSession en gemini_service), así el prompt por turno se mantiene acotado
+aunque la conversación sea larga. Los tokens se estiman por caracteres
+(~4 por token): alcanza para decidir cuándo plegar sin llamar a la API.
+"""
+import os
+from typing import Callable, List, Optional
+
+from google.genai import types
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Al plegar se baja a esta fracción del presupuesto, para no resumir en cada turno
+HISTORY_FOLD_TARGET = 0.5
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "150"))
+SUMMARY_MAX_CHARS = SUMMARY_MAX_WORDS * 8
+_CHARS_PER_TOKEN = 4
+_TOOL_SNIPPET_CHARS = 300
+
+SUMMARY_PROMPT = """Actualiza el resumen de una conversación entre un cliente y el asistente de NovaShop.
+Máximo {max_words} palabras, texto plano. Conserva lo que sirva para continuar la conversación:
+productos consultados (nombre, product_id, SKU, precio), lo que está en el carrito, preferencias
+y presupuesto del cliente, y preguntas pendientes. Omite saludos y detalles irrelevantes.
+
+RESUMEN ANTERIOR:
+{previous}
+
+TURNOS NUEVOS:
+{transcript}
+
+RESUMEN ACTUALIZADO:"""
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+def _part_text(part: types.Part) -> str:
+    if part.text:
+        return part.text
+    if part.function_call:
+        return f"{part.function_call.name}({part.function_call.args})"
+    if part.function_response:
+        return str(part.function_response.response)
+    return ""
+
+def content_tokens(content: types.Content) -> int:
+    return sum(estimate_tokens(_part_text(part)) for part in content.parts or [])
+
+def is_user_message(content: types.Content) -> bool:
+    """Mensaje del cliente (no respuesta de herramienta): los únicos puntos donde se puede cortar."""
+    return content.role == "user" and bool(content.parts) and content.parts[0].function_response is None
+
+def fold_point(contents: List[types.Content], budget: int = HISTORY_TOKEN_BUDGET) -> int:
+    """
+    Cuántos contenidos del inicio hay que plegar en el resumen (0 si entra en el presupuesto).
+    El corte cae siempre al inicio de un mensaje del cliente para no separar
+    una llamada a herramienta de su respuesta.
+    """
+    sizes = [content_tokens(c) for c in contents]
+    total = sum(sizes)
+    if total <= budget:
+        return 0
+    target = int(budget * HISTORY_FOLD_TARGET)
+    cut = 0
+    for index, content in enumerate(contents):
+        if index > 0 and is_user_message(content):
+            cut = index
+            if total <= target:
+                break
+        total -= sizes[index]
+    return cut
+
+def window_turns(turns: List, budget: int = HISTORY_TOKEN_BUDGET) -> List:
+    """Los turnos de texto (rol, texto) más recientes que entran en el presupuesto, empezando en un turno del cliente."""
+    total, start = 0, len(turns)
+    for index in range(len(turns) - 1, -1, -1):
+        total += estimate_tokens(turns[index][1])
+        if total > budget:
+            break
+        start = index
+    while start < len(turns) and turns[start][0] != "user":
+        start += 1
+    return turns[start:]
+
+def transcript(contents: List[types.Content]) -> str:
+    lines = []
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                speaker = "Cliente" if content.role == "user" else "Asistente"
+                lines.append(f"{speaker}: {part.text}")
+            elif part.function_call:
+                lines.append(f"[Herramienta {part.function_call.name}({part.function_call.args})]")
+            elif part.function_response:
+                lines.append(f"[Resultado: {str(part.function_response.response)[:_TOOL_SNIPPET_CHARS]}]")
+    return "\n".join(lines)
+
+def summarize(generate: Callable[[str], Optional[str]], previous: Optional[str], contents: List[types.Content]) -> str:
+    """Resumen acumulado: `previous` + `contents`. Si el modelo falla, conserva un extracto recortado."""
+    text = transcript(contents)
+    try:
+        summary = generate(SUMMARY_PROMPT.format(
+            max_words=SUMMARY_MAX_WORDS, previous=previous or "(vacío)", transcript=text
+        ))
+        if summary and summary.strip():
+            return summary.strip()[:SUMMARY_MAX_CHARS]
+    except Exception as e:
+        print(f"[CONTEXT] ⚠️ Summary generation failed, keeping an excerpt: {e}")
+    # Extracto: lo más reciente pesa más para continuar la conversación
+    return ((previous or "") + "\n" + text)[-SUMMARY_MAX_CHARS:].strip()
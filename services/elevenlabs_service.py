@@ -1,71 +1,130 @@
 import os
-import requests
-import base64
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
+from services.tts_client import TTSClient, TTSError
+from services.tts_cache import TTSCache, tts_cache_key
+from services.audio_handles import issue_audio_handle
+
 load_dotenv()
 
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-DEFAULT_VOICE_ID = "ErXwobaYiN019PkySvjV" 
+DEFAULT_VOICE_ID = "ErXwobaYiN019PkySvjV"
+# Limitar texto para evitar costos excesivos en pruebas
+TTS_MAX_CHARS = 500
+
+# Configuración principal (Turbo v2.5 - Rápido y buena calidad)
+PRIMARY_MODEL = "eleven_turbo_v2_5"
+PRIMARY_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.8
+    # Eliminamos style y use_speaker_boost que pueden fallar en Turbo
+}
+# Fallback a Multilingual v2 (Más compatible)
+FALLBACK_MODEL = "eleven_multilingual_v2"
+FALLBACK_VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
+
+# Conexiones keep-alive, timeouts, reintentos y límite de concurrencia compartidos
+tts_client = TTSClient(ELEVENLABS_API_KEY)
+# Frases repetidas ("Tu carrito está vacío.", horarios...) se sintetizan una sola vez
+tts_cache = TTSCache()
+
+def _cache_keys(text: str, voice_id: str) -> Tuple[str, str]:
+    return (
+        tts_cache_key(text, voice_id, PRIMARY_MODEL, PRIMARY_VOICE_SETTINGS),
+        tts_cache_key(text, voice_id, FALLBACK_MODEL, FALLBACK_VOICE_SETTINGS),
+    )
 
-def generate_voice_audio(text: str, voice_id: str = DEFAULT_VOICE_ID) -> Optional[str]:
+def synthesize_speech(text: str, voice_id: str = DEFAULT_VOICE_ID) -> Optional[bytes]:
+    """MP3 de `text` (desde la caché si ya se sintetizó). None si ElevenLabs no está disponible o falla."""
+    found = _synthesize(text, voice_id)
+    return found[1] if found else None
+
+def _synthesize(text: str, voice_id: str) -> Optional[Tuple[str, bytes]]:
+    """(clave de caché, MP3) o None."""
     if not ELEVENLABS_API_KEY:
         print("⚠️ No ELEVENLABS_API_KEY found.")
         return None
 
-    # Limitar texto para evitar costos excesivos en pruebas
-    if len(text) > 500:
-        text = text[:497] + "..."
+    if len(text) > TTS_MAX_CHARS:
+        text = text[:TTS_MAX_CHARS - 3] + "..."
 
-    print(f"[ELEVENLABS] 🎙️ Start generation. Text preview: '{text[:50]}...' (Voice: {voice_id})")
+    primary_key, fallback_key = _cache_keys(text, voice_id)
+    found = tts_cache.lookup(primary_key, fallback_key)
+    if found is not None:
+        print(f"[ELEVENLABS] ⚡ Cache hit for '{text[:50]}...' ({len(found[1])} bytes)")
+        return found
 
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": ELEVENLABS_API_KEY
-    }
-
-    # Configuración principal (Turbo v2.5 - Rápido y buena calidad)
-    data = {
-        "text": text,
-        "model_id": "eleven_turbo_v2_5", 
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.8
-            # Eliminamos style y use_speaker_boost que pueden fallar en Turbo
-        }
-    }
+    print(f"[ELEVENLABS] 🎙️ Start generation. Text preview: '{text[:50]}...' (Voice: {voice_id})")
 
     try:
         print(f"[ELEVENLABS] 📡 Sending POST request (Turbo v2.5)...")
-        response = requests.post(url, json=data, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"[ELEVENLABS] ⚠️ Primary Error: {response.status_code} - {response.text}")
+        try:
+            audio = tts_client.text_to_speech(voice_id, {
+                "text": text, "model_id": PRIMARY_MODEL, "voice_settings": PRIMARY_VOICE_SETTINGS,
+            })
+            key = primary_key
+        except TTSError as e:
+            if e.status is None:
+                raise  # Red/timeout ya reintentados: otro modelo no lo arregla
+            print(f"[ELEVENLABS] ⚠️ Primary Error: {e}")
             print(f"[ELEVENLABS] 🔄 Switching to Fallback Model (Multilingual v2)...")
-            
-            # Fallback a Multilingual v2 (Más compatible)
-            data["model_id"] = "eleven_multilingual_v2"
-            data["voice_settings"] = {
-                "stability": 0.5,
-                "similarity_boost": 0.5,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
-            response = requests.post(url, json=data, headers=headers)
-
-        if response.status_code == 200:
-            # Convertir binario a base64 para enviarlo fácil por JSON
-            audio_base64 = base64.b64encode(response.content).decode('utf-8')
-            print(f"[ELEVENLABS] ✅ Audio generated successfully! Size: {len(audio_base64)} chars (base64)")
-            return audio_base64
-        else:
-            print(f"[ELEVENLABS] ❌ Fallback API Error: {response.status_code} - {response.text}")
-            return None
-            
+            audio = tts_client.text_to_speech(voice_id, {
+                "text": text, "model_id": FALLBACK_MODEL, "voice_settings": FALLBACK_VOICE_SETTINGS,
+            })
+            key = fallback_key
+
+        tts_cache.put(key, audio)
+        print(f"[ELEVENLABS] ✅ Audio generated successfully! Size: {len(audio)} bytes")
+        return key, audio
+
     except Exception as e:
         print(f"❌ Error generating audio: {str(e)}")
         return None
+
+def stream_speech(text: str, voice_id: str = DEFAULT_VOICE_ID) -> Iterator[bytes]:
+    """
+    Como `synthesize_speech` pero con el endpoint de streaming: entrega el MP3 por partes
+    a medida que ElevenLabs lo genera. Al completarse queda en la caché. Lanza TTSError.
+    """
+    primary_key, fallback_key = _cache_keys(text, voice_id)
+    audio = tts_cache.get(primary_key, fallback_key)
+    if audio is not None:
+        yield audio
+        return
+
+    attempts = (
+        (PRIMARY_MODEL, PRIMARY_VOICE_SETTINGS, primary_key),
+        (FALLBACK_MODEL, FALLBACK_VOICE_SETTINGS, fallback_key),
+    )
+    for model_id, voice_settings, key in attempts:
+        chunks = []
+        try:
+            for chunk in tts_client.text_to_speech_stream(voice_id, {
+                "text": text, "model_id": model_id, "voice_settings": voice_settings,
+            }):
+                chunks.append(chunk)
+                yield chunk
+        except TTSError as e:
+            # Sólo se cambia de modelo si el primario rechazó el pedido antes de enviar audio
+            if chunks or e.status is None or model_id == FALLBACK_MODEL:
+                raise
+            print(f"[ELEVENLABS] ⚠️ Primary stream error: {e}. Switching to Fallback Model (Multilingual v2)...")
+            continue
+        tts_cache.put(key, b"".join(chunks))
+        return
+
+def generate_voice_handle(text: str, voice_id: str = DEFAULT_VOICE_ID) -> Optional[str]:
+    """
+    Sintetiza `text` y retorna un handle de vida corta para GET /audio/{handle}: el MP3
+    queda en la caché y viaja como binario, no como base64 dentro del JSON.
+    """
+    found = _synthesize(text, voice_id)
+    if found is None:
+        return None
+    return issue_audio_handle(found[0])
@@ -1,18 +1,32 @@
 import os
+import time
 import uuid
-from typing import Dict, Optional, List
+import typing
+import inspect
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Callable, Dict, Iterator, Optional, List, Set, Tuple
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
 # Import tools
-from tools.basic_tools import get_supermarket_hour, get_product_location, get_supermarket_details
+from tools.basic_tools import get_supermarket_hour, get_product_location, get_product_locations, get_supermarket_details
 from tools.product_tools import search_products, compare_products
+from tools.semantic_search import semantic_search_products
 from tools.cart_tools import add_product_to_cart_tool, view_cart_tool, checkout_cart_tool
+from tools.tool_cache import cached_tool, current_session_id, tool_cache
 
 # Import DB
 from db.user_ops import get_user_by_id
-from db.chat_ops import get_recent_chat_history
+from db.chat_ops import get_chat_history_after, get_chat_summary, get_session_history_id, save_chat_summary
+
+from services.cache import TTLCache
+from services.session_store import SessionStore
+from services.session_backend import SessionState, Turn, create_session_backend
+from services.context_window import content_tokens, fold_point, is_user_message, summarize, window_turns
+from services.model_resilience import MODEL_CALL_DEADLINE, ResilientModelCaller
 
 load_dotenv(".env")
 
@@ -21,129 +35,570 @@ api_key = os.getenv("GEMINI_API_KEY")
 client = genai.Client(api_key=api_key) if api_key else None
 MODEL_ID = "gemini-2.5-flash"
 MODEL_FALLBACK = "gemini-2.0-flash"
+MAX_TOOL_ROUNDS = 10  # Igual que el límite de llamadas del function calling automático
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", MODEL_FALLBACK)  # Resúmenes de historial: modelo rápido
+
+USER_PROFILE_CACHE_TTL = float(os.getenv("USER_PROFILE_CACHE_TTL", "300"))
+
+# Llamadas a herramientas de un mismo turno del modelo: en paralelo, con límite de hilos y de tiempo
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "15"))
+
+# --- Tool Registry ---
+# Las declaraciones se generan una sola vez al importar; pasar las funciones
+# crudas hace que el SDK las vuelva a introspeccionar en cada request.
+TOOL_FUNCTIONS: Dict[str, Callable[..., str]] = {
+    fn.__name__: fn
+    for fn in (
+        get_supermarket_hour,
+        get_product_location,
+        get_product_locations,
+        get_supermarket_details,
+        search_products,
+        semantic_search_products,
+        compare_products,
+        add_product_to_cart_tool,
+        view_cart_tool,
+        checkout_cart_tool,
+    )
+}
+TOOLS = types.Tool(function_declarations=[
+    types.FunctionDeclaration.from_callable_with_api_option(callable=fn) for fn in TOOL_FUNCTIONS.values()
+])
+
+def _int_params(fn: Callable) -> Set[str]:
+    hints = typing.get_type_hints(fn)
+    return {
+        name for name in inspect.signature(fn).parameters
+        if hints.get(name) is int or int in typing.get_args(hints.get(name))
+    }
+
+# El modelo envía números JSON: 2.0 debe llegar como 2 a los parámetros int
+_TOOL_INT_PARAMS = {name: _int_params(fn) for name, fn in TOOL_FUNCTIONS.items()}
+# Lo que realmente se ejecuta: con memoización según tools/tool_cache.py
+_TOOL_RUNNERS = {name: cached_tool(fn) for name, fn in TOOL_FUNCTIONS.items()}
+
+# --- System Instruction ---
+# Prefijo estático (idéntico para todas las sesiones, apto para context caching del modelo);
+# sólo el bloque final con el usuario cambia por sesión.
+SYSTEM_PROMPT_PREFIX = """Eres un asistente útil de una tienda de electrónica (NovaShop).
+
+IMPORTANTE: SIEMPRE que uses herramientas de carrito (add_product_to_cart_tool, view_cart_tool, checkout_cart_tool),
+DEBES pasar el ID indicado en TU CONTEXTO ACTUAL (al final) como el argumento `user_id`. No preguntes el ID al usuario.
+
+OBJETIVO PRINCIPAL: AHORRO DE PALABRAS (CRÍTICO)
+- Tu salida se convierte a audio pago. CADA CARÁCTER CUENTA.
+- Sé EXTREMADAMENTE conciso y directo, pero sin olvidar signos de puntuacion.
+- NO saludes si no es el primer mensaje. NO te despidas innecesariamente.
+- Ve al grano. Responde la pregunta y punto, siendo amable pero no tan efusivo.
+- Usa frases cortas. Máximo 1 o 2 oraciones si es posible.
+- Evita palabras de relleno como "Claro que sí", "Por supuesto", "Entiendo", "Me parece genial".
+- Si el usuario pide un producto, di el precio y características clave y ya.
+- EJEMPLO CORRECTO: "El iPhone 15 cuesta 899 dolares y tiene 128 gigas de almacenamiento."
+- EJEMPLO INCORRECTO: "Claro, con gusto te ayudo. El iPhone 15 es un excelente dispositivo que cuesta $899 dólares y cuenta con una capacidad de 128GB."
+
+REGLAS DE BÚSQUEDA:
+- Si el cliente describe una necesidad (uso, presupuesto, productos que descarta) en vez de un nombre concreto,
+  usa UNA sola llamada a `semantic_search_products` con max_price y exclude_skus en lugar de varias búsquedas.
+
+REGLAS DE CARRITO:
+1. Para agregar items: Primero BUSCA el producto para obtener su ID exacto (product_id), luego usa `add_product_to_cart_tool`.
+2. Si el usuario quiere "terminar", "pagar" o "comprar el carrito", usa `checkout_cart_tool`.
+3. Si `checkout_cart_tool` falla por stock, sugiere alternativas o pregunta si quiere comprar lo que hay.
+
+REGLAS DE FORMATO:
+- NO uses asteriscos (**) para negritas ni formato Markdown. Escribe texto plano limpio.
+- Ejemplo INCORRECTO: **Producto**
+- Ejemplo CORRECTO: Producto
+"""
+
+def _user_context(user: Dict) -> str:
+    """Bloque de persona del system instruction según el perfil del usuario."""
+    age_context = ""
+    if user.get("age"):
+        if user["age"] < 18:
+            age_context = "El usuario es adolescente. Usa un tono fresco, amigable y dinámico. Utiliza tambien muchos populismos lingüísticos / expresiones populares de la Costa ecuatoriana, ese hablar bien callejero (ejemplo: Ñaño, ya pues, oe, esta full, etc)."
+        elif user["age"] > 60:
+            age_context = "El usuario es un adulto mayor. Sé muy claro, paciente y respetuoso."
+        else:
+            age_context = "El usuario es un adulto. Mantén un tono profesional."
+
+    return f"""
+INFORMACIÓN DEL USUARIO:
+- Nombre: {user['first_name']} {user['last_name']}
+- Edad: {user.get('age', 'No especificada')}
+
+GUÍA DE PERSONALIDAD:
+{age_context}
+"""
+
+def _system_instruction(user_id: Optional[str], user: Optional[Dict]) -> str:
+    return SYSTEM_PROMPT_PREFIX + f"""
+TU CONTEXTO ACTUAL (ID de Usuario):
+Si el usuario está logueado, su ID es: "{user_id if user_id else 'ANONYMOUS'}"
+En herramientas de carrito usa user_id="{user_id if user_id else ''}".
+""" + (_user_context(user) if user else "")
+
+def _with_summary(system_instruction: str, summary: Optional[str]) -> str:
+    if not summary:
+        return system_instruction
+    return system_instruction + f"""
+RESUMEN DE LA CONVERSACIÓN ANTERIOR (turnos que ya no ves completos):
+{summary}
+"""
+
+def _session_config(system_instruction: str) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        tools=[TOOLS],
+        system_instruction=system_instruction,
+        # El loop de herramientas lo maneja ChatSession
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+        # El request HTTP también se corta en el plazo: un intento abandonado por el hedge no queda colgado
+        http_options=types.HttpOptions(timeout=int(MODEL_CALL_DEADLINE * 1000)),
+    )
+
+# --- Model Calls ---
+
+def _text_content(role: str, text: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part.from_text(text=text)])
+
+def _model_content(response, reply: str) -> types.Content:
+    candidates = response.candidates or []
+    content = candidates[0].content if candidates else None
+    return content or _text_content("model", reply)
 
-# Session Storage
-chat_sessions: Dict[str, object] = {}
+# Plazo, hedge al modelo de respaldo y circuit breaker (ver services/model_resilience.py)
+model_caller = ResilientModelCaller(MODEL_ID, MODEL_FALLBACK)
+
+def _generate(contents: List[types.Content], config: types.GenerateContentConfig):
+    return model_caller.call(
+        lambda model: client.models.generate_content(model=model, contents=contents, config=config)
+    )
+
+def _generate_stream(contents: List[types.Content], config: types.GenerateContentConfig) -> Iterator[types.GenerateContentResponse]:
+    """
+    Como `_generate` pero por chunks. Respeta el circuit breaker; el fallback sólo
+    aplica si el primario falla antes del primer chunk (después no hay cómo retractarse).
+    """
+    models = [MODEL_ID, MODEL_FALLBACK] if model_caller.breaker.allow() else [MODEL_FALLBACK]
+    for model in models:
+        try:
+            stream = client.models.generate_content_stream(model=model, contents=contents, config=config)
+            first = next(stream, None)
+        except Exception as e:
+            model_caller.record(model, False)
+            if model == models[-1]:
+                raise
+            print(f"[GEMINI] ⚠️ Error streaming {model}: {e}. Trying fallback...")
+            continue
+        model_caller.record(model, True)
+        if first is not None:
+            yield first
+            yield from stream
+        return
+
+def _generate_summary(prompt: str) -> Optional[str]:
+    return client.models.generate_content(model=SUMMARY_MODEL, contents=prompt).text
+
+def _run_tool(call: types.FunctionCall) -> Any:
+    fn = _TOOL_RUNNERS.get(call.name)
+    if fn is None:
+        return {"error": f"Herramienta desconocida: {call.name}"}
+    args = dict(call.args or {})
+    for name in _TOOL_INT_PARAMS[call.name]:
+        if isinstance(args.get(name), float):
+            args[name] = int(args[name])
+    try:
+        print(f"[GEMINI] 🛠️ Tool call: {call.name}({args})")
+        return {"result": fn(**args)}
+    except Exception as e:
+        print(f"[GEMINI] ⚠️ Tool {call.name} failed: {e}")
+        return {"error": str(e)}
+
+# Modifican el carrito: entre sí se ejecutan en serie y en el orden pedido por el modelo
+_SEQUENTIAL_TOOLS = {"add_product_to_cart_tool", "checkout_cart_tool"}
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="gemini-tool")
+
+def _run_tool_chain(calls: List[types.FunctionCall]) -> List[Any]:
+    return [_run_tool(call) for call in calls]
+
+def _run_tools_concurrently(calls: List[types.FunctionCall]) -> List[Any]:
+    """
+    Ejecuta las llamadas de un turno en el pool y retorna los resultados en el orden pedido.
+    Cada llamada tiene TOOL_CALL_TIMEOUT; si no responde a tiempo el modelo recibe un error
+    (el hilo no se puede interrumpir, pero el turno no lo espera).
+    """
+    sequential = [i for i, call in enumerate(calls) if call.name in _SEQUENTIAL_TOOLS]
+    groups = [[i] for i, call in enumerate(calls) if call.name not in _SEQUENTIAL_TOOLS]
+    if sequential:
+        groups.append(sequential)
+
+    # Cada tarea corre en una copia del contexto: current_session_id llega a las herramientas
+    start = time.monotonic()
+    jobs = [
+        (group, _tool_executor.submit(contextvars.copy_context().run, _run_tool_chain, [calls[i] for i in group]))
+        for group in groups
+    ]
+    results: List[Any] = [None] * len(calls)
+    for group, future in jobs:
+        remaining = start + TOOL_CALL_TIMEOUT * len(group) - time.monotonic()
+        try:
+            values = future.result(timeout=max(remaining, 0))
+        except FuturesTimeout:
+            future.cancel()
+            names = ", ".join(calls[i].name for i in group)
+            print(f"[GEMINI] ⏱️ Tool call timed out after {TOOL_CALL_TIMEOUT:g}s: {names}")
+            values = [{"error": f"La herramienta {calls[i].name} no respondió a tiempo"} for i in group]
+        for i, value in zip(group, values):
+            results[i] = value
+    return results
+
+# --- Session Storage ---
+# Estimación gruesa de memoria: config + prompt, y partes no textuales por turno
+SESSION_BASE_BYTES = 16 * 1024
+SESSION_TURN_OVERHEAD_BYTES = 1024
+SESSION_SAVE_ATTEMPTS = 3  # Recargas ante versiones más nuevas de otro worker antes de rendirse
+
+# Plegado de historial en segundo plano: no suma latencia al turno que lo dispara
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini-summary")
+
+class ChatSession:
+    """
+    Conversación con Gemini: contenidos para el modelo (acotados por HISTORY_TOKEN_BUDGET,
+    con los turnos antiguos plegados en `summary`) y turnos de texto para compartir la
+    sesión entre workers.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: Optional[str],
+        instruction: str,
+        turns: List[Turn],
+        turn_count: int,
+        summary: Optional[str] = None,
+        history_id: int = 0,
+        turn_ids: Optional[List[Optional[int]]] = None,
+    ):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.instruction = instruction
+        self.summary = summary
+        self.config = _session_config(_with_summary(instruction, summary))
+        self.turns = window_turns(list(turns))
+        # ID en chat_history de cada turno cargado de la base (None si es nuevo o vino del backend)
+        turn_ids = list(turn_ids) if turn_ids else [None] * len(turns)
+        self.turn_ids = turn_ids[len(turn_ids) - len(self.turns):]
+        # Último mensaje de chat_history que cubre `summary`, y mensajes propios ya
+        # plegados cuyo ID todavía no se conoce (su INSERT seguía pendiente)
+        self.history_id = history_id
+        self.history_unresolved = 0
+        self.turn_count = turn_count  # Versión en el backend compartido (turnos + plegados)
+        self.contents: List[types.Content] = [_text_content(role, text) for role, text in self.turns]
+        self.text_bytes = self._measure()
+        self._lock = threading.Lock()
+        self._folding = False
+
+    def _measure(self) -> int:
+        summary_bytes = len(self.summary.encode("utf-8")) if self.summary else 0
+        return sum(content_tokens(c) for c in self.contents) * 4 + summary_bytes
+
+    @property
+    def estimated_bytes(self) -> int:
+        return SESSION_BASE_BYTES + self.text_bytes + len(self.contents) * SESSION_TURN_OVERHEAD_BYTES
+
+    def shared_turns(self) -> List[Turn]:
+        return ([("summary", self.summary)] if self.summary else []) + self.turns
+
+    def _run_tools(self, calls: List[types.FunctionCall]) -> Tuple[types.Content, int]:
+        """Ejecuta las llamadas a herramientas de un turno del modelo. Retorna (respuestas, bytes)."""
+        session_token = current_session_id.set(self.session_id)
+        try:
+            results = _run_tools_concurrently(calls)
+        finally:
+            current_session_id.reset(session_token)
+        parts = [
+            types.Part.from_function_response(name=call.name, response=result)
+            for call, result in zip(calls, results)
+        ]
+        tool_bytes = sum(len(str(result).encode("utf-8")) for result in results)
+        return types.Content(role="user", parts=parts), tool_bytes
+
+    def send_message(self, message: str):
+        """Envía el mensaje y resuelve las llamadas a herramientas. Retorna la respuesta final (con `.text`)."""
+        history = self.contents
+        contents = history + [_text_content("user", message)]
+        tool_bytes = 0
+        response = _generate(contents, self.config)
+        for _ in range(MAX_TOOL_ROUNDS):
+            calls = response.function_calls
+            if not calls:
+                break
+            contents.append(_model_content(response, ""))
+            tool_response, size = self._run_tools(calls)
+            contents.append(tool_response)
+            tool_bytes += size
+            response = _generate(contents, self.config)
+
+        reply = response.text or ""
+        contents.append(_model_content(response, reply))
+        self._commit_turn(history, contents, message, reply, tool_bytes)
+        return response
+
+    def send_message_stream(self, message: str) -> Iterator[str]:
+        """
+        Como `send_message` pero entrega el texto a medida que el modelo lo genera.
+        Las rondas de herramientas se resuelven entre medio; el turno se guarda al
+        agotar el iterador (si se abandona antes, la sesión queda como estaba).
+        """
+        history = self.contents
+        contents = history + [_text_content("user", message)]
+        tool_bytes = 0
+        reply = []
+        for _ in range(MAX_TOOL_ROUNDS + 1):
+            parts, calls = [], []
+            for chunk in _generate_stream(contents, self.config):
+                candidates = chunk.candidates or []
+                content = candidates[0].content if candidates else None
+                for part in (content.parts if content else None) or []:
+                    # Las partes se conservan tal cual (p. ej. thought_signature de las llamadas)
+                    parts.append(part)
+                    if part.function_call:
+                        calls.append(part.function_call)
+                    elif part.text and not part.thought:
+                        reply.append(part.text)
+                        yield part.text
+            if parts:
+                contents.append(types.Content(role="model", parts=parts))
+            if not calls:
+                break
+            tool_response, size = self._run_tools(calls)
+            contents.append(tool_response)
+            tool_bytes += size
+
+        text = "".join(reply)
+        if contents[-1].role != "model":
+            contents.append(_text_content("model", text))
+        self._commit_turn(history, contents, message, text, tool_bytes)
+
+    def add_turn(self, message: str, reply: str) -> None:
+        """Registra un turno respondido sin el modelo (p. ej. por el router de intenciones)."""
+        history = self.contents
+        self._commit_turn(history, history + [_text_content("user", message), _text_content("model", reply)], message, reply, 0)
+
+    def _commit_turn(self, history: List[types.Content], contents: List[types.Content], message: str, reply: str, tool_bytes: int) -> None:
+        """Incorpora el turno a la sesión, la comparte con los demás workers y, si hace falta, agenda el plegado."""
+        with self._lock:
+            # Si un plegado terminó mientras tanto, agregar sólo lo nuevo sobre la versión plegada
+            self.contents = self.contents + contents[len(history):]
+            self.turns += [("user", message), ("model", reply)]
+            self.turn_ids += [None, None]
+            self.turn_count += 2
+            self.text_bytes += len(message.encode("utf-8")) + len(reply.encode("utf-8")) + tool_bytes
+            shared_turns = self.shared_turns()
+            fold = not self._folding and fold_point(self.contents) > 0
+            self._folding = self._folding or fold
+        chat_sessions.resize(self.session_id, self.estimated_bytes)
+        self._share(self.turn_count, shared_turns, [("user", message), ("model", reply)])
+        if fold:
+            _summary_executor.submit(self._fold)
+
+    def _share(self, turn_count: int, shared_turns: List[Turn], pending: List[Turn]) -> None:
+        """
+        Guarda la sesión en el backend compartido. Si otro worker ya guardó una versión
+        igual o más nueva, se adopta esa versión, se le agregan los turnos `pending` de
+        este worker y se reintenta: ningún worker pisa los turnos de otro.
+        """
+        for _ in range(SESSION_SAVE_ATTEMPTS):
+            if session_backend.save(self.session_id, self.user_id, turn_count, shared_turns):
+                return
+            shared = session_backend.load(self.session_id)
+            if shared is None:
+                continue  # Se borró entretanto: reintentar tal cual
+            if shared.user_id != self.user_id:
+                print(f"[GEMINI] ⚠️ Session {self.session_id} belongs to another user in {session_backend.name}; not shared")
+                return
+            with self._lock:
+                self._adopt(shared, pending)
+                turn_count, shared_turns = self.turn_count, self.shared_turns()
+            chat_sessions.resize(self.session_id, self.estimated_bytes)
+            if not pending:
+                return  # Nada propio que agregar: alcanza con la versión del otro worker
+        print(f"[GEMINI] ⚠️ Session {self.session_id} kept losing the race in {session_backend.name}; turn kept only here")
+
+    def _adopt(self, shared: SessionState, pending: List[Turn]) -> None:
+        """Reemplaza el estado local por el compartido más los turnos propios (con el lock tomado)."""
+        turns = list(shared.turns)
+        summary = None
+        if turns and turns[0][0] == "summary":
+            summary, turns = turns[0][1], turns[1:]
+        self.summary = summary
+        self.config = _session_config(_with_summary(self.instruction, summary))
+        self.turns = window_turns(turns + pending)
+        self.turn_ids = [None] * len(self.turns)
+        self.contents = [_text_content(role, text) for role, text in self.turns]
+        self.turn_count = shared.turn_count + len(pending)
+        self.text_bytes = self._measure()
+
+    def _fold(self) -> None:
+        """Pliega los turnos más antiguos en el resumen hasta volver a HISTORY_FOLD_TARGET del presupuesto."""
+        try:
+            with self._lock:
+                cut = fold_point(self.contents)
+                folded, previous = self.contents[:cut], self.summary
+            if not cut:
+                return
+            summary = summarize(_generate_summary, previous, folded)
+
+            with self._lock:
+                if any(a is not b for a, b in zip(self.contents, folded)):
+                    return  # La sesión se reemplazó mientras se resumía
+                self.contents = self.contents[cut:]
+                # Descartar los mismos mensajes del cliente (y sus respuestas) de los turnos de texto
+                folded_messages = sum(1 for c in folded if is_user_message(c))
+                seen, keep_from = 0, len(self.turns)
+                for index, (role, _) in enumerate(self.turns):
+                    if role == "user":
+                        if seen == folded_messages:
+                            keep_from = index
+                            break
+                        seen += 1
+                self.turns = self.turns[keep_from:]
+                folded_ids, self.turn_ids = self.turn_ids[:keep_from], self.turn_ids[keep_from:]
+                self.summary = summary
+                self.config = _session_config(_with_summary(self.instruction, summary))
+                self.text_bytes = self._measure()
+                self.turn_count += 1  # El plegado también es una versión nueva (mismos turnos, otro payload)
+                turn_count, shared_turns = self.turn_count, self.shared_turns()
+
+            print(f"[GEMINI] 🗜️ Folded {cut} messages of session {self.session_id} into summary ({len(summary)} chars)")
+            chat_sessions.resize(self.session_id, self.estimated_bytes)
+            self._share(turn_count, shared_turns, [])
+            if self.user_id:
+                save_chat_summary(self.session_id, self.user_id, summary, self._advance_history_id(folded_ids))
+        except Exception as e:
+            print(f"[GEMINI] ⚠️ Could not fold history of session {self.session_id}: {e}")
+        finally:
+            with self._lock:  # El mismo lock con que _commit_turn lo lee y lo activa
+                self._folding = False
+
+    def _advance_history_id(self, folded_ids: List[Optional[int]]) -> int:
+        """
+        ID del último mensaje de chat_history cubierto por el resumen tras plegar `folded_ids`.
+        Los turnos nuevos de la sesión no tienen ID en memoria: son, en orden, los mensajes
+        de esta sesión guardados después del último ID conocido.
+        """
+        known = [history_id for history_id in folded_ids if history_id is not None]
+        base = max(known + [self.history_id])
+        unresolved = self.history_unresolved + folded_ids.count(None)
+        if unresolved:
+            history_id = get_session_history_id(self.session_id, base, unresolved)
+            if history_id is None:
+                # Historial todavía en escritura: queda para el próximo plegado
+                self.history_id, self.history_unresolved = base, unresolved
+                return base
+            base = history_id
+        self.history_id, self.history_unresolved = base, 0
+        return base
+
+chat_sessions: SessionStore[ChatSession] = SessionStore()
+session_backend = create_session_backend()
+# Perfiles para la persona del prompt: cambian poco y se leen en cada sesión nueva
+user_profiles = TTLCache(ttl=USER_PROFILE_CACHE_TTL, max_entries=5000)
+_rehydrated_sessions = 0
+
+def get_session_stats() -> Dict:
+    stats = chat_sessions.stats()
+    stats["backend"] = session_backend.name
+    stats["backend_conflicts"] = getattr(session_backend, "conflicts", 0)
+    stats["rehydrated"] = _rehydrated_sessions
+    stats["user_profiles"] = user_profiles.stats()
+    return stats
+
+def get_user_profile(user_id: str) -> Optional[Dict]:
+    return user_profiles.get_or_load(user_id, lambda: get_user_by_id(user_id))
+
+def record_turn(session_id: Optional[str], user_id: Optional[str], message: str, reply: str) -> str:
+    """
+    Agrega a la sesión de chat un turno respondido fuera de Gemini, para que el modelo
+    lo vea en el siguiente mensaje. La sesión se concilia con el backend compartido
+    igual que en `get_or_create_chat` (no hace falta Gemini para esto).
+    Retorna el session_id (uno nuevo si no había).
+    """
+    session, session_id = _load_session(session_id, user_id)
+    session.add_turn(message, reply)
+    return session_id
 
 def get_or_create_chat(session_id: Optional[str] = None, user_id: Optional[str] = None):
     """
     Recupera o crea una sesión de chat con Gemini.
+    Si el session_id no está en este proceso (expulsado, o creado por otro worker),
+    la sesión se reconstruye desde el backend compartido o, si no, desde
+    `chat_history`, conservando el mismo ID.
     Retorna (chat_obj, session_id).
     """
     if not client:
         raise Exception("AI Service unavailable (API Key missing)")
+    return _load_session(session_id, user_id)
+
+def _load_session(session_id: Optional[str], user_id: Optional[str]) -> Tuple[ChatSession, str]:
+    global _rehydrated_sessions
+    session = chat_sessions.get(session_id) if session_id else None
+    if session is not None and session.user_id != user_id:
+        # El session_id pertenece a otro usuario (o a la sesión anónima previa al login)
+        session, session_id = None, None
+
+    shared = None
+    if session_id:
+        # Sólo trae el payload si otro worker avanzó la conversación
+        shared = session_backend.load(session_id, newer_than=session.turn_count if session else -1)
+        if shared is not None and shared.user_id != user_id:
+            shared, session, session_id = None, None, None
 
-    user_context = ""
-    history_for_model = []
+    if session is not None and shared is None:
+        print(f"[GEMINI] 🔄 Resuming session: {session_id}")
+        return session, session_id
 
-    if user_id:
-        user = get_user_by_id(user_id)
+    # Perfil e historial sólo se cargan cuando de verdad se crea el chat
+    user = get_user_profile(user_id) if user_id else None
+    turns: List[Turn] = []
+    turn_ids: List[Optional[int]] = []
+    summary = None
+    history_id = 0
+
+    rehydrating = bool(session_id)
+    if shared is not None:
+        print(f"[GEMINI] 🔁 Session {session_id} continued from {session_backend.name} ({shared.turn_count} turns)")
+        turns, turn_count = shared.turns, shared.turn_count
+        if turns and turns[0][0] == "summary":
+            summary, turns = turns[0][1], turns[1:]
+            saved = get_chat_summary(user_id, session_id) if user_id else None
+            history_id = (saved["last_history_id"] or 0) if saved else 0
+    else:
         if user:
-            age_context = ""
-            if user.get("age"):
-                if user["age"] < 18:
-                    age_context = "El usuario es adolescente. Usa un tono fresco, amigable y dinámico. Utiliza tambien muchos populismos lingüísticos / expresiones populares de la Costa ecuatoriana, ese hablar bien callejero (ejemplo: Ñaño, ya pues, oe, esta full, etc)."
-                elif user["age"] > 60:
-                    age_context = "El usuario es un adulto mayor. Sé muy claro, paciente y respetuoso."
-                else:
-                    age_context = "El usuario es un adulto. Mantén un tono profesional."
-
-            user_context = f"""
-            INFORMACIÓN DEL USUARIO:
-            - Nombre: {user['first_name']} {user['last_name']}
-            - Edad: {user.get('age', 'No especificada')}
-            
-            GUÍA DE PERSONALIDAD:
-            {age_context}
-            """
-            
-            # Cargar historial previo de la BD
-            db_history = get_recent_chat_history(user_id, limit=20)
-            for msg in db_history:
-                history_for_model.append({
-                    "role": msg["role"],
-                    "parts": [{"text": msg["content"]}]
-                })
-
-    if not session_id or session_id not in chat_sessions:
-        print("[GEMINI] 🆕 Creating new chat session...")
-        new_session_id = str(uuid.uuid4())
-        
-        tools = [
-            get_supermarket_hour, 
-            get_product_location, 
-            get_supermarket_details,
-            search_products,
-            compare_products,
-            add_product_to_cart_tool,
-            view_cart_tool,
-            checkout_cart_tool
-        ]
-        
-        system_instruction = f"""Eres un asistente útil de una tienda de electrónica (NovaShop). 
-        
-        {user_context}
-        
-        TU CONTEXTO ACTUAL (ID de Usuario):
-        Si el usuario está logueado, su ID es: "{user_id if user_id else 'ANONYMOUS'}"
-        IMPORTANTE: SIEMPRE que uses herramientas de carrito (add_product_to_cart_tool, view_cart_tool, checkout_cart_tool),
-        DEBES pasar este ID "{user_id if user_id else ''}" como el argumento `user_id`. No preguntes el ID al usuario.
-
-        OBJETIVO PRINCIPAL: AHORRO DE PALABRAS (CRÍTICO)
-        - Tu salida se convierte a audio pago. CADA CARÁCTER CUENTA.
-        - Sé EXTREMADAMENTE conciso y directo, pero sin olvidar signos de puntuacion.
-        - NO saludes si no es el primer mensaje. NO te despidas innecesariamente.
-        - Ve al grano. Responde la pregunta y punto, siendo amable pero no tan efusivo.
-        - Usa frases cortas. Máximo 1 o 2 oraciones si es posible.
-        - Evita palabras de relleno como "Claro que sí", "Por supuesto", "Entiendo", "Me parece genial".
-        - Si el usuario pide un producto, di el precio y características clave y ya.
-        - EJEMPLO CORRECTO: "El iPhone 15 cuesta 899 dolares y tiene 128 gigas de almacenamiento."
-        - EJEMPLO INCORRECTO: "Claro, con gusto te ayudo. El iPhone 15 es un excelente dispositivo que cuesta $899 dólares y cuenta con una capacidad de 128GB."
-
-        REGLAS DE CARRITO:
-        1. Para agregar items: Primero BUSCA el producto para obtener su ID exacto (product_id), luego usa `add_product_to_cart_tool`.
-        2. Si el usuario quiere "terminar", "pagar" o "comprar el carrito", usa `checkout_cart_tool`.
-        3. Si `checkout_cart_tool` falla por stock, sugiere alternativas o pregunta si quiere comprar lo que hay.
-
-        REGLAS DE FORMATO:
-        - NO uses asteriscos (**) para negritas ni formato Markdown. Escribe texto plano limpio.
-        - Ejemplo INCORRECTO: **Producto**
-        - Ejemplo CORRECTO: Producto
-        """
+            # Resumen de esta sesión (o el más reciente del usuario) + sólo los mensajes que
+            # el resumen no cubre; se recortan al presupuesto
+            saved = get_chat_summary(user_id, session_id) if rehydrating else None
+            own = saved is not None
+            saved = saved or get_chat_summary(user_id)
+            if saved:
+                summary, history_id = saved["summary"], saved["last_history_id"] or 0
+            db_history = get_chat_history_after(user_id, history_id, limit=20, session_id=session_id if own else None)
+            turns = [(msg["role"], msg["content"]) for msg in db_history]
+            turn_ids = [msg["id"] for msg in db_history]
+        turn_count = len(turns)
+        if rehydrating:
+            print(f"[GEMINI] ♻️ Session {session_id} not in memory, rebuilding from chat history...")
+        else:
+            print("[GEMINI] 🆕 Creating new chat session...")
+    new_session_id = session_id or str(uuid.uuid4())
 
-        try:
-            print(f"[GEMINI] 📜 History loaded: {len(history_for_model)} messages")
-            print(f"[GEMINI] 🛠️ Initializing chat with {len(tools)} tools...")
-            
-            chat = client.chats.create(
-                model=MODEL_ID,
-                config=types.GenerateContentConfig(
-                    tools=tools,
-                    system_instruction=system_instruction,
-                    automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False)
-                ),
-                history=history_for_model 
-            )
-            chat_sessions[new_session_id] = chat
-            print(f"[GEMINI] ✅ Chat created successfully (ID: {new_session_id})")
-            return chat, new_session_id
-        except Exception as e:
-            print(f"[GEMINI] ⚠️ Error creating chat with {MODEL_ID}: {e}. Trying fallback...")
-            try:
-                chat = client.chats.create(
-                    model=MODEL_FALLBACK,
-                    config=types.GenerateContentConfig(
-                        tools=tools,
-                        system_instruction=system_instruction,
-                        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False)
-                    ),
-                    history=history_for_model
-                )
-                chat_sessions[new_session_id] = chat
-                print(f"[GEMINI] ✅ Fallback Chat created successfully (ID: {new_session_id})")
-                return chat, new_session_id
-            except Exception as e2:
-                 raise Exception(f"Failed to initialize AI model: {e2}")
-
-    print(f"[GEMINI] 🔄 Resuming session: {session_id}")
-    return chat_sessions[session_id], session_id
+    print(f"[GEMINI] 📜 History loaded: {len(turns)} messages{' + summary' if summary else ''}")
+    session = ChatSession(
+        new_session_id, user_id, _system_instruction(user_id, user), turns, turn_count, summary, history_id, turn_ids
+    )
+    chat_sessions.put(new_session_id, session, session.estimated_bytes)
+    if rehydrating:
+        _rehydrated_sessions += 1
+    print(f"[GEMINI] ✅ Chat created successfully (ID: {new_session_id}, {len(TOOL_FUNCTIONS)} tools)")
+    return session, new_session_id
@@ -0,0 +1,76 @@
+"""
+Escritura del historial de chat fuera del camino crítico.
+
+La respuesta al usuario no espera al INSERT: cada turno se guarda en una tarea
+asyncio de fondo, con reintentos ante errores transitorios de la base. Las
+escrituras de un mismo usuario se encadenan (el orden del historial se respeta)
+y `wait_for(user_id)` permite que quien va a leer ese historial espere las que
+siguen pendientes. Al apagar, `drain()` da tiempo a terminar las que quedan.
+"""
+import os
+import asyncio
+from typing import Dict, Optional
+
+from db.chat_ops import save_chat_turn_async
+
+HISTORY_WRITE_RETRIES = int(os.getenv("HISTORY_WRITE_RETRIES", "2"))
+HISTORY_RETRY_DELAY = float(os.getenv("HISTORY_RETRY_DELAY", "0.5"))
+HISTORY_DRAIN_TIMEOUT = float(os.getenv("HISTORY_DRAIN_TIMEOUT", "10"))
+
+class HistoryWriter:
+    def __init__(self, retries: int = HISTORY_WRITE_RETRIES, retry_delay: float = HISTORY_RETRY_DELAY):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # user_id -> su última escritura; las anteriores quedan referenciadas por la cadena
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._stats = {"queued": 0, "written": 0, "retries": 0, "failed": 0}
+
+    def save_turn(self, user_id: str, message: str, reply: str, session_id: Optional[str]) -> asyncio.Task:
+        """Encola el guardado del turno y retorna de inmediato (llamar desde el event loop)."""
+        previous = self._pending.get(user_id)
+        task = asyncio.create_task(self._write(previous, user_id, message, reply, session_id))
+        self._pending[user_id] = task
+        task.add_done_callback(lambda done: self._forget(user_id, done))
+        self._stats["queued"] += 1
+        return task
+
+    async def _write(self, previous: Optional[asyncio.Task], user_id: str, message: str, reply: str, session_id: Optional[str]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])  # Sólo el orden: un fallo anterior no frena éste
+        for attempt in range(self.retries + 1):
+            try:
+                await save_chat_turn_async(user_id, message, reply, session_id)
+                self._stats["written"] += 1
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    self._stats["failed"] += 1
+                    print(f"[HISTORY] ❌ Could not save turn for user {user_id} after {attempt + 1} attempts: {e}")
+                    return
+                self._stats["retries"] += 1
+                print(f"[HISTORY] ⚠️ Save failed ({e}), retrying ({attempt + 1}/{self.retries})...")
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    def _forget(self, user_id: str, task: asyncio.Task) -> None:
+        if self._pending.get(user_id) is task:
+            del self._pending[user_id]
+
+    async def wait_for(self, user_id: Optional[str]) -> None:
+        """Espera las escrituras pendientes de `user_id` (antes de leer su historial de la base)."""
+        task = self._pending.get(user_id) if user_id else None
+        if task is not None:
+            await asyncio.wait([task])
+
+    async def drain(self, timeout: float = HISTORY_DRAIN_TIMEOUT) -> None:
+        pending = list(self._pending.values())
+        if not pending:
+            return
+        print(f"[HISTORY] ⏳ Waiting for {len(pending)} pending history write(s)...")
+        _, not_done = await asyncio.wait(pending, timeout=timeout)
+        if not_done:
+            print(f"[HISTORY] ⚠️ {len(not_done)} history write(s) did not finish before shutdown")
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, pending_users=len(self._pending))
+
+history_writer = HistoryWriter()
@@ -0,0 +1,244 @@
+"""
+Router de intenciones local, delante de Gemini.
+
+Las preguntas de horario ("¿a qué hora abren el domingo?"), ubicación ("¿dónde
+están los audífonos?") y carrito ("ver mi carrito") se resuelven con una sola
+herramienta, así que no necesitan un round trip al modelo. Cada mensaje pasa por:
+1. Reglas (regex sobre el texto normalizado) que proponen una intención y
+   vetan lo que el router no sabe responder (precios, agregar al carrito...).
+2. Un clasificador vectorizado: n-gramas de caracteres hasheados, coseno
+   contra frases de ejemplo en una matriz NumPy y softmax por intención.
+Sólo si ambos coinciden y la confianza supera INTENT_CONFIDENCE_THRESHOLD se
+llama a la herramienta y se responde con una plantilla; si no, sigue a Gemini.
+"""
+import os
+import re
+import threading
+import zlib
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from db.catalog import normalize_text, tokenize
+from tools.basic_tools import get_supermarket_hour, get_product_location, location_matcher
+from tools.cart_tools import view_cart_tool, view_cart_tool_async
+from tools.tool_cache import cached_tool
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+INTENT_MAX_WORDS = 12  # Mensajes más largos suelen traer más de un pedido
+INTENT_DIM = 512
+INTENT_TEMPERATURE = 0.05
+_CHAR_NGRAMS = (2, 3, 4)
+
+HOURS, LOCATION, VIEW_CART, OTHER = "hours", "location", "view_cart", "other"
+
+# Frases de ejemplo del clasificador; OTHER cubre lo que debe ir a Gemini
+EXAMPLES: Dict[str, List[str]] = {
+    HOURS: [
+        "a que hora abren", "a que hora cierran", "cual es el horario", "horario de atencion",
+        "a que hora abren el domingo", "abren los sabados", "hasta que hora atienden",
+        "estan abiertos hoy", "que horario tienen el fin de semana", "a que hora abre la tienda",
+        "cierran tarde los viernes", "horario del domingo", "a que hora abren manana",
+        "atienden los domingos", "hasta que hora esta abierto",
+    ],
+    LOCATION: [
+        "donde estan los audifonos", "donde encuentro los cargadores", "donde quedan las laptops",
+        "en que pasillo estan los teclados", "donde esta el iphone 15", "donde hay mouse",
+        "donde consigo una funda para iphone", "en que parte estan las impresoras",
+        "donde tienen la ps5", "donde estan los cables usb", "donde queda la zona gaming",
+        "en que seccion estan las tablets", "donde puedo ver los smartwatch", "donde esta la tinta",
+        "donde queda el ipad", "donde queda la impresora epson", "donde quedan los celulares",
+    ],
+    VIEW_CART: [
+        "ver mi carrito", "muestrame el carrito", "que tengo en el carrito", "que hay en mi carrito",
+        "mostrar carrito", "revisar mi carrito", "que llevo en el carrito", "mi carrito",
+        "quiero ver el carrito", "ensename mi carrito", "que productos tengo en el carrito",
+        "cuanto llevo en el carrito",
+    ],
+    OTHER: [
+        "cuanto cuesta el iphone 15", "agrega los audifonos al carrito", "quiero comprar una laptop",
+        "recomiendame una laptop para programar", "pagar el carrito", "procesar compra",
+        "tienen stock de ps5", "compara el iphone 14 con el samsung s24", "busco un mouse barato",
+        "quita el teclado del carrito", "hola", "gracias", "que servicios tienen",
+        "donde queda la tienda", "cual es la direccion", "cual es el telefono",
+        "tienen garantia", "cual es la politica de devoluciones", "que laptop me recomiendas",
+        "cuanto vale la tablet", "hay descuentos en audifonos", "agrega dos cables al carrito",
+        "quiero el mas barato", "que celular tiene mejor camara", "vacia mi carrito",
+        "hacen entregas a domicilio", "tienen credito directo", "dame opciones de audifonos",
+    ],
+}
+
+_RULES: Dict[str, re.Pattern] = {
+    HOURS: re.compile(r"\b(a que hora|horario|hasta que hora|abren|abre|abierto|abiertos|cierran|cierra|atienden)\b"),
+    LOCATION: re.compile(r"\b(donde (esta|estan|encuentro|queda|quedan|hay|consigo|tienen|puedo ver)|en que (pasillo|gondola|seccion|parte|zona))\b"),
+    VIEW_CART: re.compile(r"^(quiero )?(ver|muestrame|mostrar|ensename|revisar|que (hay|tengo|llevo|productos tengo) en|cuanto llevo en)? ?(el |mi )?carrito$"),
+}
+# Pedidos que el router no sabe responder aunque coincida una regla: van a Gemini
+_VETO = re.compile(
+    r"\b(agreg\w*|anad\w*|quit\w*|elimin\w*|sac\w*|borr\w*|vaci\w*|compr\w*|pag\w*|precio\w*|cuesta\w*|vale\w*|"
+    r"barat\w*|recomiend\w*|stock|disponib\w*|oferta\w*|descuento\w*|compar\w*|direccion)\b"
+)
+_LOCATION_OBJECT = re.compile(
+    r"(?:donde (?:esta|estan|encuentro|queda|quedan|hay|consigo|tienen|puedo ver)|en que (?:pasillo|gondola|seccion|parte|zona) (?:esta|estan|queda|quedan|hay))"
+    r"\s+(?:(?P<article>el|la|los|las|un|una|unos|unas)\s+)?(?P<product>.+)$"
+)
+
+_WEEKDAYS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+_DAY_LABELS = {"monday_friday": "De lunes a viernes", "saturday": "Los sábados", "sunday": "Los domingos"}
+_HOURS_RE = re.compile(r"(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})")
+
+# Las mismas herramientas (y la misma caché) que usa Gemini; el carrito se lee siempre de la base
+_get_supermarket_hour = cached_tool(get_supermarket_hour)
+_get_product_location = cached_tool(get_product_location)
+
+def _features(text: str) -> Dict[int, float]:
+    counts: Dict[int, float] = {}
+    for token in tokenize(text):
+        padded = f" {token} "
+        keys = [f"w:{token}"]
+        for n in _CHAR_NGRAMS:
+            keys.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+        for key in keys:
+            idx = zlib.crc32(key.encode("utf-8")) % INTENT_DIM
+            counts[idx] = counts.get(idx, 0.0) + 1.0
+    return counts
+
+def _vectorize(text: str) -> np.ndarray:
+    vec = np.zeros(INTENT_DIM, dtype=np.float32)
+    for idx, count in _features(text).items():
+        vec[idx] = 1.0 + np.log(count)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+class RoutedReply(NamedTuple):
+    intent: str
+    answer: str
+    confidence: float
+
+class IntentRouter:
+    def __init__(self, examples: Dict[str, List[str]] = EXAMPLES, threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.intents = list(examples)
+        self._matrix = np.stack([_vectorize(text) for texts in examples.values() for text in texts])
+        self._labels = np.array([self.intents.index(intent) for intent, texts in examples.items() for _ in texts])
+        self._lock = threading.Lock()
+        self._stats = {"routed": {}, "passed": 0}
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Intención más probable según el modelo vectorizado y su probabilidad."""
+        sims = self._matrix @ _vectorize(message)
+        # Similitud de cada intención = la de su ejemplo más parecido
+        scores = np.full(len(self.intents), -1.0, dtype=np.float32)
+        np.maximum.at(scores, self._labels, sims)
+        probs = np.exp((scores - scores.max()) / INTENT_TEMPERATURE)
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return self.intents[best], float(probs[best])
+
+    def decide(self, message: str) -> Tuple[Optional[str], float]:
+        """(intención, confianza) si el mensaje se puede responder sin Gemini; (None, confianza) si no."""
+        text = " ".join(normalize_text(message).replace("¿", " ").replace("?", " ").split())
+        if not text or len(text.split()) > INTENT_MAX_WORDS or _VETO.search(text):
+            return None, 0.0
+        intent, probability = self.classify(text)
+        rule = _RULES.get(intent)
+        confidence = 0.5 * probability + (0.5 if rule is not None and rule.search(text) else 0.0)
+        return (intent if confidence >= self.threshold and intent != OTHER else None), confidence
+
+    def route(self, message: str, user_id: Optional[str]) -> Optional[RoutedReply]:
+        """Respuesta con plantilla si el mensaje tiene una intención simple; None para seguir a Gemini."""
+        if not INTENT_ROUTER_ENABLED:
+            return None
+        intent, confidence = self.decide(message)
+        answer = _ANSWERS[intent](message, user_id) if intent else None
+        return self._reply(message, intent, answer, confidence)
+
+    async def route_async(self, message: str, user_id: Optional[str]) -> Optional[RoutedReply]:
+        """Igual que `route`, desde el event loop: el carrito se lee con el driver async."""
+        if not INTENT_ROUTER_ENABLED:
+            return None
+        intent, confidence = self.decide(message)
+        if intent in _ASYNC_ANSWERS:
+            answer = await _ASYNC_ANSWERS[intent](message, user_id)
+        else:
+            # Horarios y ubicaciones salen de datos en memoria: no bloquean
+            answer = _ANSWERS[intent](message, user_id) if intent else None
+        return self._reply(message, intent, answer, confidence)
+
+    def _reply(self, message: str, intent: Optional[str], answer: Optional[str], confidence: float) -> Optional[RoutedReply]:
+        with self._lock:
+            if answer is None:
+                self._stats["passed"] += 1
+            else:
+                self._stats["routed"][intent] = self._stats["routed"].get(intent, 0) + 1
+        if answer is None:
+            return None
+        print(f"[ROUTER] ⚡ '{message[:50]}' answered locally as {intent} (confidence {confidence:.2f})")
+        return RoutedReply(intent, answer, confidence)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            routed = dict(self._stats["routed"])
+            passed = self._stats["passed"]
+        total = sum(routed.values()) + passed
+        return {"routed": routed, "passed": passed, "routed_rate": round(sum(routed.values()) / total, 4) if total else None}
+
+# --- Plantillas: llaman a la herramienta y formatean su resultado (None = que responda Gemini) ---
+
+def _days(text: str) -> List[str]:
+    if "fin de semana" in text:
+        return ["sabado", "domingo"]
+    days = [day for day in _WEEKDAYS if day in text]
+    today = datetime.now().weekday()
+    if re.search(r"\bhoy\b", text):
+        days.append(_WEEKDAYS[today])
+    if re.search(r"\bmanana\b", text) and not re.search(r"\bla manana\b", text):
+        days.append(_WEEKDAYS[(today + 1) % 7])
+    return days
+
+def _answer_hours(message: str, user_id: Optional[str]) -> Optional[str]:
+    days = _days(normalize_text(message)) or ["lunes", "sabado", "domingo"]
+    sentences, seen = [], set()
+    for day in days:
+        result = _get_supermarket_hour(day)
+        key = result.rsplit("(", 1)[-1].rstrip(")")
+        hours = _HOURS_RE.search(result)
+        if key in seen or key not in _DAY_LABELS or not hours:
+            continue
+        seen.add(key)
+        sentences.append(f"{_DAY_LABELS[key]} abrimos de {hours.group(1)} a {hours.group(2)}.")
+    return " ".join(sentences) or None
+
+def _answer_location(message: str, user_id: Optional[str]) -> Optional[str]:
+    text = " ".join(normalize_text(message).replace("¿", " ").replace("?", " ").split())
+    match = _LOCATION_OBJECT.search(text)
+    if not match:
+        return None
+    product = match.group("product").strip(" .!")
+    if not product or re.search(r"\by\b|,", product) or location_matcher.match(product) is None:
+        return None  # Varios productos o uno sin ubicación registrada
+    location = _get_product_location(product).split("se encuentra en:", 1)[-1].strip()
+    # Las mismas palabras del mensaje original, con sus tildes
+    words = len(match.group("product").split()) + (1 if match.group("article") else 0)
+    phrase = " ".join(w.strip("¿?¡!.,") for w in message.lower().split()[-words:])
+    return f"Encuentras {phrase} en {location}."
+
+def _answer_view_cart(message: str, user_id: Optional[str]) -> Optional[str]:
+    return view_cart_tool(user_id or "")
+
+_ANSWERS: Dict[str, Callable[[str, Optional[str]], Optional[str]]] = {
+    HOURS: _answer_hours,
+    LOCATION: _answer_location,
+    VIEW_CART: _answer_view_cart,
+}
+
+async def _answer_view_cart_async(message: str, user_id: Optional[str]) -> Optional[str]:
+    return await view_cart_tool_async(user_id or "")
+
+_ASYNC_ANSWERS: Dict[str, Callable[[str, Optional[str]], Awaitable[Optional[str]]]] = {
+    VIEW_CART: _answer_view_cart_async,
+}
+
+intent_router = IntentRouter()
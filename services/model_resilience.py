@@ -0,0 +1,211 @@
+"""
+Capa de resiliencia para las llamadas al modelo.
+
+- Plazo por llamada (MODEL_CALL_DEADLINE): ninguna llamada espera más que eso.
+- Hedge: si el modelo primario tarda más que el percentil MODEL_HEDGE_PERCENTILE de
+  sus latencias recientes, se lanza la misma llamada al modelo de respaldo y gana
+  la primera respuesta válida.
+- Circuit breaker: tras BREAKER_FAILURE_THRESHOLD fallos seguidos del primario, el
+  tráfico va directo al respaldo durante BREAKER_RESET_SECONDS; luego una sola
+  llamada de prueba decide si el primario vuelve.
+El cliente concreto queda afuera: `call` recibe una función `invoke(model)`, así se
+puede probar con un cliente falso (scripts/check_model_resilience.py).
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+MODEL_CALL_DEADLINE = float(os.getenv("MODEL_CALL_DEADLINE", "30"))
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+# Hasta juntar MODEL_HEDGE_MIN_SAMPLES latencias, el hedge usa este retardo fijo
+MODEL_HEDGE_DEFAULT_DELAY = float(os.getenv("MODEL_HEDGE_DEFAULT_DELAY", "8"))
+MODEL_LATENCY_WINDOW = 200
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+MODEL_CALL_MAX_WORKERS = int(os.getenv("MODEL_CALL_MAX_WORKERS", "32"))
+
+class ModelDeadlineExceeded(Exception):
+    """Ningún modelo respondió dentro del plazo."""
+
+class LatencyTracker:
+    """Ventana de las últimas latencias exitosas, para calcular percentiles."""
+
+    def __init__(self, window: int = MODEL_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+class CircuitBreaker:
+    """closed -> open (tras N fallos seguidos) -> half_open (una prueba) -> closed | open."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        """¿Puede esta llamada ir al primario? En half_open sólo pasa una a la vez."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            # Falla la prueba de half_open, o se alcanza el umbral estando cerrado
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+            self._probing = False
+
+class ResilientModelCaller:
+    def __init__(
+        self,
+        primary: str,
+        fallback: str,
+        deadline: float = MODEL_CALL_DEADLINE,
+        hedge_percentile: float = MODEL_HEDGE_PERCENTILE,
+        breaker: Optional[CircuitBreaker] = None,
+        max_workers: int = MODEL_CALL_MAX_WORKERS,
+    ):
+        self.primary = primary
+        self.fallback = fallback
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-call")
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "primary": 0, "fallback": 0, "hedged": 0, "short_circuited": 0, "deadline_exceeded": 0}
+
+    def _count(self, field: str) -> None:
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def hedge_delay(self) -> float:
+        if len(self.latency) < MODEL_HEDGE_MIN_SAMPLES:
+            return min(MODEL_HEDGE_DEFAULT_DELAY, self.deadline)
+        return min(self.latency.percentile(self.hedge_percentile), self.deadline)
+
+    def record(self, model: str, ok: bool, seconds: Optional[float] = None) -> None:
+        """
+        Resultado de una llamada al primario. Desde fuera de `call` (p. ej. streaming)
+        se informa sin `seconds`: sólo cuenta para el breaker, no para el percentil.
+        """
+        if model != self.primary:
+            return
+        if ok and (seconds is None or seconds <= self.deadline):
+            if seconds is not None:
+                self.latency.add(seconds)
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _submit_primary(self, invoke: Callable[[str], T]) -> Future:
+        started = time.monotonic()
+        future = self._executor.submit(invoke, self.primary)
+
+        # El primario informa al breaker al terminar, aunque el hedge ya haya respondido
+        def done(f: Future) -> None:
+            if not f.cancelled():  # Cancelada = nunca salió de la cola del pool
+                self.record(self.primary, f.exception() is None, time.monotonic() - started)
+
+        future.add_done_callback(done)
+        return future
+
+    def call(self, invoke: Callable[[str], T]) -> T:
+        """Ejecuta `invoke(model)` con plazo, hedge y breaker. Retorna la primera respuesta válida."""
+        self._count("calls")
+        expires = time.monotonic() + self.deadline
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return self._finish([self._executor.submit(invoke, self.fallback)], None, expires)
+
+        primary = self._submit_primary(invoke)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            self._count("primary")
+            return primary.result()
+        if done:
+            print(f"[GEMINI] ⚠️ Error calling {self.primary}: {primary.exception()}. Trying fallback...")
+            pending = [self._executor.submit(invoke, self.fallback)]
+        else:
+            self._count("hedged")
+            print(f"[GEMINI] 🐢 {self.primary} slower than p{self.hedge_percentile:g}, hedging with {self.fallback}...")
+            pending = [primary, self._executor.submit(invoke, self.fallback)]
+        return self._finish(pending, primary, expires)
+
+    def _finish(self, pending: List[Future], primary: Optional[Future], expires: float) -> Any:
+        error: Optional[BaseException] = None
+        while pending:
+            done, not_done = wait(pending, timeout=max(expires - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._count("primary" if future is primary else "fallback")
+                    for other in not_done:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+            pending = list(not_done)
+        if pending:
+            self._count("deadline_exceeded")
+            for future in pending:
+                future.cancel()
+            raise ModelDeadlineExceeded(f"No model answered within {self.deadline:g}s")
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        p50, p95 = self.latency.percentile(50), self.latency.percentile(95)
+        stats.update(
+            breaker=self.breaker.state,
+            breaker_opened=self.breaker.opened,
+            primary_p50_ms=round(p50 * 1000, 1) if p50 is not None else None,
+            primary_p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+            hedge_delay_ms=round(self.hedge_delay() * 1000, 1),
+        )
+        return stats
@@ -0,0 +1,195 @@
+"""
+Estado compartido de sesiones de chat entre workers/nodos.
+
+Cada sesión se guarda como sus turnos de texto (rol, texto) en JSON compacto
+comprimido con zlib, más un contador de turnos que hace de versión: un worker
+sólo vuelve a leer el payload si otro worker avanzó la conversación. La escritura
+es condicional (sólo si la versión es mayor que la guardada): si dos workers
+atienden a la vez turnos de la misma sesión, el segundo recibe False, recarga y
+reintenta en vez de pisar al primero.
+
+Backends (SESSION_BACKEND):
+- "memory":   sin estado compartido (un solo proceso).
+- "sqlite":   archivo local compartido por los workers de un mismo nodo.
+- "postgres": tabla chat_session_state (db/create_session_state.sql), para varios nodos.
+"""
+import os
+import abc
+import json
+import time
+import zlib
+import sqlite3
+import tempfile
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+from db.session_ops import load_session_state, save_session_state, delete_expired_session_states
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_SQLITE_PATH = os.getenv(
+    "SESSION_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "novashop_sessions.db")
+)
+SESSION_STATE_TTL = float(os.getenv("SESSION_STATE_TTL", str(7 * 24 * 3600)))
+SESSION_STATE_MAX_TURNS = int(os.getenv("SESSION_STATE_MAX_TURNS", "200"))
+SESSION_PRUNE_EVERY = 500  # Guardados entre limpiezas de sesiones vencidas
+
+Turn = Tuple[str, str]  # (rol, texto); rol "summary" = resumen acumulado de turnos plegados
+
+_ROLE_CODES = {"user": "u", "model": "m", "summary": "s"}
+_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+class SessionState(NamedTuple):
+    user_id: Optional[str]
+    turn_count: int
+    turns: List[Turn]
+
+def encode_turns(turns: List[Turn]) -> bytes:
+    """[["u","hola"],["m","..."]] sin espacios, comprimido. El resumen inicial no cuenta para el tope."""
+    head = turns[:1] if turns and turns[0][0] == "summary" else []
+    kept = head + turns[len(head):][-SESSION_STATE_MAX_TURNS:]
+    compact = [[_ROLE_CODES.get(role, role), text] for role, text in kept]
+    raw = json.dumps(compact, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 6)
+
+def decode_turns(payload: bytes) -> List[Turn]:
+    return [(_ROLES.get(code, code), text) for code, text in json.loads(zlib.decompress(payload))]
+
+class SessionBackend:
+    """Backend nulo: el estado vive sólo en el proceso (SessionStore)."""
+    name = "memory"
+
+    def load(self, session_id: str, newer_than: int = -1) -> Optional[SessionState]:
+        return None
+
+    def save(self, session_id: str, user_id: Optional[str], turn_count: int, turns: List[Turn]) -> bool:
+        """
+        Guarda la versión `turn_count`. False si ya hay una versión igual o más nueva
+        (otro worker avanzó la sesión): el llamador debe recargar. Un error de conexión
+        no es un conflicto: se registra y retorna True.
+        """
+        return True
+
+class _PruningBackend(SessionBackend, abc.ABC):
+    def __init__(self):
+        self._saves = 0
+        self.conflicts = 0
+
+    @abc.abstractmethod
+    def _load_raw(self, session_id: str, newer_than: int) -> Optional[Tuple[Optional[str], int, bytes]]:
+        ...
+
+    @abc.abstractmethod
+    def _save_raw(self, session_id: str, user_id: Optional[str], turn_count: int, payload: bytes) -> bool:
+        """Escritura condicional: True si se guardó, False si la versión guardada no es menor."""
+
+    @abc.abstractmethod
+    def _prune(self) -> int:
+        ...
+
+    def load(self, session_id: str, newer_than: int = -1) -> Optional[SessionState]:
+        try:
+            row = self._load_raw(session_id, newer_than)
+        except Exception as e:
+            print(f"[SESSIONS] ⚠️ Could not load session {session_id} from {self.name}: {e}")
+            return None
+        if row is None:
+            return None
+        user_id, turn_count, payload = row
+        return SessionState(user_id, turn_count, decode_turns(payload))
+
+    def save(self, session_id: str, user_id: Optional[str], turn_count: int, turns: List[Turn]) -> bool:
+        try:
+            if not self._save_raw(session_id, user_id, turn_count, encode_turns(turns)):
+                self.conflicts += 1
+                print(f"[SESSIONS] ⚔️ Session {session_id} v{turn_count} rejected: a newer version exists in {self.name}")
+                return False
+            self._saves += 1
+            if self._saves % SESSION_PRUNE_EVERY == 0:
+                removed = self._prune()
+                if removed:
+                    print(f"[SESSIONS] 🧹 Pruned {removed} expired sessions from {self.name}")
+        except Exception as e:
+            # Sin estado compartido la sesión sigue funcionando en este worker
+            print(f"[SESSIONS] ⚠️ Could not save session {session_id} to {self.name}: {e}")
+        return True
+
+class SqliteSessionBackend(_PruningBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str = SESSION_SQLITE_PATH):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chat_session_state (
+                    session_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    turn_count INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_raw(self, session_id, newer_than):
+        row = self._conn().execute(
+            "SELECT user_id, turn_count, payload FROM chat_session_state WHERE session_id = ? AND turn_count > ?",
+            (session_id, newer_than),
+        ).fetchone()
+        return (row[0], row[1], bytes(row[2])) if row else None
+
+    def _save_raw(self, session_id, user_id, turn_count, payload):
+        with self._conn() as conn:
+            return conn.execute(
+                """
+                INSERT INTO chat_session_state (session_id, user_id, turn_count, payload, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (session_id) DO UPDATE
+                SET user_id = excluded.user_id, turn_count = excluded.turn_count,
+                    payload = excluded.payload, updated_at = excluded.updated_at
+                WHERE chat_session_state.turn_count < excluded.turn_count
+                """,
+                (session_id, user_id, turn_count, payload, time.time()),
+            ).rowcount > 0
+
+    def _prune(self):
+        with self._conn() as conn:
+            return conn.execute(
+                "DELETE FROM chat_session_state WHERE updated_at < ?", (time.time() - SESSION_STATE_TTL,)
+            ).rowcount
+
+class PostgresSessionBackend(_PruningBackend):
+    name = "postgres"
+
+    def _load_raw(self, session_id, newer_than):
+        row = load_session_state(session_id, newer_than)
+        return (row["user_id"], row["turn_count"], row["payload"]) if row else None
+
+    def _save_raw(self, session_id, user_id, turn_count, payload):
+        return save_session_state(session_id, user_id, turn_count, payload)
+
+    def _prune(self):
+        return delete_expired_session_states(SESSION_STATE_TTL)
+
+def create_session_backend(kind: str = SESSION_BACKEND) -> SessionBackend:
+    if kind == "sqlite":
+        backend: SessionBackend = SqliteSessionBackend()
+    elif kind == "postgres":
+        backend = PostgresSessionBackend()
+    elif kind == "memory":
+        backend = SessionBackend()
+    else:
+        raise ValueError(f"SESSION_BACKEND desconocido: {kind}")
+    print(f"[SESSIONS] 🗄️ Session backend: {backend.name}")
+    return backend
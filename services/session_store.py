@@ -0,0 +1,125 @@
+"""
+Almacén acotado de sesiones de chat en memoria.
+
+LRU con expiración por inactividad y dos límites: número de sesiones y bytes
+estimados. Las sesiones expulsadas no se pierden: gemini_service las
+reconstruye desde `chat_history` la próxima vez que llega su session_id.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Optional, TypeVar
+
+CHAT_SESSION_MAX_ENTRIES = int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "1000"))
+CHAT_SESSION_MAX_BYTES = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+CHAT_SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", "1800"))
+
+V = TypeVar("V")
+
+class _Entry(Generic[V]):
+    __slots__ = ("value", "size", "last_access")
+
+    def __init__(self, value: V, size: int, last_access: float):
+        self.value = value
+        self.size = size
+        self.last_access = last_access
+
+class SessionStore(Generic[V]):
+    def __init__(
+        self,
+        max_entries: int = CHAT_SESSION_MAX_ENTRIES,
+        max_bytes: int = CHAT_SESSION_MAX_BYTES,
+        idle_ttl: float = CHAT_SESSION_IDLE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry[V]]" = OrderedDict()  # Orden: menos -> más reciente
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {"lru": 0, "memory": 0, "idle": 0}
+
+    # --- Eviction (con self._lock tomado) ---
+
+    def _pop(self, key: str, reason: Optional[str]) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if reason:
+            self._evictions[reason] += 1
+
+    def _expire_idle(self, now: float) -> None:
+        # El más antiguo está al frente: se corta en el primero que sigue vigente
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_access < self.idle_ttl:
+                break
+            self._pop(key, "idle")
+
+    def _enforce_caps(self, keep: Optional[str] = None) -> None:
+        # Expulsa desde la más antigua, salteando `keep` (la sesión que se está usando)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            key = next((k for k in self._entries if k != keep), None)
+            if key is None:
+                break
+            self._pop(key, "lru" if len(self._entries) > self.max_entries else "memory")
+
+    # --- API ---
+
+    def get(self, key: str) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire_idle(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            entry.last_access = now
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def put(self, key: str, value: V, size: int = 0) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._pop(key, None)
+            self._entries[key] = _Entry(value, size, now)
+            self._bytes += size
+            self._expire_idle(now)
+            self._enforce_caps(keep=key)
+
+    def resize(self, key: str, size: int) -> None:
+        """Actualiza el tamaño estimado de una sesión que creció (nuevos turnos)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            self._bytes += size - entry.size
+            entry.size = size
+            self._enforce_caps(keep=key)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": dict(self._evictions),
+            }
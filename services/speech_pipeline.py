@@ -0,0 +1,157 @@
+"""
+Voz por oraciones, en paralelo con la generación del texto.
+
+A medida que llegan fragmentos del modelo, `SentenceSplitter` corta oraciones
+completas y `SpeechPipeline` manda cada una al endpoint de streaming de
+ElevenLabs mientras las siguientes todavía se generan. El audio se entrega en
+orden de oración: la primera se reproduce en vivo (parte por parte) y las
+siguientes se sintetizan en paralelo y esperan su turno. Así la primera
+palabra hablada llega tras la primera oración, no tras toda la respuesta.
+"""
+import os
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, NamedTuple, Optional, Union
+
+from services.elevenlabs_service import DEFAULT_VOICE_ID, TTS_MAX_CHARS, stream_speech
+
+# Oraciones más cortas se juntan con la siguiente: menos llamadas y mejor entonación
+SENTENCE_MIN_CHARS = int(os.getenv("SENTENCE_MIN_CHARS", "20"))
+SPEECH_PIPELINE_WORKERS = int(os.getenv("SPEECH_PIPELINE_WORKERS", "8"))
+
+# Fin de oración: puntuación (más comillas/paréntesis de cierre) seguida de espacio, o salto de línea.
+# "1.5" o "$899.99" no cortan porque no hay espacio después del punto.
+_BOUNDARY = re.compile(r"(?<=[.!?…])[\"'»)\]]*\s+|\n+")
+_ABBREVIATIONS = ("sr.", "sra.", "dr.", "dra.", "etc.", "ej.", "aprox.", "núm.", "no.", "av.")
+
+_synthesis_executor = ThreadPoolExecutor(max_workers=SPEECH_PIPELINE_WORKERS, thread_name_prefix="speech")
+
+class SentenceSplitter:
+    def __init__(self, min_chars: int = SENTENCE_MIN_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Agrega texto y retorna las oraciones que quedaron completas."""
+        self._buffer += text
+        sentences, start = [], 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            if len(candidate) < self.min_chars or candidate.lower().endswith(_ABBREVIATIONS):
+                continue  # Sigue acumulando hasta el próximo corte
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+class AudioChunk(NamedTuple):
+    seq: int        # Número de oración
+    sentence: str
+    data: bytes     # Vacío en el marcador de fin de oración
+    last: bool
+
+_END = object()
+
+class SpeechPipeline:
+    def __init__(
+        self,
+        voice_id: str = DEFAULT_VOICE_ID,
+        max_chars: int = TTS_MAX_CHARS,
+        synthesize: Callable[[str, str], Iterator[bytes]] = stream_speech,
+    ):
+        self.voice_id = voice_id
+        self._synthesize = synthesize
+        self._budget = max_chars  # Mismo tope de caracteres que synthesize_speech
+        self._splitter = SentenceSplitter()
+        self._sentences: "queue.Queue" = queue.Queue()
+        self._seq = 0
+
+    def feed(self, delta: str) -> None:
+        for sentence in self._splitter.feed(delta):
+            self._start(sentence)
+
+    def close(self) -> None:
+        rest = self._splitter.flush()
+        if rest:
+            self._start(rest)
+        self._sentences.put(_END)
+
+    def _start(self, sentence: str) -> None:
+        if self._budget <= 0:
+            return
+        if len(sentence) > self._budget:
+            sentence = sentence[:max(self._budget - 3, 0)] + "..."
+        self._budget -= len(sentence)
+        chunks: "queue.Queue" = queue.Queue()
+        _synthesis_executor.submit(self._run, sentence, chunks)
+        self._sentences.put((self._seq, sentence, chunks))
+        self._seq += 1
+
+    def _run(self, sentence: str, chunks: "queue.Queue") -> None:
+        try:
+            for data in self._synthesize(sentence, self.voice_id):
+                chunks.put(data)
+        except Exception as e:
+            # Una oración sin audio no corta las demás
+            print(f"[ELEVENLABS] ⚠️ Could not synthesize sentence '{sentence[:30]}...': {e}")
+        finally:
+            chunks.put(_END)
+
+    def chunks(self) -> Iterator[AudioChunk]:
+        """Audio en orden de oración; termina después de `close()` y de la última oración."""
+        while True:
+            item = self._sentences.get()
+            if item is _END:
+                return
+            seq, sentence, chunks = item
+            while True:
+                data = chunks.get()
+                if data is _END:
+                    yield AudioChunk(seq, sentence, b"", True)
+                    break
+                yield AudioChunk(seq, sentence, data, False)
+
+def stream_with_speech(deltas: Iterator[str], voice_id: str = DEFAULT_VOICE_ID) -> Iterator[Union[str, AudioChunk]]:
+    """
+    Consume el texto del modelo y lo intercala con su audio, en el orden en que cada
+    cosa está lista: `str` para fragmentos de texto, `AudioChunk` para audio.
+    Un error al generar el texto se relanza apenas ocurre.
+    """
+    pipeline = SpeechPipeline(voice_id)
+    events: "queue.Queue" = queue.Queue()
+
+    def produce_text() -> None:
+        try:
+            for delta in deltas:
+                events.put(delta)
+                pipeline.feed(delta)
+        except Exception as e:
+            events.put(e)
+        finally:
+            pipeline.close()
+            events.put(_END)
+
+    def produce_audio() -> None:
+        try:
+            for chunk in pipeline.chunks():
+                events.put(chunk)
+        finally:
+            events.put(_END)
+
+    threading.Thread(target=produce_text, name="speech-text", daemon=True).start()
+    threading.Thread(target=produce_audio, name="speech-audio", daemon=True).start()
+    producers = 2
+    while producers:
+        item = events.get()
+        if item is _END:
+            producers -= 1
+        elif isinstance(item, Exception):
+            raise item
+        else:
+            yield item
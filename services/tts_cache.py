@@ -0,0 +1,190 @@
+"""
+Caché de audio TTS direccionada por contenido.
+
+Clave: SHA-256 de (texto normalizado, voice_id, model_id, voice_settings), así la
+misma frase con la misma voz y configuración se sintetiza una sola vez. Dos niveles:
+- Memoria: LRU acotado en bytes (TTS_CACHE_MEMORY_BYTES).
+- Disco: un archivo .mp3 por clave en TTS_CACHE_DIR, acotado en bytes
+  (TTS_CACHE_DISK_BYTES, se borra lo menos usado). Se escribe en un temporal y se
+  publica con os.replace: otro proceso nunca lee un archivo a medio escribir.
+Los workers pueden compartir el directorio; cada uno lleva su propio índice.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+_SUFFIX = ".mp3"
+
+def normalize_tts_text(text: str) -> str:
+    """Misma pronunciación -> misma clave: NFC y espacios colapsados (mayúsculas y signos sí cuentan)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def tts_cache_key(text: str, voice_id: str, model_id: str, voice_settings: Dict[str, Any]) -> str:
+    material = json.dumps(
+        [normalize_tts_text(text), voice_id, model_id, voice_settings],
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class TTSCache:
+    def __init__(
+        self,
+        directory: Optional[str] = TTS_CACHE_DIR,
+        memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        disk_bytes: int = TTS_CACHE_DISK_BYTES,
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # clave -> tamaño, del menos al más usado
+        self._disk_used = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0,
+                       "memory_evictions": 0, "disk_evictions": 0, "disk_errors": 0}
+        if directory:
+            self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    def _scan(self) -> None:
+        """Índice del disco al arrancar, ordenado por último uso (mtime)."""
+        found = []
+        try:
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(_SUFFIX):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.name[:-len(_SUFFIX)], stat.st_size))
+        except FileNotFoundError:
+            return
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_used += size
+        self._trim_disk()
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    def _trim_disk(self) -> None:
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self._stats["disk_evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass  # Otro worker ya lo borró
+            except OSError:
+                self._stats["disk_errors"] += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                size = self._disk.pop(key, None)  # Borrado por otro worker
+                if size is not None:
+                    self._disk_used -= size
+            return None
+        except OSError:
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            return None
+        try:
+            os.utime(path)  # Último uso, para el orden de expulsión
+        except OSError:
+            pass
+        return audio
+
+    def get(self, *keys: str) -> Optional[bytes]:
+        """Audio de la primera clave cacheada entre `keys` (en orden); None cuenta un solo miss."""
+        found = self.lookup(*keys)
+        return found[1] if found else None
+
+    def lookup(self, *keys: str) -> Optional[Tuple[str, bytes]]:
+        """Como `get`, pero también dice qué clave estaba cacheada."""
+        with self._lock:
+            for key in keys:
+                audio = self._memory.get(key)
+                if audio is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return key, audio
+        for key in keys if self.directory else ():
+            audio = self._read_disk(key)
+            if audio is not None:
+                with self._lock:
+                    if key not in self._disk:  # Escrito por otro worker
+                        self._disk_used += len(audio)
+                    self._disk[key] = len(audio)
+                    self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                    self._stats["disk_hits"] += 1
+                return key, audio
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, audio: bytes) -> None:
+        with self._lock:
+            self._remember(key, audio)
+            self._stats["writes"] += 1
+        if not self.directory or len(audio) > self.disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            print(f"[ELEVENLABS] ⚠️ Could not write {key[:12]} to disk: {e}")
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            return
+        with self._lock:
+            if key in self._disk:
+                self._disk_used -= self._disk[key]
+            self._disk[key] = len(audio)
+            self._disk.move_to_end(key)
+            self._disk_used += len(audio)
+            self._trim_disk()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(memory_entries=len(self._memory), memory_bytes=self._memory_used,
+                         disk_entries=len(self._disk), disk_bytes=self._disk_used)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        return stats
@@ -0,0 +1,141 @@
+"""
+Cliente HTTP compartido para ElevenLabs.
+
+Una sola `requests.Session` con pool de conexiones keep-alive (sin un handshake
+TLS por llamada), timeouts de conexión y de lectura en cada intento, reintentos
+acotados con backoff exponencial y jitter (sólo ante errores transitorios: red,
+timeout, 429 y 5xx) y un semáforo que limita las llamadas simultáneas, para que
+una ElevenLabs lenta no acapare todos los workers.
+"""
+import os
+import time
+import random
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "8"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+TTS_CONNECT_TIMEOUT = float(os.getenv("TTS_CONNECT_TIMEOUT", "3"))
+TTS_READ_TIMEOUT = float(os.getenv("TTS_READ_TIMEOUT", "15"))
+TTS_MAX_RETRIES = int(os.getenv("TTS_MAX_RETRIES", "2"))
+TTS_BACKOFF_BASE = float(os.getenv("TTS_BACKOFF_BASE", "0.25"))
+# Cuánto espera una llamada por un lugar libre antes de rendirse
+TTS_QUEUE_TIMEOUT = float(os.getenv("TTS_QUEUE_TIMEOUT", "10"))
+TTS_STREAM_CHUNK_BYTES = 4096
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TTSError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+class TTSClient:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = ELEVENLABS_BASE_URL,
+        pool_size: int = TTS_POOL_SIZE,
+        max_concurrency: int = TTS_MAX_CONCURRENCY,
+        connect_timeout: float = TTS_CONNECT_TIMEOUT,
+        read_timeout: float = TTS_READ_TIMEOUT,
+        max_retries: int = TTS_MAX_RETRIES,
+        backoff_base: float = TTS_BACKOFF_BASE,
+        queue_timeout: float = TTS_QUEUE_TIMEOUT,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        # Los reintentos los maneja _post (con jitter y sólo ante errores transitorios)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "audio/mpeg", "Content-Type": "application/json"})
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "rejected": 0}
+
+    def _count(self, field: str) -> None:
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: evita que los reintentos de varios workers lleguen juntos
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def text_to_speech(self, voice_id: str, payload: Dict[str, Any]) -> bytes:
+        """POST /v1/text-to-speech/{voice_id}. Retorna el MP3 o lanza TTSError."""
+        self._acquire()
+        try:
+            return self._send(f"/v1/text-to-speech/{voice_id}", payload, stream=False).content
+        finally:
+            self._slots.release()
+
+    def text_to_speech_stream(self, voice_id: str, payload: Dict[str, Any]) -> Iterator[bytes]:
+        """
+        POST /v1/text-to-speech/{voice_id}/stream: el MP3 por partes, a medida que se genera.
+        Los reintentos sólo cubren el inicio; un corte a mitad del audio lanza TTSError
+        (reintentar duplicaría lo ya entregado). El lugar de concurrencia se ocupa
+        hasta terminar de leer el cuerpo.
+        """
+        self._acquire()
+        try:
+            response = self._send(f"/v1/text-to-speech/{voice_id}/stream", payload, stream=True)
+            try:
+                for chunk in response.iter_content(chunk_size=TTS_STREAM_CHUNK_BYTES):
+                    if chunk:
+                        yield chunk
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                self._count("errors")
+                raise TTSError(f"TTS stream interrupted: {e}") from e
+            finally:
+                response.close()
+        finally:
+            self._slots.release()
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("rejected")
+            raise TTSError(f"TTS busy: no slot within {self.queue_timeout:g}s")
+
+    def _send(self, path: str, payload: Dict[str, Any], stream: bool) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            self._count("requests")
+            retry = attempt < self.max_retries
+            try:
+                response = self.session.post(
+                    self.base_url + path,
+                    json=payload,
+                    headers={"xi-api-key": self.api_key or ""},
+                    timeout=self.timeout,
+                    stream=stream,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not retry:
+                    self._count("errors")
+                    raise TTSError(f"TTS request failed: {e}") from e
+                print(f"[ELEVENLABS] ⚠️ {type(e).__name__}, retrying ({attempt + 1}/{self.max_retries})...")
+            else:
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in _RETRY_STATUS or not retry:
+                    self._count("errors")
+                    message = response.text[:200]
+                    response.close()
+                    raise TTSError(f"TTS error {response.status_code}: {message}", response.status_code)
+                response.close()
+                print(f"[ELEVENLABS] ⚠️ HTTP {response.status_code}, retrying ({attempt + 1}/{self.max_retries})...")
+            self._count("retries")
+            time.sleep(self._backoff(attempt))
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
@@ -1,4 +1,9 @@
+from typing import List
 from data.supermarket_data import SUPERMARKET_INFO, PRODUCT_LOCATIONS
+from tools.location_matcher import LocationMatcher
+
+# Compilado una vez: cada consulta es una pasada lineal por el nombre del producto
+location_matcher = LocationMatcher(PRODUCT_LOCATIONS)
 
 def get_supermarket_hour(day: str = "monday") -> str:
     day = day.lower()
@@ -13,12 +18,20 @@ def get_supermarket_hour(day: str = "monday") -> str:
     return f"El {SUPERMARKET_INFO['name']} abre: {hours} ({key})"
 
 def get_product_location(product_name: str) -> str:
-    product_name = product_name.lower()
-    for key, location in PRODUCT_LOCATIONS.items():
-        if key in product_name or product_name in key:
-            return f"El producto '{key}' se encuentra en: {location}"
+    match = location_matcher.match(product_name)
+    if match:
+        key, location = match
+        return f"El producto '{key}' se encuentra en: {location}"
             
-    return f"No encontré información sobre la ubicación de '{product_name}'. Por favor consulta con un empleado."
+    return f"No encontré información sobre la ubicación de '{product_name.lower()}'. Por favor consulta con un empleado."
+
+def get_product_locations(product_names: List[str]) -> str:
+    """Ubicación de varios productos en una sola llamada (p. ej. todo el carrito)."""
+    lines = []
+    for name, match in zip(product_names, location_matcher.match_many(product_names)):
+        location = match[1] if match else "Sin ubicación registrada, consulta con un empleado"
+        lines.append(f"- {name}: {location}")
+    return "Ubicación de los productos:\n" + "\n".join(lines)
 
 def get_supermarket_details() -> str:
     info = SUPERMARKET_INFO
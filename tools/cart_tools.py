@@ -1,6 +1,7 @@
 from typing import Optional
-from db.cart_ops import add_item_to_cart, get_cart_details, remove_item_from_cart, validate_and_checkout, clear_cart
+from db.cart_ops import add_item_to_cart, get_cart_details, get_cart_details_async, remove_item_from_cart, validate_and_checkout, clear_cart
 from tools.product_tools import search_products # Helper para identificar productos
+from tools.basic_tools import location_matcher
 
 def add_product_to_cart_tool(user_id: str, product_id: str, quantity: int = 1) -> str:
     """
@@ -19,17 +20,32 @@ def view_cart_tool(user_id: str) -> str:
     """Muestra el contenido actual del carrito del usuario."""
     if not user_id:
         return "Debes iniciar sesión para ver tu carrito."
-        
-    data = get_cart_details(user_id)
+    return _format_cart(get_cart_details(user_id))
+
+async def view_cart_tool_async(user_id: str) -> str:
+    """Versión para el event loop (router de intenciones): la consulta no bloquea el worker."""
+    if not user_id:
+        return "Debes iniciar sesión para ver tu carrito."
+    return _format_cart(await get_cart_details_async(user_id))
+
+def _format_cart(data) -> str:
     items = data["items"]
     
     if not items:
         return "Tu carrito está vacío."
     
+    # Ubicaciones de todo el carrito en una sola pasada
+    locations = location_matcher.match_many([item['product_name'] for item in items])
+
     msg = "Tu Carrito de Compras:\n\n"
-    for item in items:
+    for item, location in zip(items, locations):
         msg += f"- {item['product_name']} (x{item['cart_qty']})\n"
-        msg += f"  Precio: ${item['unit_cost']:.2f} c/u | Disp: {item['quantity_available']}\n"
+        price = f"${item['final_price']:.2f} c/u"
+        if item['discount_percentage']:
+            price += f" ({float(item['discount_percentage'])}% OFF)"
+        msg += f"  Precio: {price} | Disp: {item['quantity_available']}\n"
+        if location:
+            msg += f"  Ubicación: {location[1]}\n"
     
     msg += f"\nTotal Estimado: ${data['total']:.2f}"
     msg += f"\n\nPara comprar, dime 'procesar compra' o 'pagar carrito'."
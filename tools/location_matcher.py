@@ -0,0 +1,110 @@
+"""
+Matcher de ubicaciones de productos compilado una sola vez al importar.
+
+Un autómata Aho-Corasick sobre las claves de PRODUCT_LOCATIONS encuentra, en
+una sola pasada por la consulta, la clave más larga (más específica) contenida
+en ella: "iphone 15 pro" -> "iphone 15", no "iphone". Si la consulta es más
+corta que cualquier clave ("macbook"), se resuelve con un índice precalculado
+de subcadenas de las claves, también en tiempo lineal; las de 1-2 caracteres
+("tv", "pc") se buscan recorriendo las claves, como antes. La comparación ignora
+tildes y mayúsculas, pero se retorna la clave tal como está en el diccionario.
+"""
+import unicodedata
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+MIN_PARTIAL_QUERY = 3  # Índice de subcadenas desde 3 caracteres; las más cortas recorren las claves
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower().strip())
+    return " ".join("".join(ch for ch in decomposed if not unicodedata.combining(ch)).split())
+
+class LocationMatcher:
+    def __init__(self, locations: Dict[str, str]):
+        self._names: List[str] = []  # Claves originales (con tildes) para mostrar
+        self._keys: List[str] = []
+        self._locations: List[str] = []
+        for key, location in locations.items():
+            self._names.append(key)
+            self._keys.append(_normalize(key))
+            self._locations.append(location)
+
+        # Trie + enlaces de falla (Aho-Corasick)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[int] = [-1]  # Índice de la clave más larga que termina en el nodo
+        for index, key in enumerate(self._keys):
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(-1)
+                    self._goto[node][ch] = nxt
+                node = nxt
+            if self._best[node] == -1:
+                self._best[node] = index
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                if node:
+                    fallback = self._fail[node]
+                    while fallback and ch not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(ch, 0)
+                # Una clave que termina en el nodo siempre es más larga que sus sufijos
+                if self._best[child] == -1:
+                    self._best[child] = self._best[self._fail[child]]
+
+        # Subcadenas de claves -> clave más corta que la contiene (la más específica)
+        self._partial: Dict[str, int] = {}
+        for index, key in enumerate(self._keys):
+            for start in range(len(key)):
+                for end in range(start + MIN_PARTIAL_QUERY, len(key) + 1):
+                    sub = key[start:end]
+                    current = self._partial.get(sub)
+                    if current is None or len(key) < len(self._keys[current]):
+                        self._partial[sub] = index
+
+    def _better(self, a: int, b: int) -> bool:
+        """Clave más larga gana; a igual largo, la que aparece primero en el diccionario."""
+        return (len(self._keys[a]), -a) > (len(self._keys[b]), -b)
+
+    def _scan(self, text: str) -> int:
+        node, best = 0, -1
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            hit = self._best[node]
+            if hit != -1 and (best == -1 or self._better(hit, best)):
+                best = hit
+        return best
+
+    def _containing(self, query: str) -> int:
+        """Clave más corta que contiene la consulta (para consultas de menos de MIN_PARTIAL_QUERY)."""
+        best = -1
+        for index, key in enumerate(self._keys):
+            if query in key and (best == -1 or len(key) < len(self._keys[best])):
+                best = index
+        return best
+
+    def match(self, product_name: str) -> Optional[Tuple[str, str]]:
+        """(clave, ubicación) más específica para el producto, o None."""
+        query = _normalize(product_name)
+        if not query:
+            return None
+        index = self._scan(query)
+        if index == -1:
+            index = self._partial.get(query, -1) if len(query) >= MIN_PARTIAL_QUERY else self._containing(query)
+        if index == -1:
+            return None
+        return self._names[index], self._locations[index]
+
+    def match_many(self, product_names: List[str]) -> List[Optional[Tuple[str, str]]]:
+        return [self.match(name) for name in product_names]
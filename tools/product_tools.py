@@ -3,74 +3,91 @@ Herramientas para consultar, comparar y procesar compras de productos.
 """
 from typing import List, Optional
 from db.connection import execute_query, execute_update
+from db.catalog import catalog
+
+SEARCH_RANKED_LIMIT = 10
+
+# Requiere db/create_search_indexes.sql (pg_trgm + unaccent + índice FTS).
+# Combina full-text en español con similitud de trigramas, ordenado por relevancia.
+RANKED_SEARCH_SQL = """
+    WITH q AS (
+        SELECT f_unaccent(lower(%(query)s)) AS text,
+               plainto_tsquery('spanish', f_unaccent(%(query)s)) AS ts
+    )
+    SELECT
+        ps.product_id,
+        ps.product_name,
+        ps.product_sku,
+        ps.supplier_name,
+        ps.quantity_on_hand,
+        ps.quantity_reserved,
+        ps.quantity_available,
+        ps.unit_cost,
+        ps.warehouse_location,
+        ps.stock_status,
+        ts_rank_cd(to_tsvector('spanish', f_unaccent(ps.product_name)), q.ts)
+            + word_similarity(q.text, f_unaccent(lower(ps.product_name))) AS relevance
+    FROM q, product_stocks ps
+    WHERE ps.is_active = true
+      AND (
+        to_tsvector('spanish', f_unaccent(ps.product_name)) @@ q.ts
+        OR f_unaccent(lower(ps.product_name)) %%> q.text
+      )
+    ORDER BY relevance DESC, ps.product_id
+    LIMIT %(limit)s
+"""
+
+def _ranked_search(product_name: str, limit: int = SEARCH_RANKED_LIMIT):
+    rows = execute_query(RANKED_SEARCH_SQL, {"query": product_name, "limit": limit})
+    return catalog.attach_prices(rows)
+
+def _format_price(p: dict, style: str = "short") -> str:
+    """Precio para mostrar, desde la tabla de precios efectivos (final_price/discount_percentage)."""
+    if not p['discount_percentage']:
+        return f"${p['final_price']:.2f}"
+    discount = float(p['discount_percentage'])
+    if style == "detail":
+        return f"${p['final_price']:.2f} (Oferta: {discount}% OFF - Precio Normal: ${p['unit_cost']:.2f} - {p['offer_desc']})"
+    if style == "table":
+        return f"${p['final_price']:.2f} ({discount}% OFF)"
+    return f"${p['final_price']:.2f} (Oferta {discount}%)"
 
 def search_products(
     product_name: Optional[str] = None,
     product_sku: Optional[str] = None,
-    product_id: Optional[str] = None
+    product_id: Optional[str] = None,
+    ranked: bool = False
 ) -> str:
-    """    Busca productos en la base de datos por nombre, SKU o ID.    """
-    conditions = []
-    params = []
-    
-    if product_id:
-        conditions.append("ps.product_id = %s")
-        params.append(product_id)
-    elif product_sku:
-        conditions.append("ps.product_sku = %s")
-        params.append(product_sku)
-    elif product_name:
-        conditions.append("LOWER(ps.product_name) LIKE LOWER(%s)")
-        params.append(f"%{product_name}%")
-    else:
-        # Si no hay filtros, retornar todos los productos activos
-        conditions.append("ps.is_active = true")
-    
-    where_clause = " AND ".join(conditions) if conditions else "ps.is_active = true"
-    
-    query = f"""
-        SELECT 
-            ps.product_id,
-            ps.product_name,
-            ps.product_sku,
-            ps.supplier_name,
-            ps.quantity_on_hand,
-            ps.quantity_reserved,
-            ps.quantity_available,
-            ps.minimum_stock_level,
-            ps.reorder_point,
-            ps.optimal_stock_level,
-            ps.unit_cost,
-            ps.total_value,
-            ps.warehouse_location,
-            ps.stock_status,
-            ps.notes,
-            po.discount_percentage,
-            po.description as offer_desc
-        FROM product_stocks ps
-        LEFT JOIN product_offers po ON ps.product_id = po.product_id 
-            AND po.is_active = true 
-            AND NOW() BETWEEN po.start_date AND po.end_date
-        WHERE {where_clause}
-        ORDER BY ps.product_id -- Orden deterministico
-    """
-    
+    """    Busca productos en la base de datos por nombre, SKU o ID.
+    Usa ranked=True para una búsqueda por relevancia tolerante a tildes y errores de tipeo.    """
+    # Las lecturas salen del snapshot en memoria (db/catalog.py), sin ir a PostgreSQL
     try:
-        results = execute_query(query, tuple(params) if params else None)
+        if product_name and ranked and not (product_id or product_sku):
+            results = _ranked_search(product_name)
+        elif product_id:
+            product = catalog.get(product_id)
+            results = [product] if product else []
+        elif product_sku:
+            product = catalog.get_by_sku(product_sku)
+            results = [product] if product else []
+        elif product_name:
+            results = catalog.search(product_name)
+            if not results:
+                # Sin coincidencia exacta: probar por relevancia (typos, palabras sueltas)
+                try:
+                    results = _ranked_search(product_name)
+                except Exception as e:
+                    print(f"[SEARCH] ⚠️ Ranked search unavailable: {e}")
+        else:
+            # Si no hay filtros, retornar todos los productos activos
+            results = catalog.all_active()
         
         if not results:
             return f"No se encontraron productos con los criterios especificados."
         
         if len(results) == 1:
             p = results[0]
-            price_str = f"${p['unit_cost']:.2f}"
-            
-            # Lógica de Oferta
-            if p['discount_percentage']:
-                discount = float(p['discount_percentage'])
-                original_price = float(p['unit_cost'])
-                final_price = original_price * (1 - discount / 100)
-                price_str = f"${final_price:.2f} (Oferta: {discount}% OFF - Precio Normal: ${original_price:.2f} - {p['offer_desc']})"
+            price_str = _format_price(p, "detail")
 
             return f"""
 {p['product_name']}
@@ -86,55 +103,63 @@ def search_products(
             # Múltiples resultados
             response = f"Se encontraron {len(results)} productos:\n\n"
             for i, p in enumerate(results, 1):
-                price_display = f"${p['unit_cost']:.2f}"
-                if p['discount_percentage']:
-                    discount = float(p['discount_percentage'])
-                    final_price = float(p['unit_cost']) * (1 - discount / 100)
-                    price_display = f"${final_price:.2f} (Oferta {discount}%)"
-                
+                price_display = _format_price(p)
                 response += f"{i}. {p['product_name']} (SKU: {p['product_sku']}) - {price_display} - Stock: {p['quantity_available']} unidades\n"
             return response
             
     except Exception as e:
         return f"Error al buscar productos: {str(e)}"
 
+MAX_COMPARE_PRODUCTS = 5
+
+# Un patrón por fila (unnest) y la mejor coincidencia de cada uno vía LATERAL.
+# Prioriza el match por substring (el LIKE de siempre, ahora sin tildes) y luego
+# la similitud de trigramas. Requiere db/create_search_indexes.sql.
+COMPARE_PRODUCTS_SQL = """
+    SELECT q.ord, q.pattern, m.*
+    FROM unnest(%(patterns)s::text[]) WITH ORDINALITY AS q(pattern, ord)
+    LEFT JOIN LATERAL (
+        SELECT 
+            ps.product_id,
+            ps.product_name,
+            ps.product_sku,
+            ps.supplier_name,
+            ps.quantity_on_hand,
+            ps.quantity_reserved,
+            ps.quantity_available,
+            ps.unit_cost,
+            ps.total_value,
+            ps.warehouse_location,
+            ps.stock_status
+        FROM product_stocks ps
+        WHERE ps.is_active = true
+          AND (
+            f_unaccent(lower(ps.product_name)) LIKE ('%%' || f_unaccent(lower(q.pattern)) || '%%')
+            OR f_unaccent(lower(ps.product_name)) %%> f_unaccent(lower(q.pattern))
+          )
+        ORDER BY
+            (f_unaccent(lower(ps.product_name)) LIKE ('%%' || f_unaccent(lower(q.pattern)) || '%%')) DESC,
+            word_similarity(f_unaccent(lower(q.pattern)), f_unaccent(lower(ps.product_name))) DESC,
+            ps.product_name
+        LIMIT 1
+    ) m ON true
+    ORDER BY q.ord
+"""
+
 def compare_products(product_names: List[str]) -> str:
-    """    Compara múltiples productos mostrando sus características lado a lado.    """
+    """    Compara múltiples productos (máximo 5) mostrando sus características lado a lado.    """
     if not product_names or len(product_names) < 2:
         return "Necesitas proporcionar al menos 2 nombres de productos para comparar."
     
-    # Buscar cada producto
-    products_data = []
-    for name in product_names:
-        query = """
-            SELECT 
-                ps.product_id,
-                ps.product_name,
-                ps.product_sku,
-                ps.supplier_name,
-                ps.quantity_on_hand,
-                ps.quantity_reserved,
-                ps.quantity_available,
-                ps.unit_cost,
-                ps.total_value,
-                ps.warehouse_location,
-                ps.stock_status,
-                po.discount_percentage,
-                po.description as offer_desc
-            FROM product_stocks ps
-            LEFT JOIN product_offers po ON ps.product_id = po.product_id 
-                AND po.is_active = true 
-                AND NOW() BETWEEN po.start_date AND po.end_date
-            WHERE LOWER(ps.product_name) LIKE LOWER(%s) AND ps.is_active = true
-            ORDER BY ps.product_name
-            LIMIT 1
-        """
-        try:
-            results = execute_query(query, (f"%{name}%",))
-            if results:
-                products_data.append(results[0])
-        except Exception as e:
-            return f"Error al buscar el producto '{name}': {str(e)}"
+    if len(product_names) > MAX_COMPARE_PRODUCTS:
+        return f"Puedo comparar hasta {MAX_COMPARE_PRODUCTS} productos a la vez. Elige los más importantes."
+    
+    # Resolver todos los nombres en una sola consulta (mejor coincidencia por nombre)
+    try:
+        rows = execute_query(COMPARE_PRODUCTS_SQL, {"patterns": list(product_names)})
+    except Exception as e:
+        return f"Error al buscar los productos a comparar: {str(e)}"
+    products_data = catalog.attach_prices([row for row in rows if row["product_id"] is not None])
     
     if not products_data:
         return "No se encontraron productos para comparar."
@@ -149,16 +174,7 @@ def compare_products(product_names: List[str]) -> str:
     response += "|" + "---|" * (len(products_data) + 1) + "\n"
     
     # Precio
-    # Precio
-    prices = []
-    for p in products_data:
-        if p['discount_percentage']:
-             discount = float(p['discount_percentage'])
-             final = float(p['unit_cost']) * (1 - discount / 100)
-             prices.append(f"${final:.2f} ({discount}% OFF)")
-        else:
-             prices.append(f"${p['unit_cost']:.2f}")
-    
+    prices = [_format_price(p, "table") for p in products_data]
     response += f"| Precio | {' | '.join(prices)} |\n"
     
     # Stock disponible
@@ -187,9 +203,9 @@ def compare_products(product_names: List[str]) -> str:
     
     # Análisis adicional
     response += "\nAnálisis:\n"
-    cheapest = min(products_data, key=lambda x: x['unit_cost'])
+    cheapest = min(products_data, key=lambda x: x['final_price'])
     most_stock = max(products_data, key=lambda x: x['quantity_available'])
-    response += f"- Más económico: {cheapest['product_name']} (${cheapest['unit_cost']:.2f})\n"
+    response += f"- Más económico: {cheapest['product_name']} (${cheapest['final_price']:.2f})\n"
     response += f"- Mayor disponibilidad: {most_stock['product_name']} ({most_stock['quantity_available']} unidades)\n"
     
     return response
@@ -241,6 +257,7 @@ def process_purchase(product_id: str, quantity: int = 1) -> str:
         
         if rows_affected == 0:
             return f"Error: No se pudo actualizar el stock del producto '{product_id}'."
+        catalog.mark_stale()
         
         # Obtener el stock actualizado
         updated_info = execute_query(check_query, (product_id,))
@@ -0,0 +1,182 @@
+"""
+Búsqueda semántica local de productos (sin llamadas externas).
+
+Cada producto se representa con un vector TF-IDF de n-gramas de caracteres y
+palabras (hashing trick) sobre nombre, SKU, proveedor y ubicación, guardado en
+una matriz NumPy. Una consulta es un producto matriz-vector (coseno) más
+filtros vectorizados de precio y disponibilidad, y un top-k con argpartition.
+El índice se actualiza de forma incremental con el log de cambios del catálogo.
+"""
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from db.catalog import catalog, normalize_text, tokenize
+
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "1024"))
+SEMANTIC_TOP_K = 5
+SEMANTIC_MIN_SCORE = 0.05  # Por debajo, sólo comparten n-gramas sueltos
+_CHAR_NGRAMS = (3, 4)
+
+def _features(text: str) -> Dict[int, float]:
+    """Conteos hasheados de palabras y n-gramas de caracteres (con bordes de palabra)."""
+    counts: Dict[int, float] = {}
+    for token in tokenize(text):
+        keys = [f"w:{token}"]
+        padded = f" {token} "
+        for n in _CHAR_NGRAMS:
+            keys.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+        for key in keys:
+            idx = zlib.crc32(key.encode("utf-8")) % SEMANTIC_DIM
+            counts[idx] = counts.get(idx, 0.0) + 1.0
+    return counts
+
+def _vectorize(text: str) -> np.ndarray:
+    vec = np.zeros(SEMANTIC_DIM, dtype=np.float32)
+    for idx, count in _features(text).items():
+        vec[idx] = 1.0 + np.log(count)  # tf sublineal
+    return vec
+
+def _document(p: Dict) -> str:
+    return " ".join(str(p.get(k) or "") for k in ("product_name", "product_sku", "supplier_name", "warehouse_location"))
+
+class SemanticIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._tf = np.zeros((0, SEMANTIC_DIM), dtype=np.float32)
+        self._matrix = self._tf
+        self._idf = np.ones(SEMANTIC_DIM, dtype=np.float32)
+        self._prices = np.zeros(0, dtype=np.float64)
+        self._available = np.zeros(0, dtype=bool)
+        self._skus = np.zeros(0, dtype=object)
+
+    def _reweight(self) -> None:
+        n_docs = len(self._ids)
+        df = np.count_nonzero(self._tf, axis=0)
+        self._idf = (np.log((1 + n_docs) / (1 + df)) + 1.0).astype(np.float32)
+        weighted = self._tf * self._idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = weighted / norms
+
+    def _set_attributes(self, products: List[Optional[Dict]]) -> None:
+        self._prices = np.array([float(p["final_price"]) if p else np.inf for p in products], dtype=np.float64)
+        self._available = np.array(
+            [bool(p and p["is_active"] and p["quantity_available"] > 0) for p in products], dtype=bool
+        )
+        self._skus = np.array([(p["product_sku"] or "").lower() if p else "" for p in products], dtype=object)
+
+    def sync(self) -> None:
+        """Trae los cambios del catálogo; sólo re-vectoriza los productos modificados."""
+        version, changed = catalog.changes_since(self._version)
+        if version == self._version:
+            return
+        with self._lock:
+            if changed is None:
+                products = catalog.all_products()
+                self._ids = [p["product_id"] for p in products]
+                self._row_of = {pid: i for i, pid in enumerate(self._ids)}
+                self._tf = np.vstack([_vectorize(_document(p)) for p in products]) if products else \
+                    np.zeros((0, SEMANTIC_DIM), dtype=np.float32)
+                print(f"[SEMANTIC] 🧮 Index built: {len(self._ids)} products x {SEMANTIC_DIM} dims")
+            else:
+                changed_ids = sorted(changed)
+                new_ids = [pid for pid in changed_ids if pid not in self._row_of]
+                if new_ids:
+                    self._tf = np.vstack([self._tf, np.zeros((len(new_ids), SEMANTIC_DIM), dtype=np.float32)])
+                    for pid in new_ids:
+                        self._row_of[pid] = len(self._ids)
+                        self._ids.append(pid)
+                for pid, p in zip(changed_ids, catalog.get_many(changed_ids)):
+                    if p is not None:
+                        self._tf[self._row_of[pid]] = _vectorize(_document(p))
+
+            if changed is None or changed:
+                self._reweight()
+            # Precio/stock cambian con checkouts y bordes de ofertas: se refrescan siempre
+            self._set_attributes(catalog.get_many(self._ids))
+            self._version = version
+
+    def search(
+        self,
+        query: str,
+        top_k: int = SEMANTIC_TOP_K,
+        max_price: Optional[float] = None,
+        min_price: Optional[float] = None,
+        only_available: bool = True,
+        exclude_skus: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        self.sync()
+        with self._lock:
+            if not self._ids:
+                return []
+            q = _vectorize(query) * self._idf
+            norm = np.linalg.norm(q)
+            if norm == 0:
+                return []
+            scores = self._matrix @ (q / norm)
+
+            mask = scores >= SEMANTIC_MIN_SCORE
+            if only_available:
+                mask &= self._available
+            if max_price is not None:
+                mask &= self._prices <= max_price
+            if min_price is not None:
+                mask &= self._prices >= min_price
+            if exclude_skus:
+                mask &= ~np.isin(self._skus, [normalize_text(s) for s in exclude_skus])
+
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+            k = min(top_k, candidates.size)
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            ids = [self._ids[i] for i in top]
+            hits = [(p, float(scores[i])) for p, i in zip(catalog.get_many(ids), top)]
+        return [dict(p, score=score) for p, score in hits if p is not None]
+
+semantic_index = SemanticIndex()
+
+def semantic_search_products(
+    query: str,
+    max_price: Optional[float] = None,
+    min_price: Optional[float] = None,
+    exclude_skus: Optional[List[str]] = None,
+    only_available: bool = True,
+    top_k: int = SEMANTIC_TOP_K
+) -> str:
+    """    Busca productos por descripción libre de la necesidad del cliente (uso, marca, tipo de equipo)
+    y devuelve una lista corta ordenada por relevancia, filtrando por presupuesto y disponibilidad.
+    Usa exclude_skus para descartar productos que el cliente no quiere.    """
+    try:
+        top_k = max(1, min(int(top_k), 20))
+        results = semantic_index.search(
+            query,
+            top_k=top_k,
+            max_price=max_price,
+            min_price=min_price,
+            only_available=only_available,
+            exclude_skus=exclude_skus,
+        )
+        if not results:
+            return "No se encontraron productos que coincidan con la descripción y los filtros."
+
+        response = f"Productos recomendados para '{query}':\n\n"
+        for i, p in enumerate(results, 1):
+            price = f"${p['final_price']:.2f}"
+            if p['discount_percentage']:
+                price += f" (Oferta {float(p['discount_percentage'])}%)"
+            response += (
+                f"{i}. {p['product_name']} (ID: {p['product_id']}, SKU: {p['product_sku']}) - {price} "
+                f"- Stock: {p['quantity_available']} unidades - Relevancia: {p['score']:.2f}\n"
+            )
+        return response
+    except Exception as e:
+        return f"Error en la búsqueda semántica: {str(e)}"
@@ -5,6 +5,12 @@ try:
     from data.supermarket_data import SUPERMARKET_INFO, PRODUCT_LOCATIONS
 except ImportError:
     from agent_lm.data.supermarket_data import SUPERMARKET_INFO, PRODUCT_LOCATIONS
+try:
+    from tools.location_matcher import LocationMatcher
+except ImportError:
+    from agent_lm.tools.location_matcher import LocationMatcher
+
+location_matcher = LocationMatcher(PRODUCT_LOCATIONS)
 
 @tool
 def get_supermarket_hour(day: str = "monday") -> str:
@@ -21,13 +27,13 @@ def get_supermarket_hour(day: str = "monday") -> str:
 
 @tool
 def get_product_location(product_name: str) -> str:
-    product_name = product_name.lower()
-    # Búsqueda simple por coincidencia de texto
-    for key, location in PRODUCT_LOCATIONS.items():
-        if key in product_name or product_name in key:
-            return f"El producto '{key}' se encuentra en: {location}"
+    # Clave más específica contenida en el nombre (Aho-Corasick), o clave que lo contiene
+    match = location_matcher.match(product_name)
+    if match:
+        key, location = match
+        return f"El producto '{key}' se encuentra en: {location}"
             
-    return f"No encontré información sobre la ubicación de '{product_name}'. Por favor consulta con un empleado."
+    return f"No encontré información sobre la ubicación de '{product_name.lower()}'. Por favor consulta con un empleado."
 
 @tool
 def get_supermarket_details() -> str:
@@ -0,0 +1,182 @@
+"""
+Memoización de resultados de herramientas del agente.
+
+Clave: herramienta + argumentos normalizados (valores por defecto aplicados,
+texto en minúsculas y sin tildes ni espacios extra). Cada herramienta tiene
+una política: alcance global o por sesión (`current_session_id`), TTL y de
+qué depende su resultado. Los cambios de carrito y stock que avisa
+db/cart_ops invalidan las entradas afectadas al instante; el TTL cubre lo
+demás (p. ej. precios que cambian con el refresco del catálogo).
+Esos avisos son de este proceso: el carrito, que otro worker puede cambiar
+sin avisar a éste, se cachea por usuario con un TTL corto (VIEW_CART_CACHE_TTL)
+que acota cuánto puede verse desactualizado. Un resultado calculado antes de
+una invalidación de sus tags no se guarda después de ella (generación por tag).
+"""
+import os
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Set, Tuple
+
+from db.catalog import normalize_text, CATALOG_REFRESH_SECONDS
+from db.cart_ops import CART_CHANGED, STOCK_CHANGED, add_change_listener
+
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "5000"))
+STATIC_INFO_TTL = 3600.0
+VIEW_CART_CACHE_TTL = float(os.getenv("VIEW_CART_CACHE_TTL", "5"))
+
+# Sesión de chat en curso; la fija ChatSession mientras ejecuta herramientas
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+class ToolCachePolicy(NamedTuple):
+    ttl: float
+    scope: str = "global"               # "global" | "session"
+    depends_on: Tuple[str, ...] = ()    # CART_CHANGED / STOCK_CHANGED
+
+# Herramientas sin política (add_product_to_cart_tool, checkout_cart_tool) no se cachean
+TOOL_CACHE_POLICIES: Dict[str, ToolCachePolicy] = {
+    "get_supermarket_hour": ToolCachePolicy(STATIC_INFO_TTL),
+    "get_supermarket_details": ToolCachePolicy(STATIC_INFO_TTL),
+    "get_product_location": ToolCachePolicy(STATIC_INFO_TTL),
+    "get_product_locations": ToolCachePolicy(STATIC_INFO_TTL),
+    "search_products": ToolCachePolicy(CATALOG_REFRESH_SECONDS, depends_on=(STOCK_CHANGED,)),
+    "compare_products": ToolCachePolicy(CATALOG_REFRESH_SECONDS, depends_on=(STOCK_CHANGED,)),
+    # Recomendaciones con presupuesto/exclusiones propias de cada conversación
+    "semantic_search_products": ToolCachePolicy(CATALOG_REFRESH_SECONDS, scope="session", depends_on=(STOCK_CHANGED,)),
+    # La clave lleva el user_id: una entrada por carrito, invalidada por sus propios cambios
+    "view_cart_tool": ToolCachePolicy(VIEW_CART_CACHE_TTL, depends_on=(CART_CHANGED, STOCK_CHANGED)),
+}
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return " ".join(normalize_text(value).split())
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    return value
+
+class _Entry(NamedTuple):
+    expires: float
+    value: Any
+    tags: Tuple[Hashable, ...]
+
+class ToolResultCache:
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_tag: Dict[Hashable, Set[Hashable]] = {}
+        self._generations: Dict[Hashable, int] = {}  # Sube con cada invalidación del tag
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, tool: str, field: str, n: int = 1) -> None:
+        stats = self._stats.setdefault(tool, {"hits": 0, "misses": 0, "invalidated": 0, "discarded": 0})
+        stats[field] += n
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get(self, tool: str, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(tool, "hits")
+                return True, entry.value
+            if entry is not None:
+                self._drop(key)
+            self._count(tool, "misses")
+            return False, None
+
+    def generations(self, tags: Tuple[Hashable, ...]) -> Tuple[int, ...]:
+        """Tomarlas antes de calcular un valor y pasarlas a `put` con los mismos tags."""
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key: Hashable, value: Any, ttl: float, tags: Tuple[Hashable, ...], generations: Optional[Tuple[int, ...]] = None) -> bool:
+        """Guarda el valor; False (sin guardar) si alguno de sus tags se invalidó desde `generations`."""
+        with self._lock:
+            if generations is not None and generations != tuple(self._generations.get(tag, 0) for tag in tags):
+                self._count(key[0], "discarded")
+                return False
+            self._drop(key)
+            self._entries[key] = _Entry(time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            return True
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._by_tag.get(tag, ())):
+                self._count(key[0], "invalidated")
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_tool = {}
+            for tool, s in self._stats.items():
+                lookups = s["hits"] + s["misses"]
+                per_tool[tool] = dict(s, hit_rate=round(s["hits"] / lookups, 4) if lookups else None)
+            return {"entries": len(self._entries), "tools": per_tool}
+
+tool_cache = ToolResultCache()
+
+def _on_change(event: str, user_id: str) -> None:
+    if event == CART_CHANGED:
+        tool_cache.invalidate_tag((CART_CHANGED, _normalize(user_id)))
+    elif event == STOCK_CHANGED:
+        tool_cache.invalidate_tag((STOCK_CHANGED,))
+
+add_change_listener(_on_change)
+
+def cached_tool(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Envuelve una herramienta según su política en TOOL_CACHE_POLICIES (sin política: la retorna tal cual)."""
+    name = fn.__name__
+    policy = TOOL_CACHE_POLICIES.get(name)
+    if policy is None:
+        return fn
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: _normalize(v) for k, v in bound.arguments.items()}
+        scope = current_session_id.get() if policy.scope == "session" else None
+        key = (name, scope, tuple(sorted(arguments.items())))
+
+        hit, value = tool_cache.get(name, key)
+        if hit:
+            return value
+        tags = tuple(
+            (CART_CHANGED, arguments.get("user_id")) if dependency == CART_CHANGED else (dependency,)
+            for dependency in policy.depends_on
+        )
+        generations = tool_cache.generations(tags)
+        value = fn(*args, **kwargs)
+        if isinstance(value, str) and value.startswith("Error"):
+            return value  # Los errores no se cachean
+        tool_cache.put(key, value, policy.ttl, tags, generations)
+        return value
+
+    return wrapper